@@ -0,0 +1,13 @@
+"""Offline load tests for the API.
+
+Run from the project root, e.g.:
+
+    uv run --group bench python -m backend.benchmarks --concurrency 16 --requests 200
+    uv run --group bench python -m backend.benchmarks --replay requests.jsonl
+    uv run --group bench python -m backend.benchmarks --url http://localhost:8000 --scenarios search,rag
+
+Without --url a server is started with fake chat and embedding models, so
+results measure this service rather than the Gemini API.
+
+backend.benchmarks.startup profiles import time and time to /healthz and /readyz.
+"""
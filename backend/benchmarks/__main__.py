@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+from contextlib import nullcontext
+
+import backend.benchmarks
+
+from backend.benchmarks.load_test import (
+    fake_model_env,
+    format_report,
+    local_server,
+    replay_workload,
+    run_benchmarks,
+    synthetic_workload
+)
+
+SCENARIOS = ["upload", "search", "search_batch", "rag", "stream"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks",
+        description=backend.benchmarks.__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one with fake models")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per query scenario")
+    parser.add_argument("--replay", metavar="JSONL", help="Upload record bodies and ask record titles from a requests.jsonl")
+    parser.add_argument("--documents", type=int, default=20, help="Synthetic documents to upload")
+    parser.add_argument("--document-chars", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-first-token-ms", type=float, default=200.0)
+    parser.add_argument("--llm-token-ms", type=float, default=20.0)
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--embedding-ms", type=float, default=50.0)
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the answer and retrieval caches on in the started server")
+    parser.add_argument("--json", metavar="PATH", help="Also write the summaries as JSON")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    if args.replay:
+        workload = replay_workload(args.replay)
+    else:
+        workload = synthetic_workload(args.documents, args.document_chars, args.requests, seed=args.seed)
+
+    if args.url:
+        server = nullcontext(args.url)
+    else:
+        server = local_server(fake_model_env(
+            llm_first_token_ms=args.llm_first_token_ms,
+            llm_token_ms=args.llm_token_ms,
+            answer_tokens=args.answer_tokens,
+            embedding_ms=args.embedding_ms,
+            answer_cache=args.answer_cache
+        ))
+
+    with server as base_url:
+        results = asyncio.run(run_benchmarks(base_url, workload, scenarios, args.concurrency, args.requests))
+
+    summaries = [result.summary() for result in results]
+    print(format_report(summaries))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Recall/latency benchmark for vector index settings.
+
+    python -m backend.benchmarks.ann --vectors 100000 --dim 768
+    python -m backend.benchmarks.ann --m 8,16,32 --ef-search 20,50,100,200 --rescore 1,4,16
+    python -m backend.benchmarks.ann --from-collection --queries 500
+
+Builds an in-memory HNSW collection for every M x ef_construction pair and
+queries it at every ef_search, and builds the int8 index and queries it at
+every re-score factor. Recall@k is measured against an exact numpy search.
+Vectors are random and clustered, or read from the configured collection with
+--from-collection; queries are perturbed copies of stored vectors. index_mb
+estimates what each index keeps in memory: vectors plus graph links for HNSW,
+int8 codes for the int8 index.
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import numpy as np
+
+from backend.benchmarks.load_test import ScenarioResult
+from backend.config import get_settings
+from backend.services.quantized_index import QuantizedCollection
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around random centres, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(clusters, size=count)] + 0.5 * rng.normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def collection_vectors(page_size: int = 5000) -> np.ndarray:
+    """Every embedding stored in the configured collection."""
+    from backend.services.vector_store import create_chroma_client
+    settings = get_settings()
+    collection = create_chroma_client(settings).get_collection(settings.chroma_collection_name)
+    pages, offset = [], 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if len(page["ids"]):
+            pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    if not pages:
+        raise SystemExit(f"Collection {settings.chroma_collection_name} is empty")
+    return np.concatenate(pages)
+
+
+def sample_queries(vectors: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    """Stored vectors plus noise, so each query has close but not identical neighbours."""
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.integers(len(vectors), size=count)]
+    scale = float(np.linalg.norm(vectors, axis=1).mean())
+    noisy = picked + 0.1 * scale / np.sqrt(vectors.shape[1]) * rng.normal(size=picked.shape)
+    return noisy.astype(np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> list[set[int]]:
+    """Ground truth: the k nearest stored rows per query by brute force."""
+    neighbours = []
+    norms2 = np.einsum("ij,ij->i", vectors, vectors)
+    unit = vectors / np.maximum(np.sqrt(norms2), 1e-12)[:, None]
+    for start in range(0, len(queries), 256):
+        batch = queries[start:start + 256]
+        if space == "l2":
+            distances = norms2[None, :] - 2 * batch @ vectors.T
+        elif space == "cosine":
+            distances = -(batch @ unit.T)
+        else:
+            distances = -(batch @ vectors.T)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        neighbours.extend(set(row.tolist()) for row in nearest)
+    return neighbours
+
+
+def measure(collection, queries: np.ndarray, truth: list[set[int]], k: int) -> dict:
+    """Recall@k and per-query latency, querying one vector at a time as the API does."""
+    result = ScenarioResult("ann")
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        result.latencies.append(time.perf_counter() - started)
+        hits += len(expected & {int(doc_id) for doc_id in found["ids"][0]})
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": result.percentile(result.latencies, 50) * 1000,
+        "p95_ms": result.percentile(result.latencies, 95) * 1000,
+        "queries_per_second": len(queries) / sum(result.latencies)
+    }
+
+
+def bench_hnsw(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: list[set[int]],
+    k: int,
+    space: str,
+    ms: list[int],
+    ef_constructions: list[int],
+    ef_searches: list[int]
+) -> list[dict]:
+    import chromadb
+    client = chromadb.EphemeralClient()
+    ids = [str(row) for row in range(len(vectors))]
+    rows = []
+    for m in ms:
+        for ef_construction in ef_constructions:
+            name = f"ann-{uuid.uuid4().hex[:8]}"
+            collection = client.create_collection(name, configuration={
+                "hnsw": {"space": space, "max_neighbors": m, "ef_construction": ef_construction}
+            })
+            started = time.perf_counter()
+            batch = client.get_max_batch_size()
+            for start in range(0, len(vectors), batch):
+                collection.add(ids=ids[start:start + batch], embeddings=vectors[start:start + batch])
+            build_seconds = time.perf_counter() - started
+            # Level-0 links dominate the graph: 2 * M neighbour ids of 4 bytes per vector
+            index_mb = len(vectors) * (vectors.shape[1] * 4 + 2 * m * 4) / 2**20
+            for ef_search in ef_searches:
+                collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                rows.append({
+                    "index": "hnsw",
+                    "m": m,
+                    "ef_construction": ef_construction,
+                    "ef_search": ef_search,
+                    "build_s": build_seconds,
+                    "index_mb": index_mb,
+                    **measure(collection, queries, truth, k)
+                })
+                print(format_table(rows[-1:], header=len(rows) == 1), flush=True)
+            client.delete_collection(name)
+    return rows
+
+
+def bench_int8(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: list[set[int]],
+    k: int,
+    space: str,
+    rescore_factors: list[int]
+) -> list[dict]:
+    collection = QuantizedCollection("ann", space=space)
+    ids = [str(row) for row in range(len(vectors))]
+    started = time.perf_counter()
+    for start in range(0, len(vectors), 5000):
+        collection.upsert(ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000])
+    build_seconds = time.perf_counter() - started
+    # int8 codes plus a scale and squared norm per vector; exact vectors stay on disk
+    index_mb = len(vectors) * (vectors.shape[1] + 8) / 2**20
+    rows = []
+    for factor in rescore_factors:
+        collection.rescore_factor = factor
+        rows.append({
+            "index": "int8",
+            "rescore": factor,
+            "build_s": build_seconds,
+            "index_mb": index_mb,
+            **measure(collection, queries, truth, k)
+        })
+        print(format_table(rows[-1:], header=False), flush=True)
+    return rows
+
+
+COLUMNS = [
+    "index", "m", "ef_construction", "ef_search", "rescore", "recall", "p50_ms", "p95_ms",
+    "queries_per_second", "build_s", "index_mb"
+]
+
+
+def format_table(rows: list[dict], header: bool = True) -> str:
+    """Render result rows as a plain-text table with fixed-width columns."""
+
+    def cell(value) -> str:
+        if value is None:
+            return "-"
+        return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+    lines = [[cell(row.get(column)) for column in COLUMNS] for row in rows]
+    if header:
+        lines.insert(0, COLUMNS)
+    widths = [max(len(column), 8) for column in COLUMNS]
+    return "\n".join("  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in lines)
+
+
+def _ints(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks.ann",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--vectors", type=int, default=50000, help="Random vectors to index")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--from-collection", action="store_true", help="Index the configured collection's embeddings instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default="l2")
+    parser.add_argument("--m", default="16", help="Comma-separated HNSW M values")
+    parser.add_argument("--ef-construction", default="100", help="Comma-separated HNSW ef_construction values")
+    parser.add_argument("--ef-search", default="10,50,100,200", help="Comma-separated HNSW ef_search values")
+    parser.add_argument("--rescore", default="1,4,16", help="Comma-separated int8 re-score factors; empty skips int8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write the rows as JSON")
+    args = parser.parse_args()
+
+    if args.from_collection:
+        vectors = collection_vectors()
+    else:
+        vectors = clustered_vectors(args.vectors, args.dim, args.clusters, seed=args.seed)
+    queries = sample_queries(vectors, args.queries, seed=args.seed)
+    k = min(args.k, len(vectors))
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, recall@{k}, {args.space}")
+    truth = exact_neighbours(vectors, queries, k, args.space)
+
+    rows = bench_hnsw(
+        vectors, queries, truth, k, args.space,
+        _ints(args.m), _ints(args.ef_construction), _ints(args.ef_search)
+    )
+    if _ints(args.rescore):
+        rows += bench_int8(vectors, queries, truth, k, args.space, _ints(args.rescore))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterator
+
+import httpx
+import websockets
+
+# Package root's parent, so a spawned server can import backend.main
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VOCABULARY = (
+    "vector index chunk embedding query answer context model latency throughput cache "
+    "document upload search rerank stream token batch shard replica cluster config "
+    "timeout retry error memory disk network socket worker queue schedule policy "
+    "tenant source page table metric trace span histogram percentile budget limit"
+).split()
+# Queries sent per /documents/search/batch request
+SEARCH_BATCH_SIZE = 32
+
+
+@dataclass
+class ScenarioResult:
+    """Latencies and counters collected by one scenario run."""
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    first_frame_latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    tokens: int = 0
+    chunks: int = 0
+    queries: int = 0
+    wall_seconds: float = 0.0
+
+    @staticmethod
+    def percentile(values: list[float], q: float) -> float | None:
+        if not values:
+            return None
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        summary = {
+            "scenario": self.name,
+            "requests": len(self.latencies) + self.errors,
+            "errors": self.errors,
+            "requests_per_second": len(self.latencies) / self.wall_seconds if self.wall_seconds else None,
+        }
+        for q in (50, 95, 99):
+            value = self.percentile(self.latencies, q)
+            summary[f"p{q}_ms"] = value * 1000 if value is not None else None
+        if self.first_frame_latencies:
+            summary["first_frame_p50_ms"] = self.percentile(self.first_frame_latencies, 50) * 1000
+            summary["first_frame_p95_ms"] = self.percentile(self.first_frame_latencies, 95) * 1000
+        if self.tokens:
+            summary["tokens_per_second"] = self.tokens / self.wall_seconds
+        if self.chunks:
+            summary["chunks_per_second"] = self.chunks / self.wall_seconds
+        if self.queries:
+            summary["queries_per_second"] = self.queries / self.wall_seconds
+        return summary
+
+
+@dataclass
+class Workload:
+    """Documents to upload and queries to ask."""
+    documents: list[tuple[str, str]]  # (filename, text)
+    queries: list[str]
+
+
+def synthetic_workload(documents: int, document_chars: int, queries: int, seed: int = 0) -> Workload:
+    """Deterministic random-word documents and distinct queries."""
+    rng = random.Random(seed)
+
+    def text(chars: int) -> str:
+        words = []
+        while sum(len(word) + 1 for word in words) < chars:
+            words.append(rng.choice(VOCABULARY))
+        return " ".join(words)
+
+    docs = [(f"doc-{i}.txt", text(document_chars)) for i in range(documents)]
+    asks = [f"how does {text(40)} work ({i})" for i in range(queries)]
+    return Workload(docs, asks)
+
+
+def replay_workload(path: str) -> Workload:
+    """Documents and queries from a JSONL file of {request_id, title, body} records.
+
+    Bodies are uploaded as documents and titles are asked as queries.
+    """
+    documents, queries = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name = record.get("request_id") or f"record-{len(documents)}"
+            documents.append((f"{name}.txt", record.get("body") or record.get("title", "")))
+            queries.append(record.get("title") or record.get("body", "")[:200])
+    return Workload(documents, queries)
+
+
+async def run_concurrently(
+    name: str,
+    items: list,
+    concurrency: int,
+    call: Callable[[object, ScenarioResult], Awaitable[None]]
+) -> ScenarioResult:
+    """Run call over items with at most concurrency in flight, timing each call."""
+    result = ScenarioResult(name)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            item = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await call(item, result)
+            except Exception as e:
+                result.errors += 1
+                print(f"[{name}] request failed: {e}", file=sys.stderr)
+            else:
+                result.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_seconds = time.perf_counter() - started
+    return result
+
+
+def _cycle(values: list, count: int) -> list:
+    return [values[i % len(values)] for i in range(count)]
+
+
+async def bench_upload(client: httpx.AsyncClient, workload: Workload, concurrency: int) -> ScenarioResult:
+    async def call(document, result):
+        filename, text = document
+        response = await client.post(
+            "/documents/upload",
+            files={"file": (filename, text.encode("utf-8"), "text/plain")}
+        )
+        response.raise_for_status()
+        result.chunks += response.json()["chunks_count"]
+
+    return await run_concurrently("upload", workload.documents, concurrency, call)
+
+
+async def bench_search(client: httpx.AsyncClient, workload: Workload, concurrency: int, requests: int) -> ScenarioResult:
+    async def call(query, result):
+        response = await client.post("/documents/search", json={"query": query, "top_k": 5})
+        response.raise_for_status()
+
+    return await run_concurrently("search", _cycle(workload.queries, requests), concurrency, call)
+
+
+async def bench_search_batch(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    concurrency: int,
+    requests: int
+) -> ScenarioResult:
+    """Send the search scenario's queries in batches of SEARCH_BATCH_SIZE."""
+    queries = _cycle(workload.queries, requests)
+    batches = [queries[i:i + SEARCH_BATCH_SIZE] for i in range(0, len(queries), SEARCH_BATCH_SIZE)]
+
+    async def call(batch, result):
+        response = await client.post("/documents/search/batch", json={"queries": batch, "top_k": 5})
+        response.raise_for_status()
+        result.queries += len(batch)
+
+    return await run_concurrently("search_batch", batches, concurrency, call)
+
+
+async def bench_rag(client: httpx.AsyncClient, workload: Workload, concurrency: int, requests: int) -> ScenarioResult:
+    async def call(query, result):
+        response = await client.post("/chat/rag", json={"query": query})
+        response.raise_for_status()
+        result.tokens += len(response.json()["answer"].split())
+
+    return await run_concurrently("rag", _cycle(workload.queries, requests), concurrency, call)
+
+
+async def bench_stream(base_url: str, workload: Workload, concurrency: int, requests: int) -> ScenarioResult:
+    ws_url = base_url.replace("http", "ws", 1).rstrip("/") + "/chat/ws/stream"
+
+    async def call(query, result):
+        started = time.perf_counter()
+        first_frame = None
+        text = []
+        async with websockets.connect(ws_url) as ws:
+            await ws.send(json.dumps({"query": query}))
+            while (frame := await ws.recv()) != "<<END>>":
+                if frame.startswith("Error:"):
+                    raise RuntimeError(frame)
+                if first_frame is None:
+                    first_frame = time.perf_counter() - started
+                text.append(frame)
+        result.first_frame_latencies.append(first_frame or 0.0)
+        result.tokens += len("".join(text).split())
+
+    return await run_concurrently("stream", _cycle(workload.queries, requests), concurrency, call)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(
+    env: dict[str, str],
+    ready_path: str = "/readyz",
+    startup_timeout: float = 300.0
+) -> Iterator[str]:
+    """Run the API in a subprocess on a free port; yield once ready_path answers 200."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "PYTHONPATH": PROJECT_ROOT, **env}
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                if httpx.get(f"{base_url}{ready_path}", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not start in time")
+            time.sleep(0.25)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def fake_model_env(
+    llm_first_token_ms: float,
+    llm_token_ms: float,
+    answer_tokens: int,
+    embedding_ms: float,
+    answer_cache: bool
+) -> dict[str, str]:
+    """Settings for a self-contained server: fake models and a throwaway store."""
+    return {
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "unused"),
+        "LLM_PROVIDER": "fake",
+        "EMBEDDING_PROVIDER": "fake",
+        "FAKE_LLM_FIRST_TOKEN_MS": str(llm_first_token_ms),
+        "FAKE_LLM_TOKEN_MS": str(llm_token_ms),
+        "FAKE_LLM_ANSWER_TOKENS": str(answer_tokens),
+        "FAKE_EMBEDDING_LATENCY_MS": str(embedding_ms),
+        "ANSWER_CACHE_ENABLED": str(answer_cache).lower(),
+        "RETRIEVAL_CACHE_ENABLED": str(answer_cache).lower(),
+        "CHROMA_PERSIST_DIRECTORY": tempfile.mkdtemp(prefix="rag-bench-"),
+    }
+
+
+async def run_benchmarks(
+    base_url: str,
+    workload: Workload,
+    scenarios: list[str],
+    concurrency: int,
+    requests: int
+) -> list[ScenarioResult]:
+    """Run the selected scenarios in order against a server."""
+    results = []
+    timeout = httpx.Timeout(300.0)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for scenario in scenarios:
+            if scenario == "upload":
+                results.append(await bench_upload(client, workload, concurrency))
+            elif scenario == "search":
+                results.append(await bench_search(client, workload, concurrency, requests))
+            elif scenario == "search_batch":
+                results.append(await bench_search_batch(client, workload, concurrency, requests))
+            elif scenario == "rag":
+                results.append(await bench_rag(client, workload, concurrency, requests))
+            elif scenario == "stream":
+                results.append(await bench_stream(base_url, workload, concurrency, requests))
+            else:
+                raise ValueError(f"Unknown scenario: {scenario}")
+    return results
+
+
+def format_report(summaries: list[dict]) -> str:
+    """Render scenario summaries as a plain-text table."""
+    columns = [
+        "scenario", "requests", "errors", "requests_per_second", "p50_ms", "p95_ms", "p99_ms",
+        "first_frame_p50_ms", "tokens_per_second", "chunks_per_second", "queries_per_second"
+    ]
+    columns = [c for c in columns if any(s.get(c) is not None for s in summaries)]
+
+    def cell(value) -> str:
+        if value is None:
+            return "-"
+        return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+    rows = [columns] + [[cell(s.get(c)) for c in columns] for s in summaries]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
@@ -0,0 +1,85 @@
+"""Cold-start profile: import times of the app and time until /healthz and /readyz answer.
+
+    python -m backend.benchmarks.startup --top 25
+    python -m backend.benchmarks.startup --import-budget-ms 1500   # exits 1 when over budget
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from backend.benchmarks.load_test import PROJECT_ROOT, fake_model_env, local_server
+
+
+def profile_imports(module: str = "backend.main") -> list[tuple[str, int, int]]:
+    """Import a module in a fresh interpreter; return (module, self_us, cumulative_us) rows."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "PYTHONPATH": PROJECT_ROOT, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "unused")},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def time_startup(env: dict[str, str], timeout: float = 300.0) -> dict[str, float]:
+    """Start the server and measure when it is live and when it is ready."""
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
+    with local_server(env, ready_path="/healthz", startup_timeout=timeout) as base_url:
+        timings["healthz_seconds"] = time.perf_counter() - started
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if httpx.get(f"{base_url}/readyz", timeout=5.0).status_code == 200:
+                timings["readyz_seconds"] = time.perf_counter() - started
+                break
+            time.sleep(0.1)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks.startup",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--top", type=int, default=20, help="Slowest imports to list")
+    parser.add_argument("--import-budget-ms", type=float, help="Fail when importing the module takes longer")
+    parser.add_argument("--skip-server", action="store_true", help="Only profile imports")
+    parser.add_argument("--real-models", action="store_true", help="Start with the configured models instead of fakes")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total_ms = next(cumulative for name, _, cumulative in rows if name.strip() == args.module) / 1000
+    print(f"import {args.module}: {total_ms:.0f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    if not args.skip_server:
+        env = {} if args.real_models else fake_model_env(
+            llm_first_token_ms=0, llm_token_ms=0, answer_tokens=1, embedding_ms=0, answer_cache=False
+        )
+        for name, seconds in time_startup(env).items():
+            print(f"{name}: {seconds:.2f}")
+
+    if args.import_budget_ms is not None and total_ms > args.import_budget_ms:
+        print(f"Import time {total_ms:.0f} ms is over the {args.import_budget_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
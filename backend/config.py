@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 from pydantic_settings import BaseSettings
 
 
@@ -10,19 +11,146 @@ class Settings(BaseSettings):
     
     # Model Configuration
     llm_model: str = "gemini-2.5-flash"
-    embedding_model: str = "models/text-embedding-004"
+    embedding_model: str = "models/text-embedding-004"  # For onnx: a Hugging Face repo or local dir with an ONNX export
     llm_temperature: float = 0.1
     
+    # Model Provider Configuration
+    llm_provider: Literal["gemini", "fake"] = "gemini"  # "fake" runs offline, for benchmarks
+    embedding_provider: Literal["gemini", "onnx", "fake"] = "gemini"  # "onnx" embeds locally on the CPU
+    fake_llm_first_token_ms: float = 200.0
+    fake_llm_token_ms: float = 20.0
+    fake_llm_answer_tokens: int = 64
+    fake_llm_error_rate: float = 0.0  # Fraction of fake LLM calls failing with a 429, to exercise retries
+    fake_embedding_latency_ms: float = 50.0  # Per embedding call, whatever the batch size
+    fake_embedding_dimension: int = 768
+    
+    # LLM Gateway Configuration (every chat model call, answers before query rewrites)
+    llm_max_concurrency: int = 16  # Calls in flight; halved while the provider throttles, then regrown
+    llm_requests_per_second: float | None = None  # Token bucket rate shared by all callers; None disables it
+    llm_burst: int = 10  # Calls the token bucket lets through at once after idling
+    llm_max_queue: int = 256  # Waiting calls beyond this are rejected with 503
+    llm_queue_timeout_seconds: float = 30.0  # Calls waiting longer are rejected with 503
+    llm_max_retries: int = 3  # Retries of throttled, 5xx and timed-out calls
+    llm_retry_base_seconds: float = 0.5  # Backoff before retry n is uniform in [0, base * 2^n]
+    llm_retry_max_seconds: float = 20.0  # Backoff cap; a longer provider retry delay fails fast with 503
+    llm_hedge_after_ms: float | None = None  # Send a second copy of a non-streaming call still pending after this
+    llm_timeout_seconds: float | None = 60.0  # Per-request timeout of the Gemini client
+    llm_pool_connections: int = 32  # Keep-alive connections of the Gemini HTTP client
+    
+    # Local Embedding Configuration
+    embedding_model_cache_dir: str | None = None  # Where onnx models are downloaded; None uses the Hugging Face cache
+    embedding_batch_size: int = 32  # Texts per ONNX inference call
+    embedding_threads: int | None = None  # onnxruntime threads per call; None uses every core
+    embedding_max_length: int = 512  # Tokens embedded per text; the rest is truncated
+    embedding_query_prefix: str = ""  # Instruction some models expect before queries, e.g. for bge
+    
     # Vector Store Configuration
     chroma_collection_name: str = "rag_collection"
     chroma_persist_directory: str = "./chroma_data"  # Default to local persistence
+    status_disk_size_ttl_seconds: float = 30.0  # How long the on-disk size is cached
+    chroma_server_host: str | None = None  # Use a Chroma server instead of the embedded store
+    chroma_server_port: int = 8000
+    
+    # Vector Index Configuration
+    # hnsw: Chroma's HNSW graph; int8: quantized vectors scanned in full from a
+    # memory-mapped file and re-scored exactly (embedded store only)
+    vector_index: Literal["hnsw", "int8"] = "hnsw"
+    vector_distance: Literal["l2", "cosine", "ip"] = "l2"  # Fixed when the collection is created
+    hnsw_m: int = 16  # Graph neighbours per node; more raises recall and memory. Fixed at creation
+    hnsw_ef_construction: int = 100  # Build-time search width; more builds a better graph, slower. Fixed at creation
+    hnsw_ef_search: int = 100  # Query-time search width; more raises recall and latency
+    int8_rescore_factor: int = 4  # int8 candidates re-scored exactly per requested result
+    
+    # Deployment Configuration
+    web_concurrency: int = 1  # Uvicorn worker processes; more than 1 needs chroma_server_host
+    
+    # Embedding Cache Configuration
+    embedding_cache_enabled: bool = True  # Document embeddings persist under chroma_persist_directory when set
+    embedding_query_cache_max_entries: int = 10000  # Query embeddings are kept in memory only, least recently used dropped
     
     # Text Splitter Configuration
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    # Small-to-big retrieval: set e.g. 4000 to split uploads into parent sections of this
+    # size, stored once in a docstore; chunk_size (e.g. 400) then sizes the child chunks
+    # that are embedded and reranked, and each winning child is expanded to its parent
+    parent_chunk_size: int | None = None
+    parent_chunk_overlap: int = 0
+    
+    # Ingestion Configuration
+    ingestion_batch_size: int = 64  # Chunks embedded and written per Chroma call
+    ingestion_max_concurrency: int = 4  # Batches in flight per upload
+    ingestion_pdf_pages_per_task: int = 16  # Pages parsed per process pool task
+    embedding_max_concurrency: int = 4  # Batches embedding at once across all uploads and jobs
+    ingestion_job_workers: int = 2  # Background ingestion jobs run at once
+    ingestion_bulk_batch_size: int = 256  # Chunks per shared batch in bulk uploads
+    ingestion_bulk_max_files: int = 8  # Files extracted at once in a bulk upload
+    ingestion_archive_max_members: int = 10000  # Files per archive in a bulk upload
+    ingestion_archive_max_bytes: int = 2 * 1024 * 1024 * 1024  # Uncompressed bytes per archive in a bulk upload
+    
+    # Retrieval Configuration
+    retrieval_vector_k: int = 10  # Dense candidates from Chroma
+    retrieval_bm25_k: int = 10  # Lexical candidates from the BM25 index; 0 disables it
+    retrieval_vector_weight: float = 1.0
+    retrieval_bm25_weight: float = 1.0
+    retrieval_rrf_k: int = 60  # Reciprocal rank fusion damping constant
+    retrieval_candidate_k: int = 10  # Fused candidates passed to the reranker
+    search_batch_max_queries: int = 1000  # Queries one /documents/search/batch request may send
+    
+    # Query Rewrite Configuration
+    # always: rewrite every query; heuristic: skip short or keyword-like queries;
+    # speculative: like heuristic, but retrieve with the original query while the
+    # rewrite is in flight and merge both result sets; off: never rewrite
+    query_rewrite_mode: Literal["always", "heuristic", "speculative", "off"] = "always"
+    query_rewrite_min_words: int = 4  # Fewer words than this counts as keyword-like
+    query_rewrite_timeout_seconds: float = 2.0  # Speculative mode falls back to the original after this
+    query_rewrite_cache_size: int = 1024
     
     # Reranker Configuration
-    rerank_top_n: int = 3
+    rerank_model: str = "ms-marco-MultiBERT-L-12"
+    rerank_cache_dir: str | None = None  # Where Flashrank keeps models; None uses its default (/tmp)
+    rerank_top_n: int = 3  # Candidate pool size is retrieval_candidate_k
+    rerank_max_batch_pairs: int = 128  # Flush a micro-batch once it holds this many pairs
+    rerank_batch_wait_ms: float = 5.0  # ...or once its oldest pair has waited this long
+    rerank_cache_size: int = 100_000  # Cached (query, chunk) scores
+    
+    # Context Configuration
+    context_max_tokens: int = 2000  # Budget for retrieved text in the prompt
+    context_chars_per_token: float = 4.0  # Estimate used to convert the budget to chars
+    context_min_fragment_tokens: int = 50  # Smaller leftovers are dropped instead of truncated
+    
+    # Execution Configuration
+    thread_pool_max_workers: int = 16  # Blocking I/O (LLM, embeddings, Chroma, rerank)
+    process_pool_max_workers: int = 2  # CPU-bound parsing; 0 runs it on the thread pool
+    
+    # WebSocket Streaming Configuration
+    ws_send_queue_size: int = 32  # Frames buffered per connection before the producer waits
+    ws_coalesce_max_chars: int = 64  # Flush a frame once it holds this many chars
+    ws_coalesce_max_delay_ms: int = 50  # ...or once its oldest chunk is this old
+    
+    # Answer Cache Configuration
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 1024
+    answer_cache_max_bytes: int = 16 * 1024 * 1024
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_similarity_threshold: float | None = None  # e.g. 0.97 enables near-duplicate hits
+    single_flight_enabled: bool = True  # Identical concurrent queries share one pipeline run
+    
+    # Retrieval Cache Configuration
+    retrieval_cache_enabled: bool = True  # Reuse reranked chunks for repeated (rewritten) queries until the collection changes
+    retrieval_cache_max_entries: int = 4096
+    retrieval_cache_ttl_seconds: float = 3600.0
+    
+    # Context Cache Configuration (provider-side, Gemini explicit caching)
+    context_cache_enabled: bool = False  # Upload popular prompt contexts to the provider's cache; billed per hour stored
+    context_cache_min_uses: int = 2  # Uses of the same context before it is cached
+    context_cache_min_tokens: int = 1024  # Smaller contexts are sent in full; Gemini rejects shorter caches
+    context_cache_ttl_seconds: float = 600.0
+    context_cache_max_entries: int = 64  # Least recently used caches beyond this are deleted
+    
+    # Metrics Configuration
+    metrics_enabled: bool = True  # Serve Prometheus metrics at /metrics
+    timing_headers_enabled: bool = False  # Add a Server-Timing header with per-stage timings
     
     class Config:
         env_file = ".env"
@@ -1,18 +1,101 @@
-from functools import lru_cache
+import threading
+from functools import lru_cache, wraps
 from fastapi import Depends
+from langchain_core.embeddings import Embeddings
 from backend.config import Settings, get_settings
+from backend.services.model_providers import create_chat_model, create_embeddings
+from backend.services.llm_gateway import BACKGROUND, GatewayChatModel, LLMGateway
 from backend.services.vector_store import VectorStoreService
 from backend.services.rag_chain import RAGService
+from backend.services.reranker import RerankService
+from backend.services.executor import ExecutorService
+from backend.services.ingestion import IngestionService
+from backend.services.jobs import IngestionJobQueue
+from backend.services.warmup import WarmupService
 
-@lru_cache()
+
+def singleton(provider):
+    """lru_cache for providers, building each singleton at most once across threads.
+    
+    Warmup builds services on worker threads while early requests may ask for them.
+    """
+    cached = lru_cache()(provider)
+    lock = threading.Lock()
+    
+    @wraps(provider)
+    def wrapper():
+        with lock:
+            return cached()
+    
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@singleton
+def get_executor_service() -> ExecutorService:
+    """Dependency provider for ExecutorService (Singleton)."""
+    settings = get_settings()
+    return ExecutorService(settings)
+
+@singleton
+def get_llm_gateway() -> LLMGateway:
+    """Dependency provider for LLMGateway (Singleton)."""
+    settings = get_settings()
+    return LLMGateway(settings)
+
+@singleton
+def get_chat_model() -> GatewayChatModel:
+    """Dependency provider for the chat model selected in settings, behind the LLM gateway (Singleton)."""
+    settings = get_settings()
+    return GatewayChatModel(llm=create_chat_model(settings), gateway=get_llm_gateway())
+
+@singleton
+def get_embeddings() -> Embeddings:
+    """Dependency provider for the embedding model selected in settings (Singleton)."""
+    settings = get_settings()
+    return create_embeddings(settings)
+
+@singleton
+def get_rerank_service() -> RerankService:
+    """Dependency provider for RerankService (Singleton)."""
+    settings = get_settings()
+    executor = get_executor_service()
+    return RerankService(settings, executor)
+
+@singleton
 def get_vector_store_service() -> VectorStoreService:
     """Dependency provider for VectorStoreService (Singleton)."""
     settings = get_settings()
-    return VectorStoreService(settings)
+    embeddings = get_embeddings()
+    return VectorStoreService(settings, embeddings)
 
-@lru_cache()
+@singleton
 def get_rag_service() -> RAGService:
     """Dependency provider for RAGService (Singleton)."""
     settings = get_settings()
     vector_store = get_vector_store_service()
-    return RAGService(settings, vector_store)
+    executor = get_executor_service()
+    llm = get_chat_model()
+    reranker = get_rerank_service()
+    # Rewrites queue behind answers when the gateway is saturated
+    return RAGService(settings, vector_store, executor, llm, reranker, rewrite_llm=llm.with_priority(BACKGROUND))
+
+@singleton
+def get_ingestion_service() -> IngestionService:
+    """Dependency provider for IngestionService (Singleton)."""
+    settings = get_settings()
+    vector_store = get_vector_store_service()
+    executor = get_executor_service()
+    return IngestionService(settings, vector_store, executor)
+
+@singleton
+def get_job_queue() -> IngestionJobQueue:
+    """Dependency provider for IngestionJobQueue (Singleton)."""
+    settings = get_settings()
+    ingestion = get_ingestion_service()
+    executor = get_executor_service()
+    return IngestionJobQueue(settings, ingestion, executor)
+
+@singleton
+def get_warmup_service() -> WarmupService:
+    """Dependency provider for WarmupService (Singleton)."""
+    return WarmupService()
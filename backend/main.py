@@ -1,9 +1,12 @@
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 
-from backend.routers import documents, chat
+from backend.config import get_settings
+from backend.metrics import registry, collect_timings, format_timings, HTTP_REQUEST_SECONDS, CONTENT_TYPE
+from backend.routers import documents, chat, health
 
 
 from backend.logger import logger
@@ -11,16 +14,42 @@ from backend.logger import logger
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up Simple RAG API...")
-    # Pre-warm services (Singleton initialization)
-    from backend.dependencies import get_rag_service
+    from backend.dependencies import (
+        get_executor_service,
+        get_warmup_service,
+        get_vector_store_service,
+        get_rerank_service,
+        get_chat_model,
+        get_rag_service,
+        get_job_queue
+    )
+    executor = get_executor_service()
     
-    logger.info("Pre-warming RAG Service (this might download models on first run)...")
-    get_rag_service()
+    async def start_job_queue():
+        job_queue = await executor.run_in_thread(get_job_queue)
+        await job_queue.start()
     
-    logger.info("Startup complete.")
+    # Warm up in the background so /healthz answers right away; /readyz reports when done
+    warmup = get_warmup_service()
+    warmup.start([
+        {
+            "vector_store": lambda: executor.run_in_thread(lambda: get_vector_store_service().warm_up()),
+            "reranker": lambda: executor.run_in_thread(lambda: get_rerank_service().warm_up()),
+            "llm": lambda: executor.run_in_thread(get_chat_model)
+        },
+        {
+            "rag_service": lambda: executor.run_in_thread(get_rag_service),
+            "ingestion_jobs": start_job_queue
+        }
+    ])
+    
+    logger.info("Startup complete, warming up in the background.")
     yield
     logger.info("Shutting down Simple RAG API...")
-    # Shutdown logic can go here
+    await warmup.stop()
+    if warmup.components.get("ingestion_jobs") == "ready":
+        await get_job_queue().stop()
+    executor.shutdown()
 
 
 app = FastAPI(
@@ -39,12 +68,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time each request and optionally report its stage timings in a Server-Timing header."""
+    started = time.perf_counter()
+    with collect_timings() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    
+    # Label by route template so path parameters don't explode the series count
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    if get_settings().timing_headers_enabled:
+        stages = [f"{stage};dur={ms}" for stage, ms in format_timings(timings).items()]
+        response.headers["Server-Timing"] = ", ".join(stages + [f"total;dur={elapsed * 1000:.2f}"])
+    return response
+
+
 # Include Routers
 app.include_router(documents.router)
 app.include_router(chat.router)
+app.include_router(health.router)
 
 
 @app.get("/", tags=["General"])
 async def root():
     """Redirect to Swagger UI."""
     return RedirectResponse(url="/docs")
+
+
+@app.get("/metrics", tags=["General"], include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this process."""
+    if not get_settings().metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
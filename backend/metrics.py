@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+CHARS_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...], label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label_names = label_names
+        # label values -> ([count per bucket, +Inf], sum)
+        self._series: dict[tuple[str, ...], tuple[list[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    @staticmethod
+    def _labels(pairs: list[tuple[str, str]]) -> str:
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            pairs = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(pairs + [('le', f'{bound:g}')])} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._labels(pairs + [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{self._labels(pairs)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Current value, or running total with counter=True, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = (), counter: bool = False):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.kind = "counter" if counter else "gauge"
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{Histogram._labels(list(zip(self.label_names, key)))} {value:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics."""
+
+    def __init__(self):
+        self._metrics: dict[str, Histogram | Gauge] = {}
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        label_names: tuple[str, ...] = ()
+    ) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, description, buckets, label_names)
+        return self._metrics[name]
+
+    def gauge(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        if name not in self._metrics:
+            self._metrics[name] = Gauge(name, description, label_names)
+        return self._metrics[name]
+
+    def counter(self, name: str, description: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        if name not in self._metrics:
+            self._metrics[name] = Gauge(name, description, label_names, counter=True)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    label_names=("stage",)
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    label_names=("method", "route", "status")
+)
+CONTEXT_CHARS = registry.histogram(
+    "rag_context_chars",
+    "Size of the context passed to the LLM, in characters.",
+    buckets=CHARS_BUCKETS
+)
+CHUNKS_RETRIEVED = registry.histogram(
+    "rag_chunks_retrieved",
+    "Candidate chunks returned by retrieval per query.",
+    buckets=SIZE_BUCKETS
+)
+TOKENS_STREAMED = registry.histogram(
+    "rag_tokens_streamed",
+    "Output tokens per streamed answer (stream chunks when the model reports no usage).",
+    buckets=SIZE_BUCKETS
+)
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "rag_llm_queue_wait_seconds",
+    "Time LLM calls waited for a concurrency slot and rate limit token.",
+    label_names=("priority",)
+)
+LLM_QUEUE_DEPTH = registry.gauge(
+    "rag_llm_queue_depth",
+    "LLM calls waiting in the gateway queue.",
+    label_names=("priority",)
+)
+LLM_IN_FLIGHT = registry.gauge("rag_llm_in_flight", "LLM calls in flight.")
+LLM_CONCURRENCY_LIMIT = registry.gauge(
+    "rag_llm_concurrency_limit",
+    "Current adaptive LLM concurrency limit; lowered when the provider throttles."
+)
+LLM_ATTEMPTS = registry.counter(
+    "rag_llm_attempts_total",
+    "LLM call attempts by outcome (ok, throttled, error, retry, hedge, rejected).",
+    label_names=("outcome",)
+)
+CACHE_LOOKUPS = registry.counter(
+    "rag_cache_lookups_total",
+    "Retrieval, context and provider context cache lookups by result (hit, miss).",
+    label_names=("cache", "result")
+)
+
+# Stage timings of the request being handled, when someone is collecting them
+_timings: ContextVar[dict[str, float] | None] = ContextVar("rag_timings", default=None)
+
+
+def record_timing(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and the current request's timings."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as one pipeline stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """Collect the stage timings recorded by the enclosed work, including spawned tasks and threads."""
+    timings: dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def format_timings(timings: dict[str, float]) -> dict[str, float]:
+    """Stage timings in milliseconds, for response headers and trailer frames."""
+    return {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
@@ -15,23 +15,92 @@ class FileUploadResponse(BaseModel):
     message: str
     document_ids: list[str]
     chunks_count: int
+    added_count: int = Field(default=0, description="New or changed chunks embedded")
+    skipped_count: int = Field(default=0, description="Unchanged chunks already stored")
+    removed_count: int = Field(default=0, description="Stale chunks deleted")
+
+
+class BulkFileResult(BaseModel):
+    """Outcome of one file in a bulk upload."""
+    filename: str
+    chunks_count: int = 0
+    added_count: int = 0
+    skipped_count: int = 0
+    removed_count: int = 0
+    error: str | None = None
+
+
+class BulkUploadResponse(BaseModel):
+    """Response model for bulk upload."""
+    message: str
+    files_count: int
+    failed_count: int
+    chunks_count: int
+    elapsed_seconds: float
+    docs_per_second: float
+    results: list[BulkFileResult]
+
+
+class IngestionJobResponse(BaseModel):
+    """Response model for an upload queued as a background job."""
+    message: str
+    job_id: str
+    status: str
+
+
+class IngestionJobStatus(BaseModel):
+    """Progress of a background ingestion job."""
+    job_id: str
+    filename: str | None = None
+    status: str = Field(..., description="queued, running, completed or failed")
+    pages_parsed: int = 0
+    pages_total: int | None = None
+    chunks_embedded: int = 0
+    chunks_per_second: float | None = None
+    error: str | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
 
 
 # ============================================================
 # Vector Search
 # ============================================================
 
-class SearchRequest(BaseModel):
+class MetadataFilter(BaseModel):
+    """Restricts retrieval to chunks whose upload metadata matches; all given fields must hold."""
+    namespace: str | None = None
+    tenant: str | None = None
+    sources: list[str] | None = Field(default=None, description="Uploaded filenames")
+    tags: list[str] | None = Field(default=None, description="Chunks must carry every tag")
+    where: dict | None = Field(default=None, description="Extra Chroma where clause")
+
+
+class SearchOptions(BaseModel):
+    """Options shared by single and batch similarity search."""
+    top_k: int = Field(default=5, ge=1, le=20, description="Number of results to return")
+    filters: MetadataFilter | None = None
+    score_threshold: float | None = Field(default=None, description="Drop results with a lower relevance score")
+    mmr: bool = Field(default=False, description="Diversify results with maximal marginal relevance")
+    mmr_fetch_k: int = Field(default=20, ge=1, le=200, description="Candidates MMR picks top_k from")
+    mmr_lambda: float = Field(default=0.5, ge=0.0, le=1.0, description="1 favours relevance, 0 diversity")
+
+
+class SearchRequest(SearchOptions):
     """Request model for similarity search."""
     query: str = Field(..., description="Search query string")
-    top_k: int = Field(default=5, ge=1, le=20, description="Number of results to return")
+
+
+class BatchSearchRequest(SearchOptions):
+    """Request model for searching many queries at once."""
+    queries: list[str] = Field(..., min_length=1, description="Search query strings")
 
 
 class SearchResult(BaseModel):
     """Single search result."""
     content: str
     metadata: dict = Field(default_factory=dict)
-    score: float | None = None
+    score: float | None = Field(default=None, description="Relevance score; higher is closer")
 
 
 class SearchResponse(BaseModel):
@@ -40,6 +109,12 @@ class SearchResponse(BaseModel):
     count: int
 
 
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search: one result list per query, in request order."""
+    results: list[SearchResponse]
+    count: int
+
+
 # ============================================================
 # Vector Store Status
 # ============================================================
@@ -47,8 +122,12 @@ class SearchResponse(BaseModel):
 class VectorStatusResponse(BaseModel):
     """Response model for vector store status."""
     collection_name: str
-    document_count: int
+    document_count: int = Field(..., description="Number of stored chunks")
+    source_count: int = Field(default=0, description="Number of distinct uploaded files, per namespace and tenant")
     is_persistent: bool
+    disk_size_bytes: int | None = None
+    embedding_dimension: int | None = None
+    last_ingest_at: float | None = Field(default=None, description="Unix time of the last write")
 
 
 # ============================================================
@@ -58,9 +137,27 @@ class VectorStatusResponse(BaseModel):
 class RAGRequest(BaseModel):
     """Request model for RAG query."""
     query: str = Field(..., min_length=1, description="User query")
+    filters: MetadataFilter | None = None
 
 
 class RAGResponse(BaseModel):
     """Response model for RAG query."""
     answer: str
     sources: list[str] = Field(default_factory=list)
+
+
+# ============================================================
+# Health
+# ============================================================
+
+class HealthResponse(BaseModel):
+    """Response model for the liveness probe."""
+    status: str = "ok"
+
+
+class ReadinessResponse(BaseModel):
+    """Response model for the readiness probe."""
+    ready: bool
+    components: dict[str, str] = Field(default_factory=dict, description="Warmup state per component")
+    errors: dict[str, str] = Field(default_factory=dict)
+    startup_seconds: float | None = Field(default=None, description="Time from startup to ready")
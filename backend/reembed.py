@@ -0,0 +1,138 @@
+"""Copy the configured collection into a new one, embedded with another model.
+
+Run from the project root, e.g. to move from Gemini to local ONNX embeddings:
+
+    python -m backend.reembed --to-collection rag_collection_bge \\
+        --provider onnx --model BAAI/bge-small-en-v1.5
+
+Chunks keep their text and metadata, and the parent sections of small-to-big
+retrieval come along. Chunks the target already holds are
+skipped, so an interrupted run can be resumed and a finished one re-run to
+pick up chunks added since; deletions are not copied. Afterwards, set
+CHROMA_COLLECTION_NAME, EMBEDDING_PROVIDER and EMBEDDING_MODEL to the target
+and restart the API.
+
+The target is created with the current index settings (VECTOR_DISTANCE,
+HNSW_M, HNSW_EF_CONSTRUCTION), which is also how to change those for an
+existing collection; --index int8 copies into the quantized index instead.
+
+With --from-embedded, the source is the embedded store under
+CHROMA_PERSIST_DIRECTORY and the target the Chroma server at
+CHROMA_SERVER_HOST, under the same collection name unless --to-collection
+is given. This moves a single-process deployment onto a server, e.g. with
+Docker Compose:
+
+    docker compose run --rm backend python -m backend.reembed --from-embedded
+
+The embedding model is unchanged, so vectors come from the embedding cache.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.config import Settings, get_settings
+from backend.services.parent_store import ParentStore
+from backend.services.vector_store import VectorStoreService, create_chroma_client, sidecar_path
+from backend.logger import logger
+
+
+def reembed(source: Settings, target: Settings, page_size: int = 256, workers: int = 1) -> dict:
+    """Embed every chunk of the source collection into the target collection."""
+    same_store = source.chroma_server_host == target.chroma_server_host
+    if same_store and source.chroma_collection_name == target.chroma_collection_name:
+        raise ValueError("The target collection must differ from the source collection")
+
+    collection = create_chroma_client(source).get_collection(source.chroma_collection_name)
+    store = VectorStoreService(target)
+    parents = ParentStore(sidecar_path(source, "parents.sqlite3"))
+    total = collection.count()
+    logger.info(
+        f"Re-embedding {total} chunks from {source.chroma_collection_name} into "
+        f"{target.chroma_collection_name} with {target.embedding_provider}:{target.embedding_model}"
+    )
+
+    started = time.perf_counter()
+    counts = {"chunks": 0, "added": 0}
+    lock = threading.Lock()
+
+    def copy_page(offset: int) -> None:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        metadatas = [metadata or {} for metadata in page["metadatas"]]
+        # Parent sections are text only; copy the ones these chunks expand to
+        parent_ids = [metadata["parent_id"] for metadata in metadatas if metadata.get("parent_id")]
+        if parent_ids:
+            store.parents.put(parents.rows(parent_ids))
+        writes = store.add_chunks(page["documents"], metadatas)
+        with lock:
+            counts["chunks"] += len(writes)
+            counts["added"] += sum(write.added for write in writes)
+            elapsed = time.perf_counter() - started
+            logger.info(f"Re-embedded {counts['chunks']}/{total} chunks ({counts['chunks'] / elapsed:.0f}/s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() surfaces the first failure
+        list(pool.map(copy_page, range(0, total, page_size)))
+
+    if source.chroma_collection_name == target.chroma_collection_name:
+        # Both stores share the collection's stats file, which now counts every chunk twice
+        store.recount_sources()
+
+    elapsed = time.perf_counter() - started
+    return {**counts, "skipped": counts["chunks"] - counts["added"], "elapsed_seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.reembed",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--to-collection", help="Collection to write; required unless --from-embedded")
+    parser.add_argument(
+        "--from-embedded",
+        action="store_true",
+        help="Copy from the embedded store under CHROMA_PERSIST_DIRECTORY to the server at CHROMA_SERVER_HOST"
+    )
+    parser.add_argument("--provider", choices=["gemini", "onnx", "fake"], help="Target embedding provider")
+    parser.add_argument("--model", help="Target embedding model")
+    parser.add_argument("--index", choices=["hnsw", "int8"], help="Target vector index")
+    parser.add_argument("--page-size", type=int, default=256, help="Chunks read and embedded per step")
+    parser.add_argument("--workers", type=int, default=1, help="Pages embedded at once; onnx already uses every core")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    source = settings
+    if args.from_embedded:
+        if not settings.chroma_server_host:
+            parser.error("--from-embedded needs CHROMA_SERVER_HOST set to the target server")
+        source = settings.model_copy(update={"chroma_server_host": None, "web_concurrency": 1})
+    elif not args.to_collection:
+        parser.error("--to-collection is required")
+    update = {"chroma_collection_name": args.to_collection or settings.chroma_collection_name}
+    if args.provider:
+        update["embedding_provider"] = args.provider
+    if args.model:
+        update["embedding_model"] = args.model
+    if args.index:
+        update["vector_index"] = args.index
+    target = settings.model_copy(update=update)
+
+    result = reembed(source, target, page_size=args.page_size, workers=args.workers)
+    print(
+        f"Copied {result['chunks']} chunks ({result['added']} embedded, {result['skipped']} already present) "
+        f"in {result['elapsed_seconds']:.1f}s"
+    )
+    if args.from_embedded:
+        print(f"Now run the API with CHROMA_SERVER_HOST={target.chroma_server_host}")
+        return
+    print(
+        f"Now set CHROMA_COLLECTION_NAME={target.chroma_collection_name} "
+        f"EMBEDDING_PROVIDER={target.embedding_provider} EMBEDDING_MODEL={target.embedding_model} "
+        f"VECTOR_INDEX={target.vector_index}"
+    )
+
+
+if __name__ == "__main__":
+    main()
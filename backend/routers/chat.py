@@ -1,8 +1,19 @@
+import asyncio
+import json
+import math
+from contextlib import aclosing
+
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from backend.models.schemas import RAGRequest, RAGResponse
+from pydantic import ValidationError
+from backend.config import Settings, get_settings
+from backend.models.schemas import MetadataFilter, RAGRequest, RAGResponse
 from backend.services.rag_chain import RAGService
+from backend.services.llm_gateway import LLMOverloadedError
+from backend.services.streaming import coalesce_chunks
+from backend.services.metadata import build_where
 from backend.dependencies import get_rag_service
 from backend.logger import logger
+from backend.metrics import collect_timings, format_timings
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
@@ -11,48 +22,140 @@ async def rag_query(
     request: RAGRequest,
     rag_service: RAGService = Depends(get_rag_service)
 ):
-    """Invoke the RAG chain for a user query."""
+    """Invoke the RAG chain for a user query, optionally over chunks matching metadata filters."""
     logger.info(f"Received RAG query: {request.query[:50]}...")
+    where = build_where(**request.filters.model_dump()) if request.filters else None
     try:
-        result = rag_service.invoke(request.query)
+        result = await rag_service.ainvoke(request.query, where)
         logger.info("Successfully processed RAG query")
         return RAGResponse(**result)
+    except LLMOverloadedError as e:
+        logger.warning(f"RAG query rejected: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"LLM is overloaded, retry later: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"RAG query failed: {str(e)}"
         )
 
+
+async def _send_frames(websocket: WebSocket, queue: asyncio.Queue[str]):
+    """Drain the connection's send queue into the socket."""
+    while True:
+        frame = await queue.get()
+        await websocket.send_text(frame)
+
+
+async def _stream_answer(
+    rag_service: RAGService,
+    query: str,
+    queue: asyncio.Queue[str],
+    lock: asyncio.Lock,
+    settings: Settings,
+    where: dict | None = None,
+    send_timings: bool = False
+):
+    """Stream one answer into the send queue; a full queue pauses the LLM stream."""
+    # Queries on the same socket are answered one after another
+    async with lock:
+        logger.info(f"Received streaming query: {query[:50]}...")
+        try:
+            with collect_timings() as timings:
+                frames = coalesce_chunks(
+                    rag_service.astream(query, where),
+                    max_chars=settings.ws_coalesce_max_chars,
+                    max_delay=settings.ws_coalesce_max_delay_ms / 1000
+                )
+                count = 0
+                async with aclosing(frames):
+                    async for frame in frames:
+                        await queue.put(frame)
+                        count += 1
+            logger.info(f"Sent {count} frames to websocket")
+            if send_timings:
+                await queue.put(f"<<T:{json.dumps(format_timings(timings))}>>")
+            await queue.put("<<END>>")
+        except LLMOverloadedError as e:
+            logger.warning(f"Streaming query rejected: {str(e)}")
+            await queue.put("<<E:OVERLOADED>>")
+            await queue.put("<<END>>")
+        except Exception as e:
+            await queue.put(f"Error: {str(e)}")
+            await queue.put("<<END>>")
+
+
 @router.websocket("/ws/stream")
 async def chat_stream(
     websocket: WebSocket,
-    rag_service: RAGService = Depends(get_rag_service)
+    rag_service: RAGService = Depends(get_rag_service),
+    settings: Settings = Depends(get_settings)
 ):
-    """WebSocket endpoint for streaming RAG responses."""
+    """WebSocket endpoint for streaming RAG responses.
+
+    Send {"query": ...} to start an answer, which ends with <<END>>.
+    Add "filters": {...} (as in RAGRequest) to answer from matching chunks only.
+    Add "timings": true to get a <<T:{stage: ms}>> frame right before <<END>>.
+    Send {"cancel": true} to stop in-flight answers; each one ends with <<CANCELLED>>.
+    An answer the LLM gateway can't take on is <<E:OVERLOADED>> then <<END>>; retry later.
+    """
     await websocket.accept()
     logger.info("WebSocket connection accepted")
+
+    queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+    sender = asyncio.create_task(_send_frames(websocket, queue))
+    lock = asyncio.Lock()
+    in_flight: set[asyncio.Task] = set()
+
     try:
         while True:
             data = await websocket.receive_json()
+
+            if data.get("cancel"):
+                tasks = [task for task in in_flight if not task.done()]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                logger.info(f"Cancelled {len(tasks)} streaming queries")
+                for _ in tasks:
+                    await queue.put("<<CANCELLED>>")
+                continue
+
             if "query" not in data:
                 logger.warning("Received WebSocket message without query")
-                await websocket.send_text("<<E:NO_QUERY>>")
+                await queue.put("<<E:NO_QUERY>>")
+                continue
+
+            try:
+                filters = MetadataFilter(**data["filters"]) if data.get("filters") else None
+            except (TypeError, ValidationError) as e:
+                logger.warning(f"Received WebSocket message with invalid filters: {str(e)}")
+                await queue.put("<<E:BAD_FILTERS>>")
                 continue
-            
-            query = data["query"]
-            logger.info(f"Received streaming query: {query[:50]}...")
-            
-            # Use the streaming method from RAGService
-            count = 0
-            for token in rag_service.stream(query):
-                await websocket.send_text(token)
-                count += 1
-            logger.info(f"Sent {count} tokens to websocket")
-            
-            await websocket.send_text("<<END>>")
-            
+
+            task = asyncio.create_task(
+                _stream_answer(
+                    rag_service,
+                    data["query"],
+                    queue,
+                    lock,
+                    settings,
+                    where=build_where(**filters.model_dump()) if filters else None,
+                    send_timings=bool(data.get("timings"))
+                )
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
     except WebSocketDisconnect:
         pass
     except Exception as e:
         await websocket.send_text(f"Error: {str(e)}")
         await websocket.send_text("<<END>>")
+    finally:
+        for task in [*in_flight, sender]:
+            task.cancel()
+        await asyncio.gather(*in_flight, sender, return_exceptions=True)
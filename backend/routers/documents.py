@@ -1,99 +1,219 @@
 import base64
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile, Response
 from backend.models.schemas import (
     FileUploadResponse, 
+    BulkFileResult,
+    BulkUploadResponse,
+    IngestionJobResponse,
+    IngestionJobStatus,
+    SearchOptions,
     SearchRequest, 
     SearchResponse,
     SearchResult,
+    BatchSearchRequest,
+    BatchSearchResponse,
     VectorStatusResponse
 )
 from backend.services.vector_store import VectorStoreService
-from backend.dependencies import get_vector_store_service
+from backend.services.executor import ExecutorService
+from backend.services.ingestion import IngestionService
+from backend.services.jobs import IngestionJobQueue
+from backend.services.metadata import build_where, parse_tags, upload_metadata
+from backend.config import Settings, get_settings
+from backend.dependencies import (
+    get_vector_store_service,
+    get_executor_service,
+    get_ingestion_service,
+    get_job_queue
+)
 from backend.logger import logger
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
-@router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/upload",
+    response_model=FileUploadResponse | IngestionJobResponse,
+    status_code=status.HTTP_201_CREATED
+)
 async def upload_document(
+    response: Response,
     file: UploadFile = File(...),
-    vector_store: VectorStoreService = Depends(get_vector_store_service)
+    background: bool = False,
+    namespace: str | None = Form(None),
+    tenant: str | None = Form(None),
+    tags: str | None = Form(None, description="Comma-separated tags"),
+    ingestion: IngestionService = Depends(get_ingestion_service),
+    job_queue: IngestionJobQueue = Depends(get_job_queue)
 ):
-    """Receive file via multipart form-data, extract text, and add to vector store."""
+    """Receive file via multipart form-data, stream its text into the vector store in batches.
+
+    Chunks are stored with the filename as source, their PDF page, and the
+    optional namespace, tenant and tags, which searches can filter on.
+    With ?background=true the file is queued and a job id is returned immediately.
+    """
     logger.info(f"Received file upload request: {file.filename}")
+    metadata = upload_metadata(namespace, tenant, parse_tags(tags))
+    if background:
+        try:
+            job_id = await job_queue.submit(file, metadata)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error queueing document: {str(e)}"
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return IngestionJobResponse(
+            message="Document queued for ingestion",
+            job_id=job_id,
+            status="queued"
+        )
+
     try:
-        content = await file.read()
-        
-        # Check for PDF magic number (%PDF-)
-        if file.filename.lower().endswith(".pdf") or content.startswith(b"%PDF-"):
-            logger.info(f"Processing PDF: {file.filename}")
-            import io
-            from pypdf import PdfReader
-            
-            pdf_stream = io.BytesIO(content)
-            reader = PdfReader(pdf_stream)
-            file_str = ""
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    file_str += text + "\n"
-        else:
-            logger.info(f"Processing text file: {file.filename}")
-            file_str = content.decode("utf-8")
-            
-    except Exception as e:
+        result = await ingestion.ingest_upload(file, metadata)
+    except ValueError as e:
+        # Undecodable text or unreadable PDF
         logger.error(f"Error processing uploaded file {file.filename}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid file data or format: {str(e)}"
         )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing document: {str(e)}"
+        )
 
-    if not file_str:
+    if not result.ids:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File is empty"
         )
 
+    return FileUploadResponse(
+        message="Document uploaded successfully",
+        document_ids=result.ids,
+        chunks_count=len(result.ids),
+        added_count=result.added,
+        skipped_count=result.skipped,
+        removed_count=result.removed
+    )
+
+@router.post("/upload/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_documents_bulk(
+    files: list[UploadFile] = File(...),
+    namespace: str | None = Form(None),
+    tenant: str | None = Form(None),
+    tags: str | None = Form(None, description="Comma-separated tags"),
+    ingestion: IngestionService = Depends(get_ingestion_service)
+):
+    """Ingest many files, or zip/tar archives of files, in one request."""
+    logger.info(f"Received bulk upload request with {len(files)} files")
+    started = time.perf_counter()
     try:
-        ids = vector_store.add_documents(file_str)
-        return FileUploadResponse(
-            message="Document uploaded successfully",
-            document_ids=ids,
-            chunks_count=len(ids)
-        )
+        results = await ingestion.ingest_bulk(files, upload_metadata(namespace, tenant, parse_tags(tags)))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing document: {str(e)}"
+            detail=f"Error processing documents: {str(e)}"
         )
+    elapsed = time.perf_counter() - started
 
-@router.post("/search", response_model=SearchResponse)
-async def similarity_search(
-    request: SearchRequest,
-    vector_store: VectorStoreService = Depends(get_vector_store_service)
+    succeeded = [result for result in results if result["error"] is None]
+    logger.info(f"Bulk upload ingested {len(succeeded)}/{len(results)} files in {elapsed:.2f}s")
+    return BulkUploadResponse(
+        message="Bulk upload processed",
+        files_count=len(results),
+        failed_count=len(results) - len(succeeded),
+        chunks_count=sum(result["chunks_count"] for result in results),
+        elapsed_seconds=elapsed,
+        docs_per_second=len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        results=[BulkFileResult(**result) for result in results]
+    )
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+async def get_job(
+    job_id: str,
+    job_queue: IngestionJobQueue = Depends(get_job_queue)
 ):
-    """Perform semantic similarity search on uploaded documents."""
+    """Get progress of a background ingestion job."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    return IngestionJobStatus(**job)
+
+async def _search(
+    queries: list[str],
+    options: SearchOptions,
+    vector_store: VectorStoreService,
+    executor: ExecutorService
+) -> list[SearchResponse]:
+    """Run scored searches for several queries in one batched lookup."""
+    where = build_where(**options.filters.model_dump()) if options.filters else None
     try:
-        docs = vector_store.similarity_search(request.query, k=request.top_k)
+        batches = await executor.run_in_thread(
+            vector_store.search,
+            queries,
+            k=options.top_k,
+            where=where,
+            mmr=options.mmr,
+            fetch_k=options.mmr_fetch_k,
+            lambda_mult=options.mmr_lambda,
+            score_threshold=options.score_threshold
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        )
+    responses = []
+    for scored in batches:
         results = [
             SearchResult(
                 content=doc.page_content,
-                metadata=doc.metadata
-            ) for doc in docs
+                metadata=doc.metadata,
+                score=score
+            ) for doc, score in scored
         ]
-        return SearchResponse(results=results, count=len(results))
-    except Exception as e:
+        responses.append(SearchResponse(results=results, count=len(results)))
+    return responses
+
+@router.post("/search", response_model=SearchResponse)
+async def similarity_search(
+    request: SearchRequest,
+    vector_store: VectorStoreService = Depends(get_vector_store_service),
+    executor: ExecutorService = Depends(get_executor_service)
+):
+    """Perform semantic similarity search on uploaded documents, optionally filtered by metadata."""
+    return (await _search([request.query], request, vector_store, executor))[0]
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search(
+    request: BatchSearchRequest,
+    vector_store: VectorStoreService = Depends(get_vector_store_service),
+    executor: ExecutorService = Depends(get_executor_service),
+    settings: Settings = Depends(get_settings)
+):
+    """Search many queries with one batched embedding call and one Chroma lookup."""
+    if len(request.queries) > settings.search_batch_max_queries:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Search failed: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.search_batch_max_queries} queries per request"
         )
+    responses = await _search(request.queries, request, vector_store, executor)
+    return BatchSearchResponse(results=responses, count=len(responses))
 
 @router.get("/status", response_model=VectorStatusResponse)
 async def get_status(
-    vector_store: VectorStoreService = Depends(get_vector_store_service)
+    vector_store: VectorStoreService = Depends(get_vector_store_service),
+    executor: ExecutorService = Depends(get_executor_service)
 ):
     """Get current status of the vector store."""
     try:
-        status_info = vector_store.get_status()
+        status_info = await executor.run_in_thread(vector_store.get_status)
         return VectorStatusResponse(**status_info)
     except Exception as e:
         raise HTTPException(
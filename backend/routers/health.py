@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Response, status
+from backend.models.schemas import HealthResponse, ReadinessResponse
+from backend.services.warmup import WarmupService
+from backend.dependencies import get_warmup_service
+
+router = APIRouter(tags=["Health"])
+
+@router.get("/healthz", response_model=HealthResponse)
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return HealthResponse()
+
+
+@router.get("/readyz", response_model=ReadinessResponse)
+async def readyz(
+    response: Response,
+    warmup: WarmupService = Depends(get_warmup_service)
+):
+    """Readiness: every service is warmed up; 503 until then."""
+    readiness = warmup.status()
+    if not readiness["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResponse(**readiness)
@@ -0,0 +1,163 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from backend.config import Settings
+from backend.logger import logger
+
+
+@dataclass
+class _Entry:
+    answer: dict
+    expires_at: float
+    size: int
+    embedding: np.ndarray | None = None
+    scope: str = ""
+
+
+class AnswerCache:
+    """LRU/TTL cache of RAG answers keyed by normalized query.
+
+    Entries are tagged with the vector store's collection version; any write to
+    the collection makes every cached answer stale. Answers retrieved under a
+    metadata filter are cached under that filter's scope and only served to
+    queries with the same filter.
+    """
+
+    def __init__(self, settings: Settings):
+        self.enabled = settings.answer_cache_enabled and settings.answer_cache_max_entries > 0
+        self.max_entries = settings.answer_cache_max_entries
+        self.max_bytes = settings.answer_cache_max_bytes
+        self.ttl = settings.answer_cache_ttl_seconds
+        self.similarity_threshold = settings.answer_cache_similarity_threshold
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._version: int | None = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        """Whether near-duplicate lookups by embedding are enabled."""
+        return self.enabled and self.similarity_threshold is not None
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+    def _key(self, query: str, scope: str) -> str:
+        key = self.normalize(query)
+        return f"{scope}\0{key}" if scope else key
+
+    def _sync_version(self, version: int) -> bool:
+        """Drop everything if the collection changed; False if the caller is stale."""
+        if self._version is None or version > self._version:
+            if self._entries:
+                logger.info(f"Collection changed (v{version}), clearing {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return version == self._version
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, query: str, version: int, scope: str = "") -> dict | None:
+        """Return the cached answer for an exact normalized match."""
+        if not self.enabled:
+            return None
+        key = self._key(query, scope)
+        with self._lock:
+            if not self._sync_version(version):
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                if not self.semantic:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.answer
+
+    def get_similar(self, embedding: list[float], version: int, scope: str = "") -> dict | None:
+        """Return the cached answer whose query embedding is closest, above the threshold."""
+        if not self.semantic:
+            return None
+        query_vec = self._unit(embedding)
+        with self._lock:
+            if not self._sync_version(version):
+                return None
+            now = time.monotonic()
+            keys = [
+                key for key, entry in self._entries.items()
+                if entry.embedding is not None and entry.scope == scope and entry.expires_at >= now
+            ]
+            if keys:
+                matrix = np.stack([self._entries[key].embedding for key in keys])
+                scores = matrix @ query_vec
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    logger.info(f"Near-duplicate answer cache hit (cosine {scores[best]:.3f})")
+                    return self._entries[keys[best]].answer
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        version: int,
+        answer: dict,
+        embedding: list[float] | None = None,
+        scope: str = ""
+    ) -> None:
+        """Store an answer computed against the given collection version."""
+        if not self.enabled:
+            return
+        key = self._key(query, scope)
+        vector = self._unit(embedding) if embedding is not None else None
+        size = (
+            sys.getsizeof(key)
+            + sum(sys.getsizeof(value) for value in answer.values())
+            + sum(sys.getsizeof(source) for source in answer.get("sources", []))
+            + (vector.nbytes if vector is not None else 0)
+        )
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if not self._sync_version(version):
+                # Computed before a write landed; don't cache a stale answer
+                return
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = _Entry(answer, time.monotonic() + self.ttl, size, vector, scope)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @staticmethod
+    def _unit(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,123 @@
+import json
+import os
+import time
+
+from backend.services.interprocess import FileLock
+from backend.services.metadata import source_key
+from backend.logger import logger
+
+STATS_PAGE_SIZE = 5000
+# Bumped when counts are keyed differently; older files are recounted once
+STATS_FORMAT = 2
+
+
+class CollectionStats:
+    """Per-source chunk counts and ingest metadata, kept up to date on every write.
+
+    Sources are counted by their scoped key (see metadata.source_key), so the
+    same filename in two namespaces or tenants counts as two sources.
+    Persisted as a small JSON file so status checks never scan the collection;
+    a full scan only happens once, for a collection that predates the file.
+    Worker processes sharing the file update it under a file lock and reload
+    it when another process has changed it.
+    """
+
+    def __init__(self, path: str | None):
+        self._path = path
+        self._lock = FileLock(f"{path}.lock" if path else None)
+        self._mtime_ns: int | None = None
+        self.source_counts: dict[str, int] = {}
+        self.last_ingest_at: float | None = None
+        self.embedding_dim: int | None = None
+        self.loaded = False
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Reload the file if it changed since it was last read or written here."""
+        if not self._path:
+            return
+        try:
+            mtime_ns = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        with open(self._path) as f:
+            data = json.load(f)
+        self.source_counts = data.get("source_counts", {})
+        self.last_ingest_at = data.get("last_ingest_at")
+        self.embedding_dim = data.get("embedding_dim")
+        self.loaded = data.get("format") == STATS_FORMAT
+        self._mtime_ns = mtime_ns
+
+    @property
+    def source_count(self) -> int:
+        with self._lock:
+            self._refresh()
+        # Chunks stored without a source are counted under a key with an empty source part
+        return sum(1 for key, count in self.source_counts.items() if key.split("\0")[-1] and count > 0)
+
+    def rebuild(self, collection) -> None:
+        """Recount sources by paging through the collection's metadata once."""
+        logger.info("Rebuilding collection stats...")
+        counts: dict[str, int] = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=STATS_PAGE_SIZE, offset=offset)
+            for metadata in page["metadatas"]:
+                key = source_key(metadata or {})
+                counts[key] = counts.get(key, 0) + 1
+            if len(page["ids"]) < STATS_PAGE_SIZE:
+                break
+            offset += STATS_PAGE_SIZE
+        with self._lock:
+            self.source_counts = counts
+            self.loaded = True
+            self._save()
+
+    def reset(self) -> None:
+        """Start from empty counts, for a collection with no chunks yet."""
+        with self._lock:
+            self.source_counts = {}
+            self.loaded = True
+
+    def record_added(self, keys: list[str]) -> None:
+        """Count newly stored chunks by scoped source key."""
+        with self._lock:
+            self._refresh()
+            for key in keys:
+                self.source_counts[key] = self.source_counts.get(key, 0) + 1
+            self.last_ingest_at = time.time()
+            self._save()
+
+    def record_removed(self, key: str, count: int) -> None:
+        """Uncount deleted chunks of a scoped source key."""
+        with self._lock:
+            self._refresh()
+            remaining = self.source_counts.get(key, 0) - count
+            if remaining > 0:
+                self.source_counts[key] = remaining
+            else:
+                self.source_counts.pop(key, None)
+            self.last_ingest_at = time.time()
+            self._save()
+
+    def record_embedding_dim(self, dim: int) -> None:
+        with self._lock:
+            self._refresh()
+            self.embedding_dim = dim
+            self._save()
+
+    def _save(self) -> None:
+        if not self._path:
+            return
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "format": STATS_FORMAT,
+                "source_counts": self.source_counts,
+                "last_ingest_at": self.last_ingest_at,
+                "embedding_dim": self.embedding_dim
+            }, f)
+        os.replace(tmp_path, self._path)
+        self._mtime_ns = os.stat(self._path).st_mtime_ns
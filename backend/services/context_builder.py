@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+from backend.config import Settings
+from backend.logger import logger
+
+# Shorter suffix/prefix matches are treated as coincidence, not splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+
+def overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for n in range(min(len(left), len(right), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+@dataclass
+class _Piece:
+    """A selected chunk and the text it contributes to the context."""
+    doc: Document
+    rank: int
+    text: str
+    truncated: bool = False
+    next: "_Piece | None" = None
+    prev: "_Piece | None" = None
+
+
+class ContextBuilder:
+    """Assembles the prompt context from ranked chunks within a token budget.
+
+    Chunks are taken in relevance order until the budget is spent; the last
+    one that doesn't fit is truncated. Adjacent chunks of the same source are
+    merged into one passage with the splitter's overlap removed, so shared
+    text is neither paid for nor shown twice.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.max_chars = int(settings.context_max_tokens * settings.context_chars_per_token)
+        self.min_fragment_chars = int(settings.context_min_fragment_tokens * settings.context_chars_per_token)
+        # Expanded parent sections overlap by their own splitter's overlap
+        self.max_overlap = max(settings.chunk_overlap, settings.parent_chunk_overlap if settings.parent_chunk_size else 0)
+
+    def _tokens(self, chars: int) -> int:
+        return round(chars / self.settings.context_chars_per_token)
+
+    @staticmethod
+    def _ranked(docs: list[Document]) -> list[Document]:
+        """Docs by descending relevance score, keeping the given order when unscored."""
+        if all("relevance_score" in doc.metadata for doc in docs):
+            return sorted(docs, key=lambda doc: doc.metadata["relevance_score"], reverse=True)
+        return list(docs)
+
+    def _link(self, piece: _Piece, selected: list[_Piece]) -> tuple[int, int]:
+        """Chain a piece to same-source neighbors it overlaps.
+        
+        Returns the chars shared with its predecessor and with its successor.
+        """
+        shared_prev = shared_next = 0
+        source = piece.doc.metadata.get("source")
+        for other in selected:
+            if other.doc.metadata.get("source") != source:
+                continue
+            if other.next is None and piece.prev is None and not other.truncated:
+                n = overlap_length(other.text, piece.text, self.max_overlap)
+                if n:
+                    other.next, piece.prev = piece, other
+                    shared_prev = n
+                    continue
+            if piece.next is None and other.prev is None:
+                n = overlap_length(piece.text, other.text, self.max_overlap)
+                if n:
+                    piece.next, other.prev = other, piece
+                    shared_next = n
+        return shared_prev, shared_next
+
+    def _passages(self, selected: list[_Piece]) -> list[tuple[int, str]]:
+        """Merge chained pieces into passages, each ranked by its best chunk."""
+        passages, seen = [], set()
+        for head in selected:
+            if head.prev is not None:
+                continue
+            text, rank, piece = head.text, head.rank, head
+            seen.add(id(head))
+            while piece.next is not None and id(piece.next) not in seen:
+                following = piece.next
+                n = overlap_length(piece.text, following.text, self.max_overlap)
+                text += following.text[n:]
+                rank = min(rank, following.rank)
+                seen.add(id(following))
+                piece = following
+            passages.append((rank, text))
+        # Pieces on a cycle of coincidental overlaps have no head; keep them as they are
+        passages.extend((piece.rank, piece.text) for piece in selected if id(piece) not in seen)
+        return sorted(passages)
+
+    def build(self, docs: list[Document]) -> tuple[str, list[Document]]:
+        """Build the context string and return it with the chunks it draws on."""
+        selected: list[_Piece] = []
+        raw_chars = sum(len(doc.page_content) for doc in docs)
+        used_chars = overlap_chars = 0
+
+        for rank, doc in enumerate(self._ranked(docs)):
+            piece = _Piece(doc, rank, doc.page_content)
+            shared_prev, shared_next = self._link(piece, selected)
+            cost = len(piece.text) - shared_prev - shared_next
+            remaining = self.max_chars - used_chars
+            if cost > remaining:
+                # Truncating cuts the tail, so only a link to the predecessor survives
+                if piece.next is not None:
+                    piece.next.prev = piece.next = None
+                if remaining >= self.min_fragment_chars:
+                    cut = piece.text[:shared_prev + remaining]
+                    piece.text = cut[:cut.rfind(" ")] if " " in cut[shared_prev:] else cut
+                    piece.truncated = True
+                    selected.append(piece)
+                    used_chars += len(piece.text) - shared_prev
+                    overlap_chars += shared_prev
+                elif piece.prev is not None:
+                    piece.prev.next = piece.prev = None
+                break
+            selected.append(piece)
+            used_chars += cost
+            overlap_chars += shared_prev + shared_next
+
+        context = "\n\n".join(text for _, text in self._passages(selected))
+        used_docs = [piece.doc for piece in sorted(selected, key=lambda piece: piece.rank)]
+        saved = raw_chars - used_chars
+        if saved > 0:
+            logger.info(
+                f"Context: {len(used_docs)}/{len(docs)} chunks, ~{self._tokens(used_chars)} tokens; "
+                f"saved ~{self._tokens(saved)} tokens (~{self._tokens(overlap_chars)} overlap)"
+            )
+        return context, used_docs
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from backend.config import Settings
+from backend.logger import logger
+from backend.metrics import span, CACHE_LOOKUPS
+
+# Provider caches are dropped locally this long before they expire remotely
+EXPIRY_MARGIN_SECONDS = 30.0
+
+
+class ContextCache(ABC):
+    """Provider-side caching of popular prompt prefixes.
+
+    The RAG prompt starts with the instructions and the retrieved context and
+    ends with the question, so answers drawn from the same chunks share a
+    prefix. Once a prefix long enough for the provider has been seen
+    context_cache_min_uses times, it is uploaded to the provider's cache; later
+    calls send only the question with the cache's name, and the prefix is
+    billed as cached input. Subclasses create and delete caches for one
+    provider.
+    """
+
+    def __init__(self, settings: Settings):
+        self.min_uses = max(1, settings.context_cache_min_uses)
+        self.min_chars = int(settings.context_cache_min_tokens * settings.context_chars_per_token)
+        self.ttl = settings.context_cache_ttl_seconds
+        self.max_entries = settings.context_cache_max_entries
+
+        # Uses of prefixes not cached yet, by hash, forgotten after a TTL without use
+        self._uses: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._names: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._creating: set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(prefix: str) -> str:
+        return hashlib.blake2b(prefix.encode(), digest_size=16).hexdigest()
+
+    @abstractmethod
+    def _create(self, digest: str, prefix: str) -> str:
+        """Upload a prefix to the provider and return its cache name."""
+
+    @abstractmethod
+    def _delete(self, name: str) -> None:
+        """Delete a provider cache before it expires."""
+
+    def _popular(self, digest: str, now: float) -> bool:
+        """Under the lock: count a use of an uncached prefix; True once it should be cached."""
+        uses, expires_at = self._uses.pop(digest, (0, now))
+        uses = uses + 1 if expires_at >= now else 1
+        if uses >= self.min_uses:
+            return True
+        self._uses[digest] = (uses, now + self.ttl)
+        while len(self._uses) > self.max_entries * 16:
+            self._uses.popitem(last=False)
+        return False
+
+    def lookup(self, prefix: str) -> str | None:
+        """Name of the provider cache holding prefix, creating it once the prefix is popular.
+
+        Returns None when the prefix should be sent in full. Blocks on the
+        provider while a cache is created.
+        """
+        if len(prefix) < self.min_chars:
+            return None
+        digest = self._hash(prefix)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._names.get(digest)
+            if cached is not None and cached[1] > now:
+                self._names.move_to_end(digest)
+                CACHE_LOOKUPS.inc(cache="provider_context", result="hit")
+                return cached[0]
+            CACHE_LOOKUPS.inc(cache="provider_context", result="miss")
+            if cached is not None:
+                del self._names[digest]
+            # Concurrent uses of a prefix being uploaded are sent in full
+            if digest in self._creating or not self._popular(digest, now):
+                return None
+            self._creating.add(digest)
+        try:
+            with span("context_cache_create"):
+                name = self._create(digest, prefix)
+        except Exception as e:
+            logger.warning(f"Could not cache a {len(prefix)}-char context: {str(e)}")
+            return None
+        finally:
+            with self._lock:
+                self._creating.discard(digest)
+        logger.info(f"Cached a {len(prefix)}-char context as {name}")
+
+        with self._lock:
+            self._names[digest] = (name, time.monotonic() + self.ttl - EXPIRY_MARGIN_SECONDS)
+            evicted = []
+            while len(self._names) > self.max_entries:
+                evicted.append(self._names.popitem(last=False)[1][0])
+        for old in evicted:
+            try:
+                self._delete(old)
+            except Exception as e:
+                # It expires on its own after the TTL
+                logger.warning(f"Could not delete context cache {old}: {str(e)}")
+        return name
+
+
+class GeminiContextCache(ContextCache):
+    """Context caches created with Gemini's explicit caching API."""
+
+    def __init__(self, settings: Settings, client, model: str):
+        super().__init__(settings)
+        self._client = client
+        self._model = model
+
+    def _create(self, digest: str, prefix: str) -> str:
+        from google.genai import types
+        cache = self._client.caches.create(
+            model=self._model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                display_name=f"rag-context-{digest[:16]}",
+                ttl=f"{int(self.ttl)}s"
+            )
+        )
+        return cache.name
+
+    def _delete(self, name: str) -> None:
+        self._client.caches.delete(name=name)
+
+
+class LocalContextCache(ContextCache):
+    """Stand-in for a provider cache: prefixes are kept in a dict the fake chat model reads.
+
+    Lets the cached-prompt path run offline, in benchmarks and smoke tests.
+    """
+
+    def __init__(self, settings: Settings, store: dict[str, str]):
+        super().__init__(settings)
+        self.store = store
+
+    def _create(self, digest: str, prefix: str) -> str:
+        name = f"cachedContents/local-{digest}"
+        self.store[name] = prefix
+        return name
+
+    def _delete(self, name: str) -> None:
+        self.store.pop(name, None)
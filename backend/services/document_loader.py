@@ -0,0 +1,114 @@
+import codecs
+import os
+import tarfile
+import tempfile
+import zipfile
+from typing import Iterator
+
+from pypdf import PdfReader
+
+TEXT_BLOCK_SIZE = 64 * 1024
+ARCHIVE_COPY_SIZE = 1024 * 1024
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_pdf(filename: str | None, head: bytes) -> bool:
+    """Check file extension or PDF magic number (%PDF-)."""
+    return (filename or "").lower().endswith(".pdf") or head.startswith(b"%PDF-")
+
+
+# PDF helpers are module-level with light imports so they can run in a spawned
+# worker process; they take a path so only page text crosses the process boundary.
+
+def count_pdf_pages(path: str) -> int:
+    """Count the pages of a PDF file."""
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> list[tuple[int, str]]:
+    """Extract (page number, text) from pages [start, stop) of a PDF file, skipping empty pages.
+
+    Page numbers start at 1.
+    """
+    reader = PdfReader(path)
+    pages = []
+    for number, page in enumerate(reader.pages[start:stop], start + 1):
+        text = page.extract_text()
+        if text:
+            pages.append((number, text + "\n"))
+    return pages
+
+
+def iter_text_blocks(path: str, block_size: int = TEXT_BLOCK_SIZE) -> Iterator[str]:
+    """Lazily decode a UTF-8 text file in blocks."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            text = decoder.decode(block)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def is_archive(filename: str | None) -> bool:
+    """Check whether an upload is a zip or tar archive by its extension."""
+    return (filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _skip_member(name: str) -> bool:
+    """Skip OS metadata entries such as __MACOSX/ and ._ resource forks."""
+    base = os.path.basename(name)
+    return name.startswith("__MACOSX/") or base.startswith("._") or base == ".DS_Store"
+
+
+def extract_archive(
+    path: str,
+    filename: str,
+    dest_dir: str,
+    max_members: int,
+    max_bytes: int
+) -> list[tuple[str, str]]:
+    """Copy each regular file of an archive into dest_dir.
+
+    Members are streamed to fresh temp files rather than extracted by name, so
+    archive paths can never escape dest_dir. Raises ValueError, leaving nothing
+    behind, once the archive has more than max_members files or more than
+    max_bytes uncompressed, counted as bytes are copied so headers can't lie
+    about either. Returns (member name, path) pairs.
+    """
+    members = []
+    total = 0
+
+    def copy(name: str, source) -> None:
+        nonlocal total
+        if len(members) >= max_members:
+            raise ValueError(f"more than {max_members} files")
+        fd, member_path = tempfile.mkstemp(prefix="rag-member-", dir=dest_dir)
+        members.append((f"{filename}/{name}", member_path))
+        with os.fdopen(fd, "wb") as out:
+            while block := source.read(ARCHIVE_COPY_SIZE):
+                total += len(block)
+                if total > max_bytes:
+                    raise ValueError(f"more than {max_bytes} bytes uncompressed")
+                out.write(block)
+
+    try:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and not _skip_member(info.filename):
+                        with archive.open(info) as source:
+                            copy(info.filename, source)
+        else:
+            with tarfile.open(path, "r:*") as archive:
+                for member in archive:
+                    if member.isfile() and not _skip_member(member.name):
+                        with archive.extractfile(member) as source:
+                            copy(member.name, source)
+    except BaseException:
+        for _, member_path in members:
+            os.remove(member_path)
+        raise
+    return members
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.logger import logger
+from backend.services.interprocess import FileLock
+from backend.services.model_providers import embed_queries
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches vectors by content hash.
+
+    With a cache directory, document vectors are appended to a float32 file
+    that is memory-mapped for reads, and row keys to a text index, one per line.
+    Worker processes sharing the directory append under a file lock and pick
+    up each other's rows from the key index. Without a directory, the cache
+    lives in memory only. Query vectors are never persisted: every distinct
+    question would add a row, so they are kept in a bounded in-memory LRU.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    KEYS_FILE = "keys.txt"
+    META_FILE = "meta.json"
+    LOCK_FILE = "cache.lock"
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_dir: str | None = None,
+        max_queries: int = 10000
+    ):
+        self._embeddings = embeddings
+        self.model_name = model_name
+        self.max_queries = max_queries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._queries: OrderedDict[str, list[float]] = OrderedDict()
+        self._index: dict[str, int] = {}
+        self._rows: list[np.ndarray] = []
+        self._mmap: np.memmap | None = None
+        self._dim: int | None = None
+        self._keys_offset = 0  # bytes of the key index already read into _index
+
+        # One directory per model: vectors from different models never mix
+        self._dir = None
+        self._file_lock = FileLock(None)
+        if cache_dir:
+            self._dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]", "_", model_name))
+            os.makedirs(self._dir, exist_ok=True)
+            self._file_lock = FileLock(self._path(self.LOCK_FILE))
+            with self._file_lock:
+                self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+
+    def _load(self) -> None:
+        """Open the on-disk cache, dropping any rows a crash left half-written."""
+        if not os.path.exists(self._path(self.META_FILE)):
+            return
+
+        with open(self._path(self.META_FILE)) as f:
+            self._dim = json.load(f)["dim"]
+        with open(self._path(self.KEYS_FILE)) as f:
+            keys = f.read().split()
+
+        row_bytes = self._dim * 4
+        rows = os.path.getsize(self._path(self.VECTORS_FILE)) // row_bytes
+        count = min(len(keys), rows)
+        if count < len(keys) or count < rows:
+            logger.warning(f"Repairing embedding cache at {self._dir}: keeping {count} rows")
+            with open(self._path(self.VECTORS_FILE), "r+b") as f:
+                f.truncate(count * row_bytes)
+            with open(self._path(self.KEYS_FILE), "w") as f:
+                f.write("".join(f"{key}\n" for key in keys[:count]))
+
+        self._index = {key: row for row, key in enumerate(keys[:count])}
+        self._keys_offset = os.path.getsize(self._path(self.KEYS_FILE))
+        self._remap()
+        logger.info(f"Loaded {count} cached embeddings for {self.model_name}")
+
+    def _sync(self) -> None:
+        """Index rows that other worker processes appended since the last look.
+
+        Only complete key lines are read; their vectors were written first.
+        """
+        if not self._dir:
+            return
+        if self._dim is None:
+            if not os.path.exists(self._path(self.META_FILE)):
+                return
+            with open(self._path(self.META_FILE)) as f:
+                self._dim = json.load(f)["dim"]
+        try:
+            size = os.path.getsize(self._path(self.KEYS_FILE))
+        except FileNotFoundError:
+            return
+        if size <= self._keys_offset:
+            return
+        with open(self._path(self.KEYS_FILE), "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read(size - self._keys_offset)
+        complete = data[:data.rfind(b"\n") + 1]
+        if not complete:
+            return
+        for key in complete.decode().split():
+            self._index[key] = len(self._index)
+        self._keys_offset += len(complete)
+        self._remap()
+
+    def _remap(self) -> None:
+        """Map the vectors file to cover every row written so far."""
+        if self._index:
+            self._mmap = np.memmap(
+                self._path(self.VECTORS_FILE),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self._index), self._dim)
+            )
+
+    def _key(self, kind: str, text: str) -> str:
+        # Query and document embeddings differ for task-typed models, so keep them apart
+        return hashlib.blake2b(f"{kind}\0{text}".encode(), digest_size=16).hexdigest()
+
+    def _get(self, key: str) -> list[float] | None:
+        row = self._index.get(key)
+        if row is None:
+            return None
+        vector = self._mmap[row] if self._dir else self._rows[row]
+        return vector.tolist()
+
+    def _put(self, keys: list[str], vectors: list[list[float]]) -> None:
+        """Append rows; with a cache directory, the caller holds the file lock."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self._dim is None:
+            self._dim = matrix.shape[1]
+            if self._dir:
+                with open(self._path(self.META_FILE), "w") as f:
+                    json.dump({"model": self.model_name, "dim": self._dim}, f)
+
+        if self._dir:
+            # Drop what a writer that crashed mid-append left behind, so rows stay aligned
+            row_bytes = self._dim * 4
+            if os.path.exists(self._path(self.VECTORS_FILE)) and \
+                    os.path.getsize(self._path(self.VECTORS_FILE)) > len(self._index) * row_bytes:
+                os.truncate(self._path(self.VECTORS_FILE), len(self._index) * row_bytes)
+            if os.path.exists(self._path(self.KEYS_FILE)) and \
+                    os.path.getsize(self._path(self.KEYS_FILE)) > self._keys_offset:
+                os.truncate(self._path(self.KEYS_FILE), self._keys_offset)
+
+            # Vectors first, keys second: a crash leaves orphan rows, never dangling keys
+            lines = "".join(f"{key}\n" for key in keys).encode()
+            with open(self._path(self.VECTORS_FILE), "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self._path(self.KEYS_FILE), "ab") as f:
+                f.write(lines)
+            self._keys_offset += len(lines)
+        else:
+            self._rows.extend(matrix)
+
+        for key in keys:
+            self._index[key] = len(self._index)
+        if self._dir:
+            self._remap()
+
+    def _embed(self, kind: str, texts: list[str], embed_fn) -> list[list[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        results: dict[str, list[float]] = {}
+        missing: dict[str, str] = {}
+
+        with self._lock:
+            self._sync()
+            for key, text in zip(keys, texts):
+                vector = self._get(key)
+                if vector is not None:
+                    results[key] = vector
+                else:
+                    missing[key] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            with self._lock, self._file_lock:
+                self._sync()
+                new_keys = [key for key in missing if key not in self._index]
+                new_vectors = [vector for key, vector in zip(missing, vectors) if key not in self._index]
+                if new_keys:
+                    self._put(new_keys, new_vectors)
+            results.update(zip(missing, vectors))
+
+        return [results[key] for key in keys]
+
+    def _embed_queries(self, texts: list[str], embed_fn) -> list[list[float]]:
+        """Embed queries through the in-memory LRU."""
+        keys = [self._key("query", text) for text in texts]
+        results: dict[str, list[float]] = {}
+        missing: dict[str, str] = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._queries.get(key)
+                if vector is not None:
+                    self._queries.move_to_end(key)
+                    results[key] = vector
+                else:
+                    missing[key] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing, vectors):
+                    self._queries[key] = vector
+                    self._queries.move_to_end(key)
+                while len(self._queries) > self.max_queries:
+                    self._queries.popitem(last=False)
+            results.update(zip(missing, vectors))
+
+        return [results[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, calling the wrapped model only for uncached texts."""
+        return self._embed("document", texts, self._embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, calling the wrapped model only on a cache miss."""
+        return self._embed_queries([text], lambda texts: [self._embeddings.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed queries, batching the uncached ones into one call to the wrapped model."""
+        return self._embed_queries(texts, lambda missing: embed_queries(self._embeddings, missing))
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from backend.config import Settings
+from backend.logger import logger
+
+T = TypeVar("T")
+
+
+class ExecutorService:
+    """Bounded worker pools for running blocking work off the event loop."""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+        # Threads for blocking I/O and native code that releases the GIL
+        self._thread_pool = ThreadPoolExecutor(
+            max_workers=settings.thread_pool_max_workers,
+            thread_name_prefix="rag-worker"
+        )
+
+        # Processes for CPU-bound pure-Python work, created on first use
+        self._process_pool: ProcessPoolExecutor | None = None
+
+    def _get_process_pool(self) -> Executor:
+        """Get the process pool, falling back to threads when it is disabled."""
+        if self.settings.process_pool_max_workers <= 0:
+            return self._thread_pool
+        if self._process_pool is None:
+            logger.info(f"Starting process pool with {self.settings.process_pool_max_workers} workers")
+            # Spawn instead of fork: the parent already runs threads
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.settings.process_pool_max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    async def run_in_thread(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking callable on the bounded thread pool."""
+        loop = asyncio.get_running_loop()
+        # Carry context variables (request timings) into the worker thread, like asyncio.to_thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._thread_pool, partial(context.run, func, *args, **kwargs))
+
+    def submit(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> Future[T]:
+        """Start a blocking callable on the bounded thread pool from synchronous code."""
+        context = contextvars.copy_context()
+        return self._thread_pool.submit(context.run, func, *args, **kwargs)
+
+    async def run_in_process(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a picklable module-level callable on the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_process_pool(), partial(func, *args))
+
+    def shutdown(self) -> None:
+        """Shut down both pools, waiting for running work to finish."""
+        self._thread_pool.shutdown(wait=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import Any, AsyncIterator, Iterator
+
+import numpy as np
+from pydantic import Field
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+class FakeRateLimitError(Exception):
+    """Raised by FakeChatModel in place of a provider's 429."""
+
+    code = 429
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic offline chat model with configurable latency, for benchmarks.
+
+    Answers are answer_tokens words drawn from the prompt, seeded by the prompt,
+    so the same prompt always gets the same answer. With error_rate set, that
+    fraction of calls fails with a 429 before producing anything. Calls may pass
+    cached_content, the name of a prefix in cached_contents (see
+    LocalContextCache), which is put in front of the first message and reported
+    as cache-read input tokens.
+    """
+
+    first_token_latency_ms: float = 200.0
+    token_latency_ms: float = 20.0
+    answer_tokens: int = 64
+    error_rate: float = 0.0
+    cached_contents: dict[str, str] = Field(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: list[BaseMessage]) -> list[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        words = prompt.split() or ["ok"]
+        rng = np.random.default_rng(_seed(prompt))
+        return [words[i] for i in rng.integers(0, len(words), self.answer_tokens)]
+
+    def _with_cached(self, messages: list[BaseMessage], cached_content: str | None) -> tuple[list[BaseMessage], int]:
+        """Messages with the cached prefix restored, and the prefix's token count."""
+        if cached_content is None:
+            return messages, 0
+        if cached_content not in self.cached_contents:
+            raise ValueError(f"Cached content {cached_content} not found")
+        prefix = self.cached_contents[cached_content]
+        first = HumanMessage(content=prefix + str(messages[0].content))
+        return [first, *messages[1:]], len(prefix.split())
+
+    def _usage(self, messages: list[BaseMessage], output_tokens: int, cached_tokens: int = 0) -> dict:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+        if cached_tokens:
+            usage["input_token_details"] = {"cache_read": cached_tokens}
+        return usage
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED: fake rate limit")
+
+    def _delay(self, index: int) -> float:
+        return (self.first_token_latency_ms if index == 0 else self.token_latency_ms) / 1000
+
+    def _chunk(self, messages: list[BaseMessage], tokens: list[str], index: int, cached_tokens: int) -> ChatGenerationChunk:
+        text = tokens[index] if index == 0 else " " + tokens[index]
+        last = index == len(tokens) - 1
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content=text,
+            usage_metadata=self._usage(messages, len(tokens), cached_tokens) if last else None
+        ))
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        cached_content: str | None = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self._maybe_fail()
+        messages, cached_tokens = self._with_cached(messages, cached_content)
+        tokens = self._tokens(messages)
+        time.sleep(sum(self._delay(i) for i in range(len(tokens))))
+        message = AIMessage(content=" ".join(tokens), usage_metadata=self._usage(messages, len(tokens), cached_tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        cached_content: str | None = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self._maybe_fail()
+        messages, cached_tokens = self._with_cached(messages, cached_content)
+        tokens = self._tokens(messages)
+        await asyncio.sleep(sum(self._delay(i) for i in range(len(tokens))))
+        message = AIMessage(content=" ".join(tokens), usage_metadata=self._usage(messages, len(tokens), cached_tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        cached_content: str | None = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        self._maybe_fail()
+        messages, cached_tokens = self._with_cached(messages, cached_content)
+        tokens = self._tokens(messages)
+        for index in range(len(tokens)):
+            time.sleep(self._delay(index))
+            yield self._chunk(messages, tokens, index, cached_tokens)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        cached_content: str | None = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self._maybe_fail()
+        messages, cached_tokens = self._with_cached(messages, cached_content)
+        tokens = self._tokens(messages)
+        for index in range(len(tokens)):
+            await asyncio.sleep(self._delay(index))
+            yield self._chunk(messages, tokens, index, cached_tokens)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embeddings with a fixed latency per call, for benchmarks.
+
+    Vectors are unit-length and seeded by the text, so equal texts embed equally.
+    """
+
+    def __init__(self, dimension: int = 768, latency_ms: float = 50.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
@@ -0,0 +1,520 @@
+import asyncio
+import bisect
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import UploadFile
+from pypdf.errors import PdfReadError
+from langchain_text_splitters import TextSplitter
+
+from backend.config import Settings
+from backend.services.vector_store import VectorStoreService, ChunkWrite
+from backend.services.metadata import scope_of
+from backend.services.executor import ExecutorService
+from backend.services.document_loader import (
+    is_pdf,
+    is_archive,
+    extract_archive,
+    count_pdf_pages,
+    extract_pdf_pages,
+    iter_text_blocks
+)
+from backend.logger import logger
+from backend.metrics import span
+
+SPOOL_READ_SIZE = 1024 * 1024
+
+
+class IncrementalSplitter:
+    """Split a stream of text segments, carrying the unfinished tail into the next one.
+
+    Segments may carry a page number; each chunk comes back with the page it starts on.
+    """
+
+    def __init__(self, splitter: TextSplitter, window: int):
+        self._splitter = splitter
+        self._window = window
+        self._buffer = ""
+        self._pages: list[tuple[int, int | None]] = []  # (buffer offset, page) where each segment starts
+        self._top: str | None = None  # Highest-priority separator seen in the stream so far
+
+    def _page_at(self, offset: int) -> int | None:
+        index = bisect.bisect_right(self._pages, offset, key=lambda entry: entry[0]) - 1
+        return self._pages[index][1] if index >= 0 else None
+
+    def _split(self) -> list[tuple[str, int, int | None]]:
+        """Split the buffer into (chunk, offset, page) triples."""
+        chunks = []
+        cursor = 0
+        overlap = getattr(self._splitter, "_chunk_overlap", 0)
+        for chunk in self._splitter.split_text(self._buffer):
+            # Chunks are stripped substrings in order, each overlapping the previous one by at most the overlap
+            start = self._buffer.find(chunk, cursor)
+            if start < 0:
+                start = cursor
+            chunks.append((chunk, start, self._page_at(start)))
+            cursor = max(start + 1, start + len(chunk) - overlap)
+        return chunks
+
+    def _separators(self) -> list[str]:
+        """Separators the splitter keeps in front of pieces, highest priority first; empty if it drops them."""
+        if getattr(self._splitter, "_keep_separator", False) not in (True, "start"):
+            return []
+        return [separator for separator in getattr(self._splitter, "_separators", []) if separator]
+
+    def _carry_from(self, chunks: list[tuple[str, int, int | None]]) -> int:
+        """Index of the chunk to carry into the next split, and re-split from there.
+
+        The splitter never merges across its highest separator in the text, and
+        keeps separators in front of the pieces they start. So the carried text
+        starts at the latest chunk that opens such a piece, separator included,
+        provided the chunks before it end on pieces the next segment can't
+        extend and it carries no overlap from them. Chunks then match splitting
+        the whole text at once. If that would leave more than a window carried,
+        as in text with no line breaks, the last chunk is carried instead and
+        boundaries may differ slightly.
+        """
+        separators = self._separators()
+        for separator in separators:
+            if separator == self._top:
+                break
+            if separator in self._buffer:
+                self._top = separator
+                break
+        top = self._top
+        if top is not None:
+            complete = self._buffer.rfind(top)
+            for index in range(len(chunks) - 1, 0, -1):
+                start = chunks[index][1]
+                if len(self._buffer) - start > self._window:
+                    break
+                previous, previous_start, _ = chunks[index - 1]
+                previous_end = previous_start + len(previous)
+                # Overlap kept at a chunk's start depends on the next piece's length, which may be cut short
+                if self._buffer[:start].endswith(top) and start >= previous_end and previous_end <= complete:
+                    return index
+        return len(chunks) - 1
+
+    def _piece_start(self, start: int) -> int:
+        """Back up from a chunk's start over the separator the splitter keeps in front of it."""
+        preceding = self._buffer[:start]
+        for separator in sorted(self._separators(), key=len, reverse=True):
+            if preceding.endswith(separator):
+                return start - len(separator)
+        return start
+
+    def feed(self, text: str, page: int | None = None) -> list[tuple[str, int | None]]:
+        """Add text and return the chunks that can no longer change, with their pages."""
+        self._pages.append((len(self._buffer), page))
+        self._buffer += text
+        if len(self._buffer) < self._window:
+            return []
+        chunks = self._split()
+        if not chunks:
+            self._buffer, self._pages = "", []
+            return []
+        # Chunks from the carried one on may still change with the next segment. The raw
+        # text is carried, whitespace included, so words aren't glued across segments.
+        carried = self._carry_from(chunks)
+        _, start, carried_page = chunks[carried]
+        start = self._piece_start(start)
+        self._pages = [(0, carried_page)] + [
+            (offset - start, page) for offset, page in self._pages if offset > start
+        ]
+        self._buffer = self._buffer[start:]
+        return [(chunk, page) for chunk, _, page in chunks[:carried]]
+
+    def flush(self) -> list[tuple[str, int | None]]:
+        """Return the remaining chunks, with their pages."""
+        chunks = self._split() if self._buffer.strip() else []
+        self._buffer, self._pages, self._top = "", [], None
+        return [(chunk, page) for chunk, _, page in chunks]
+
+
+@dataclass
+class IngestionProgress:
+    """Counters updated in place while a file is ingested."""
+    pages_parsed: int = 0
+    pages_total: int | None = None
+    chunks_embedded: int = 0
+
+
+@dataclass
+class IngestionResult:
+    """Chunk ids of an ingested file and what the write changed."""
+    ids: list[str]
+    added: int = 0
+    skipped: int = 0
+    removed: int = 0
+
+    @classmethod
+    def from_writes(cls, writes: list[ChunkWrite]) -> "IngestionResult":
+        added = sum(write.added for write in writes)
+        return cls(
+            ids=list(dict.fromkeys(write.id for write in writes)),
+            added=added,
+            skipped=len(writes) - added
+        )
+
+
+class BatchWriter:
+    """Groups chunks into batches and writes them with bounded concurrency.
+
+    Each chunk is tagged with an owner (e.g. the index of the file it came from)
+    so one batch can mix chunks from many files and still be attributed per file.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[str], list[dict]], Awaitable[list[ChunkWrite]]],
+        batch_size: int,
+        max_in_flight: int,
+        progress: IngestionProgress | None = None,
+        fail_fast: bool = True
+    ):
+        self._write = write
+        self._batch_size = batch_size
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._progress = progress or IngestionProgress()
+        self._fail_fast = fail_fast
+
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        self._owners: list[int] = []
+        self._batches: list[tuple[list[int], asyncio.Task]] = []
+        self._failure: BaseException | None = None
+
+    async def add(self, text: str, metadata: dict | None = None, owner: int = 0) -> None:
+        """Queue a chunk, writing a batch once enough have accumulated."""
+        if self._failure is not None and self._fail_fast:
+            raise self._failure
+        self._texts.append(text)
+        self._metadatas.append(dict(metadata or {}))
+        self._owners.append(owner)
+        if len(self._texts) >= self._batch_size:
+            await self._submit()
+
+    async def _submit(self) -> None:
+        texts, metadatas, owners = self._texts, self._metadatas, self._owners
+        self._texts, self._metadatas, self._owners = [], [], []
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(texts, metadatas))
+        task.add_done_callback(self._on_done)
+        self._batches.append((owners, task))
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._slots.release()
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._failure = self._failure or task.exception()
+        else:
+            self._progress.chunks_embedded += sum(write.added for write in task.result())
+
+    async def close(self) -> None:
+        """Write the remaining chunks and wait for every batch."""
+        if self._texts:
+            await self._submit()
+        await asyncio.gather(*(task for _, task in self._batches), return_exceptions=True)
+        if self._failure is not None and self._fail_fast:
+            raise self._failure
+
+    async def settle(self) -> None:
+        """Drop chunks not yet submitted and wait for the batches in flight."""
+        self._texts, self._metadatas, self._owners = [], [], []
+        await asyncio.gather(*(task for _, task in self._batches), return_exceptions=True)
+
+    async def abort(self) -> None:
+        """Cancel batches still in flight."""
+        tasks = [task for _, task in self._batches]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def writes_by_owner(self) -> dict[int, list[ChunkWrite]]:
+        """Written chunks per owner, in chunk order."""
+        writes: dict[int, list[ChunkWrite]] = {}
+        for owners, task in self._batches:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                for owner, write in zip(owners, task.result()):
+                    writes.setdefault(owner, []).append(write)
+        return writes
+
+    def errors_by_owner(self) -> dict[int, str]:
+        """First write error per owner."""
+        errors: dict[int, str] = {}
+        for owners, task in self._batches:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                for owner in owners:
+                    errors.setdefault(owner, str(task.exception()))
+        return errors
+
+
+class IngestionService:
+    """Streams uploaded files into the vector store in bounded, concurrent batches."""
+
+    def __init__(self, settings: Settings, vector_store: VectorStoreService, executor: ExecutorService):
+        self.settings = settings
+        self.vector_store = vector_store
+        self.executor = executor
+        
+        # Shared by every upload and job so ingestion can't exhaust the embedding rate limit
+        self._embed_slots = asyncio.Semaphore(settings.embedding_max_concurrency)
+
+    async def spool(self, file: UploadFile, directory: str | None = None) -> str:
+        """Copy an upload to a temporary file without holding it in memory."""
+        fd, path = tempfile.mkstemp(prefix="rag-upload-", dir=directory)
+        try:
+            with span("upload_spool"), os.fdopen(fd, "wb") as out:
+                while block := await file.read(SPOOL_READ_SIZE):
+                    out.write(block)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    @staticmethod
+    def detect_pdf(path: str, filename: str | None) -> bool:
+        """Check whether a spooled file is a PDF."""
+        with open(path, "rb") as f:
+            return is_pdf(filename, f.read(5))
+
+    async def iter_segments(
+        self,
+        path: str,
+        pdf: bool,
+        progress: IngestionProgress | None = None
+    ) -> AsyncIterator[tuple[str, int | None]]:
+        """Lazily yield (text, page number) for PDF pages, or (text, None) for decoded text blocks."""
+        progress = progress or IngestionProgress()
+        if pdf:
+            try:
+                page_count = await self.executor.run_in_process(count_pdf_pages, path)
+                progress.pages_total = page_count
+                step = self.settings.ingestion_pdf_pages_per_task
+                for start in range(0, page_count, step):
+                    stop = min(start + step, page_count)
+                    with span("pdf_extract"):
+                        pages = await self.executor.run_in_process(extract_pdf_pages, path, start, stop)
+                    progress.pages_parsed = stop
+                    for number, text in pages:
+                        yield text, number
+            except PdfReadError as e:
+                raise ValueError(f"Invalid PDF: {str(e)}") from e
+        else:
+            blocks = iter_text_blocks(path)
+            while (block := await self.executor.run_in_thread(next, blocks, None)) is not None:
+                yield block, None
+
+    async def _write_batch(self, texts: list[str], metadatas: list[dict]) -> list[ChunkWrite]:
+        """Embed and store one batch once an embedding slot is free."""
+        with span("embed_slot_wait"):
+            await self._embed_slots.acquire()
+        try:
+            return await self.executor.run_in_thread(self.vector_store.add_chunks, texts, metadatas)
+        finally:
+            self._embed_slots.release()
+
+    async def _discard(self, writes: list[ChunkWrite], keep_ids: set[str] | None = None) -> None:
+        """Delete the chunks a failed file added; chunks it found already stored stay."""
+        added = [write.id for write in writes if write.added and write.id not in (keep_ids or set())]
+        if added:
+            await self.executor.run_in_thread(self.vector_store.delete_chunks, added)
+
+    async def _split_into(
+        self,
+        writer: BatchWriter,
+        path: str,
+        pdf: bool,
+        metadata: dict | None = None,
+        owner: int = 0,
+        progress: IngestionProgress | None = None
+    ) -> None:
+        """Feed a file's chunks to a batch writer as they are extracted, tagged with their page.
+        
+        For small-to-big retrieval the splitter yields parent sections, which are
+        stored as they come and split into the child chunks that get written.
+        """
+        splitter = IncrementalSplitter(
+            self.vector_store.text_splitter,
+            window=(self.settings.parent_chunk_size or self.settings.chunk_size) * 4
+        )
+
+        def with_page(page: int | None) -> dict | None:
+            return metadata if page is None else {**(metadata or {}), "page": page}
+
+        async def emit(chunks: list[tuple[str, int | None]]) -> None:
+            texts = [chunk for chunk, _ in chunks]
+            metadatas = [with_page(page) for _, page in chunks]
+            if self.settings.parent_chunk_size and chunks:
+                texts, metadatas = await self.executor.run_in_thread(self.vector_store.add_parents, texts, metadatas)
+            for text, chunk_metadata in zip(texts, metadatas):
+                await writer.add(text, chunk_metadata, owner)
+
+        async for segment, segment_page in self.iter_segments(path, pdf, progress):
+            await emit(splitter.feed(segment, segment_page))
+        await emit(splitter.flush())
+
+    async def ingest_file(
+        self,
+        path: str,
+        pdf: bool,
+        metadata: dict | None = None,
+        progress: IngestionProgress | None = None
+    ) -> IngestionResult:
+        """Extract, split, embed and store a file, keeping memory flat in its size.
+
+        Chunks already stored for the same source are skipped; once the whole file
+        is written, chunks of that source that it no longer contains are removed.
+        If the file fails partway, e.g. on a bad PDF page, the chunks it added are
+        deleted again.
+        """
+        progress = progress or IngestionProgress()
+        writer = BatchWriter(
+            self._write_batch,
+            batch_size=self.settings.ingestion_batch_size,
+            max_in_flight=self.settings.ingestion_max_concurrency,
+            progress=progress
+        )
+        try:
+            with span("ingest_file"):
+                await self._split_into(writer, path, pdf, metadata, progress=progress)
+                await writer.close()
+        except Exception:
+            await writer.settle()
+            await self._discard(writer.writes_by_owner().get(0, []))
+            raise
+        except BaseException:
+            await writer.abort()
+            raise
+
+        result = IngestionResult.from_writes(writer.writes_by_owner().get(0, []))
+        source = (metadata or {}).get("source")
+        if source and result.ids:
+            result.removed = await self.executor.run_in_thread(
+                self.vector_store.delete_stale, source, set(result.ids), scope_of(metadata or {})
+            )
+        logger.info(
+            f"Ingested {len(result.ids)} chunks: {result.added} added, "
+            f"{result.skipped} skipped, {result.removed} removed"
+        )
+        return result
+
+    async def ingest_upload(self, file: UploadFile, metadata: dict | None = None) -> IngestionResult:
+        """Spool an upload to disk and ingest it under its filename as source."""
+        path = await self.spool(file)
+        try:
+            pdf = self.detect_pdf(path, file.filename)
+            logger.info(f"Processing {'PDF' if pdf else 'text file'}: {file.filename}")
+            return await self.ingest_file(path, pdf, {"source": file.filename, **(metadata or {})})
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def _bulk_result(filename: str, error: str | None = None) -> dict:
+        return {
+            "filename": filename,
+            "chunks_count": 0,
+            "added_count": 0,
+            "skipped_count": 0,
+            "removed_count": 0,
+            "error": error
+        }
+
+    async def ingest_bulk(self, files: list[UploadFile], metadata: dict | None = None) -> list[dict]:
+        """Ingest many files and archives, extracting in parallel and writing shared batches.
+
+        Every file is stored under its own name as source, plus the given metadata.
+        Returns one result per file (archive members count as files); a failing
+        file is reported in its result, with none of its chunks kept, without
+        failing the others. Files with the same name are stored together under
+        that source, and its removed chunks are reported on the first of them.
+        """
+        metadata = metadata or {}
+        workdir = tempfile.mkdtemp(prefix="rag-bulk-")
+        try:
+            entries: list[tuple[str, str]] = []
+            results: list[dict] = []
+            for file in files:
+                path = await self.spool(file, directory=workdir)
+                if not is_archive(file.filename):
+                    entries.append((file.filename, path))
+                    continue
+                try:
+                    entries.extend(
+                        await self.executor.run_in_thread(
+                            extract_archive,
+                            path,
+                            file.filename,
+                            workdir,
+                            self.settings.ingestion_archive_max_members,
+                            self.settings.ingestion_archive_max_bytes
+                        )
+                    )
+                except Exception as e:
+                    results.append(self._bulk_result(file.filename, f"Invalid archive: {str(e)}"))
+                finally:
+                    os.remove(path)
+
+            offset = len(results)
+            results.extend(self._bulk_result(name) for name, _ in entries)
+            writer = BatchWriter(
+                self._write_batch,
+                batch_size=self.settings.ingestion_bulk_batch_size,
+                max_in_flight=self.settings.ingestion_max_concurrency,
+                fail_fast=False
+            )
+            file_slots = asyncio.Semaphore(self.settings.ingestion_bulk_max_files)
+
+            async def produce(owner: int, name: str, path: str):
+                async with file_slots:
+                    try:
+                        pdf = self.detect_pdf(path, name)
+                        await self._split_into(writer, path, pdf, {"source": name, **metadata}, owner=owner)
+                    except Exception as e:
+                        logger.error(f"Error processing {name}: {str(e)}")
+                        results[owner]["error"] = str(e)
+
+            try:
+                await asyncio.gather(*(
+                    produce(offset + i, name, path) for i, (name, path) in enumerate(entries)
+                ))
+                await writer.close()
+            except BaseException:
+                await writer.abort()
+                raise
+
+            for owner, error in writer.errors_by_owner().items():
+                results[owner]["error"] = results[owner]["error"] or error
+            writes_by_owner = writer.writes_by_owner()
+            # A file that failed partway keeps none of the chunks it added, unless another file wrote them too
+            kept_ids = {
+                write.id for owner, writes in writes_by_owner.items()
+                if results[owner]["error"] is None for write in writes
+            }
+            # Files sharing a name, e.g. repeated archive members, replace their source together
+            ids_by_source: dict[str, tuple[int, set[str]]] = {}
+            for owner, writes in sorted(writes_by_owner.items()):
+                if results[owner]["error"] is not None:
+                    await self._discard(writes, kept_ids)
+                    continue
+                written = IngestionResult.from_writes(writes)
+                result = results[owner]
+                result["chunks_count"] = len(written.ids)
+                result["added_count"] = written.added
+                result["skipped_count"] = written.skipped
+                ids_by_source.setdefault(result["filename"], (owner, set()))[1].update(written.ids)
+            # Only fully written files may replace what their source had before
+            for source, (owner, ids) in ids_by_source.items():
+                results[owner]["removed_count"] = await self.executor.run_in_thread(
+                    self.vector_store.delete_stale, source, ids, scope_of(metadata)
+                )
+            for result in results:
+                if result["error"] is None and result["chunks_count"] == 0:
+                    result["error"] = "File is empty"
+            return results
+        finally:
+            await self.executor.run_in_thread(shutil.rmtree, workdir, ignore_errors=True)
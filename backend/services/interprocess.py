@@ -0,0 +1,83 @@
+import fcntl
+import os
+import sqlite3
+import threading
+
+# How long SQLite waits on another process's write lock before failing
+SQLITE_BUSY_TIMEOUT_SECONDS = 30.0
+
+
+def connect_sqlite(db_path: str | None) -> sqlite3.Connection:
+    """Open a SQLite database that several worker processes can share.
+
+    WAL lets readers proceed during a write, and the busy timeout makes
+    concurrent writers wait for each other instead of failing.
+    """
+    conn = sqlite3.connect(db_path or ":memory:", timeout=SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    if db_path:
+        conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class FileLock:
+    """Exclusive lock shared by threads and processes, backed by flock on a lock file.
+
+    Without a path it only locks between threads, for stores that live in memory.
+    """
+
+    def __init__(self, path: str | None):
+        self._path = path
+        self._thread_lock = threading.RLock()
+        self._fd: int | None = None
+        self._depth = 0
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._path and self._depth == 0:
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                self._thread_lock.release()
+                return False
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._fd is not None and self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class SharedCounter:
+    """Monotonic counter every worker process sees, stored in SQLite."""
+
+    def __init__(self, db_path: str | None):
+        self._conn = connect_sqlite(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS counter (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO counter VALUES (0, 0)")
+
+    @property
+    def value(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM counter").fetchone()[0]
+
+    def increment(self) -> int:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE counter SET value = value + 1")
+            return self._conn.execute("SELECT value FROM counter").fetchone()[0]
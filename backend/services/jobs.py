@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from fastapi import UploadFile
+
+from backend.config import Settings
+from backend.services.executor import ExecutorService
+from backend.services.ingestion import IngestionService, IngestionProgress
+from backend.services.interprocess import FileLock, connect_sqlite
+from backend.logger import logger
+
+PROGRESS_INTERVAL_SECONDS = 1.0
+# How often workers look for jobs queued by other processes, and how often a
+# process that is not the leader retries taking over
+JOB_POLL_SECONDS = 1.0
+LEADER_RETRY_SECONDS = 5.0
+
+
+class JobStore:
+    """SQLite-backed record of ingestion jobs."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        filename TEXT,
+        path TEXT NOT NULL,
+        is_pdf INTEGER NOT NULL,
+        metadata TEXT,
+        status TEXT NOT NULL,
+        pages_parsed INTEGER NOT NULL DEFAULT 0,
+        pages_total INTEGER,
+        chunks_embedded INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+    """
+
+    def __init__(self, db_path: str):
+        self._conn = connect_sqlite(db_path)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(self.SCHEMA)
+            # Stores created before per-upload metadata lack the column
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "metadata" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN metadata TEXT")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, filename: str | None, path: str, is_pdf: bool, metadata: dict | None = None) -> str:
+        """Record a queued job and return its id."""
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, filename, path, is_pdf, metadata, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, filename, path, int(is_pdf), json.dumps(metadata or {}), time.time())
+        )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Get a job by id."""
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def claim_next(self) -> dict | None:
+        """Atomically mark the oldest queued job running and return it."""
+        rows = self._execute(
+            """
+            UPDATE jobs SET status = 'running', started_at = ?, pages_parsed = 0, chunks_embedded = 0
+            WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)
+            RETURNING *
+            """,
+            (time.time(),)
+        )
+        return dict(rows[0]) if rows else None
+
+    def update_progress(self, job_id: str, progress: IngestionProgress) -> None:
+        self._execute(
+            "UPDATE jobs SET pages_parsed = ?, pages_total = ?, chunks_embedded = ? WHERE id = ?",
+            (progress.pages_parsed, progress.pages_total, progress.chunks_embedded, job_id)
+        )
+
+    def mark_finished(self, job_id: str, progress: IngestionProgress, error: str | None = None) -> None:
+        self.update_progress(job_id, progress)
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            ("failed" if error else "completed", error, time.time(), job_id)
+        )
+
+    def recover(self) -> int:
+        """Requeue jobs a previous leader left unfinished and return how many are queued."""
+        self._execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0][0]
+
+
+class IngestionJobQueue:
+    """Runs uploads as background jobs on a fixed pool of worker tasks.
+
+    Every worker process accepts uploads into the shared job store, but only
+    the one holding the leader lock runs jobs, so a job never runs twice and
+    recovery never requeues a job another process is still running. When the
+    leader exits, another process takes over and resumes its jobs.
+    """
+
+    def __init__(self, settings: Settings, ingestion: IngestionService, executor: ExecutorService):
+        self.settings = settings
+        self.ingestion = ingestion
+        self.executor = executor
+
+        # Jobs and their spooled files live next to the Chroma data so they survive restarts
+        base_dir = (
+            os.path.join(settings.chroma_persist_directory, "ingestion_jobs")
+            if settings.chroma_persist_directory
+            else tempfile.mkdtemp(prefix="rag-jobs-")
+        )
+        self._upload_dir = os.path.join(base_dir, "uploads")
+        os.makedirs(self._upload_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(base_dir, "jobs.sqlite3"))
+        self._leader_lock = FileLock(os.path.join(base_dir, "leader.lock"))
+        self.is_leader = False
+
+        # Uploads may be queued before start(), e.g. while the app is still warming up
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start running jobs, now if this process becomes the leader, later otherwise."""
+        self._workers = [asyncio.create_task(self._lead())]
+
+    async def stop(self) -> None:
+        """Stop the workers; interrupted jobs are resumed by the next leader."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.is_leader:
+            self._leader_lock.release()
+            self.is_leader = False
+
+    async def _lead(self) -> None:
+        """Wait to become the leader, then resume unfinished jobs and start the workers."""
+        while not self._leader_lock.acquire(blocking=False):
+            await asyncio.sleep(LEADER_RETRY_SECONDS)
+        self.is_leader = True
+
+        queued = await self.executor.run_in_thread(self.store.recover)
+        if queued:
+            logger.info(f"Resuming {queued} ingestion jobs")
+        self._workers.extend(
+            asyncio.create_task(self._worker())
+            for _ in range(self.settings.ingestion_job_workers)
+        )
+
+    async def submit(self, file: UploadFile, metadata: dict | None = None) -> str:
+        """Spool an upload and queue it for ingestion with extra chunk metadata."""
+        path = await self.ingestion.spool(file, directory=self._upload_dir)
+        pdf = self.ingestion.detect_pdf(path, file.filename)
+        job_id = await self.executor.run_in_thread(self.store.create, file.filename, path, pdf, metadata)
+        self._wakeup.set()
+        logger.info(f"Queued ingestion job {job_id} for {file.filename}")
+        return job_id
+
+    async def get(self, job_id: str) -> dict | None:
+        """Get a job's state, with throughput computed from its counters."""
+        job = await self.executor.run_in_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        chunks_per_second = None
+        if job["started_at"]:
+            elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+            chunks_per_second = job["chunks_embedded"] / elapsed if elapsed > 0 else None
+        return {**job, "job_id": job["id"], "chunks_per_second": chunks_per_second}
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.executor.run_in_thread(self.store.claim_next)
+            if job is not None:
+                await self._run(job)
+                continue
+            # Local submits wake the workers at once; other processes' are polled
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _report(self, job_id: str, progress: IngestionProgress) -> None:
+        """Persist progress periodically while a job runs."""
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            await self.executor.run_in_thread(self.store.update_progress, job_id, progress)
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["id"]
+        logger.info(f"Running ingestion job {job_id} ({job['filename']})")
+        progress = IngestionProgress()
+        reporter = asyncio.create_task(self._report(job_id, progress))
+        error = None
+        try:
+            result = await self.ingestion.ingest_file(
+                job["path"],
+                bool(job["is_pdf"]),
+                {"source": job["filename"], **json.loads(job["metadata"] or "{}")},
+                progress=progress
+            )
+            if not result.ids:
+                error = "File is empty"
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+            error = str(e)
+        finally:
+            # On cancellation (shutdown) the job stays 'running' and its file stays put
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+        await self.executor.run_in_thread(self.store.mark_finished, job_id, progress, error)
+        if os.path.exists(job["path"]):
+            os.remove(job["path"])
+        logger.info(f"Ingestion job {job_id} finished with {progress.chunks_embedded} chunks")
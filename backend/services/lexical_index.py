@@ -0,0 +1,180 @@
+import heapq
+import json
+import math
+import re
+import threading
+from collections import Counter
+
+from backend.services.interprocess import connect_sqlite
+from backend.services.metadata import where_sql
+from backend.logger import logger
+
+# Keep identifiers and error codes such as "ERR_CONN_RESET", "E-1234" or "0x8007" whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.:/]\w+)*")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query terms in more than this share of chunks add little to a score but most
+# of the postings read, so they are skipped once the index holds enough chunks
+COMMON_TERM_FRACTION = 0.5
+COMMON_TERM_MIN_DOCS = 1000
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens; compound tokens also contribute their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-.:/_]", token) if part)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring, stored in SQLite and updated per chunk.
+
+    Each chunk's metadata is kept alongside it, so searches filtered by a where
+    clause are answered by the index alone.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, metadata TEXT);
+    CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        doc_id TEXT NOT NULL,
+        tf INTEGER NOT NULL,
+        PRIMARY KEY (term, doc_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL);
+    INSERT OR IGNORE INTO meta VALUES ('doc_count', 0), ('total_length', 0);
+    """
+
+    def __init__(self, db_path: str | None):
+        self._conn = connect_sqlite(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+            if "metadata" not in columns:
+                # Indexes built before metadata was stored are rebuilt from the collection
+                logger.info("Lexical index has no chunk metadata, rebuilding it")
+                self._conn.executescript(
+                    "DROP TABLE docs; DROP TABLE terms; DROP TABLE postings; DROP TABLE meta;" + self.SCHEMA
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT value FROM meta WHERE key = 'doc_count'").fetchone()[0])
+
+    def add(self, doc_ids: list[str], texts: list[str], metadatas: list[dict | None] | None = None) -> None:
+        """Index chunks with their metadata; ids already indexed are left as they are."""
+        metadatas = metadatas or [None] * len(doc_ids)
+        with self._lock, self._conn:
+            added = 0
+            total_length = 0
+            for doc_id, text, metadata in zip(doc_ids, texts, metadatas):
+                tokens = tokenize(text)
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO docs VALUES (?, ?, ?)", (doc_id, len(tokens), json.dumps(metadata or {}))
+                )
+                if cursor.rowcount == 0:
+                    continue
+                counts = Counter(tokens)
+                self._conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in counts.items()]
+                )
+                self._conn.executemany(
+                    "INSERT INTO terms VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in counts]
+                )
+                added += 1
+                total_length += len(tokens)
+            self._update_meta(added, total_length)
+
+    def remove(self, doc_ids: list[str]) -> None:
+        """Drop chunks from the index."""
+        with self._lock, self._conn:
+            removed = 0
+            total_length = 0
+            for doc_id in doc_ids:
+                row = self._conn.execute("SELECT length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is None:
+                    continue
+                terms = self._conn.execute(
+                    "SELECT term FROM postings WHERE doc_id = ?", (doc_id,)
+                ).fetchall()
+                self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", terms)
+                self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                removed += 1
+                total_length += row[0]
+            self._conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._update_meta(-removed, -total_length)
+
+    def _update_meta(self, doc_delta: int, length_delta: int) -> None:
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'doc_count'", (doc_delta,))
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_length'", (length_delta,))
+
+    def search(self, query: str, k: int | None = None, where: dict | None = None) -> list[tuple[str, float]]:
+        """Return the top-k (doc_id, score) pairs for a query; every match, ranked, without k.
+
+        Only chunks whose metadata matches the Chroma-style where clause are scored.
+        In large indexes, terms most chunks contain are left out of the score.
+        """
+        terms = list(set(tokenize(query)))
+        if not terms or (k is not None and k <= 0):
+            return []
+        filter_sql, filter_params = where_sql(where, "d.metadata") if where else ("1", [])
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+            doc_count = meta["doc_count"]
+            if not doc_count:
+                return []
+            dfs = dict(self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({','.join('?' * len(terms))})", terms
+            ))
+            if not dfs:
+                return []
+            if doc_count >= COMMON_TERM_MIN_DOCS:
+                # A query of only common terms still matches on its rarest one
+                rarest = min(dfs.values())
+                dfs = {
+                    term: df for term, df in dfs.items()
+                    if df <= COMMON_TERM_FRACTION * doc_count or df == rarest
+                }
+            placeholders = ",".join("?" for _ in dfs)
+            rows = self._conn.execute(
+                f"""
+                SELECT p.term, p.doc_id, p.tf, d.length
+                FROM postings p
+                JOIN docs d ON d.doc_id = p.doc_id
+                WHERE p.term IN ({placeholders}) AND {filter_sql}
+                """,
+                [*dfs, *filter_params]
+            ).fetchall()
+
+        avg_length = meta["total_length"] / doc_count or 1.0
+        scores: dict[str, float] = {}
+        for term, doc_id, tf, length in rows:
+            df = dfs[term]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        if k is None:
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def rebuild(self, collection, page_size: int = 5000) -> None:
+        """Index every chunk of a collection, for stores that predate the index."""
+        logger.info("Building lexical index from existing collection...")
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            self.add(page["ids"], page["documents"], page["metadatas"])
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        logger.info(f"Lexical index holds {len(self)} chunks")
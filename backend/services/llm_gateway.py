@@ -0,0 +1,488 @@
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import re
+import threading
+import time
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from backend.config import Settings
+from backend.logger import logger
+from backend.metrics import (
+    record_timing,
+    LLM_QUEUE_WAIT_SECONDS,
+    LLM_QUEUE_DEPTH,
+    LLM_IN_FLIGHT,
+    LLM_CONCURRENCY_LIMIT,
+    LLM_ATTEMPTS
+)
+
+T = TypeVar("T")
+
+# Lower runs first: answers users wait on, then query rewrites
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Gemini's 429 details carry e.g. "retryDelay": "37s"
+RETRY_DELAY_PATTERN = re.compile(r"retryDelay\W+(\d+(?:\.\d+)?)s")
+
+
+class LLMOverloadedError(Exception):
+    """The LLM gateway could not run a call: its queue is full or the provider keeps throttling."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status_code(exc: BaseException) -> int | None:
+    """HTTP status of an error or of the error it wraps, as SDKs report it."""
+    while exc is not None:
+        for attribute in ("code", "status_code"):
+            value = getattr(exc, attribute, None)
+            if isinstance(value, int):
+                return value
+        exc = exc.__cause__
+    return None
+
+
+def is_throttled(exc: BaseException) -> bool:
+    return _status_code(exc) == 429 or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Throttling, server errors and transport failures; not bad requests."""
+    if _status_code(exc) in RETRYABLE_STATUS or is_throttled(exc):
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from httpx import TransportError
+    except ImportError:
+        return False
+    return isinstance(exc, TransportError) or isinstance(exc.__cause__, TransportError)
+
+
+def _retry_delay(exc: BaseException) -> float | None:
+    """Delay the provider asked for before retrying, if it said."""
+    match = RETRY_DELAY_PATTERN.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+class _Waiter:
+    """A queued call, woken from any thread when it may be able to run."""
+
+    def __init__(self, priority: int, loop: asyncio.AbstractEventLoop | None):
+        self.priority = priority
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class LLMGateway:
+    """Admission control and retries for every call to the chat model provider.
+
+    Calls queue by priority, then arrival, for a concurrency slot and, with
+    llm_requests_per_second set, a token from a bucket shared by all callers,
+    sync and async. The concurrency limit adapts: halved on each throttled
+    call, grown back by one per limit's worth of successes (AIMD), so bursts
+    queue here instead of turning into 429s. Failed attempts are retried with
+    full-jitter exponential backoff, releasing their slot while they wait. A
+    non-streaming call still pending after llm_hedge_after_ms gets a second,
+    identical attempt when a slot is free, and the first answer wins.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._queue: list[tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self._in_flight = 0
+        self._limit = float(settings.llm_max_concurrency)
+        self._tokens = float(settings.llm_burst)
+        self._refilled_at = time.monotonic()
+        LLM_CONCURRENCY_LIMIT.set(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # Admission
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        rate = self.settings.llm_requests_per_second
+        if rate:
+            self._tokens = min(float(self.settings.llm_burst), self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    def _free(self) -> float:
+        """Under the lock: 0 if a slot and a token are free, else seconds until a token is (inf for a slot)."""
+        if self._in_flight >= int(self._limit):
+            return math.inf
+        rate = self.settings.llm_requests_per_second
+        if rate and self._tokens < 1:
+            return (1 - self._tokens) / rate
+        return 0.0
+
+    def _take(self) -> None:
+        self._in_flight += 1
+        if self.settings.llm_requests_per_second:
+            self._tokens -= 1
+
+    def _publish(self) -> None:
+        for priority, name in PRIORITY_NAMES.items():
+            LLM_QUEUE_DEPTH.set(self._waiting[priority], priority=name)
+        LLM_IN_FLIGHT.set(self._in_flight)
+
+    def _head(self) -> _Waiter | None:
+        return self._queue[0][2] if self._queue else None
+
+    def _enqueue(self, priority: int, loop: asyncio.AbstractEventLoop | None) -> _Waiter:
+        waiter = _Waiter(priority, loop)
+        with self._lock:
+            if len(self._queue) >= self.settings.llm_max_queue:
+                LLM_ATTEMPTS.inc(outcome="rejected")
+                raise LLMOverloadedError("LLM queue is full", retry_after=1.0)
+            heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+            self._waiting[priority] += 1
+            self._publish()
+        return waiter
+
+    def _try_admit(self, waiter: _Waiter) -> float:
+        """Admit the waiter if it is first in line and capacity is free; else return how long to wait."""
+        with self._lock:
+            self._refill()
+            if self._head() is not waiter:
+                return math.inf
+            wait = self._free()
+            if wait:
+                return wait
+            heapq.heappop(self._queue)
+            self._waiting[waiter.priority] -= 1
+            self._take()
+            self._publish()
+            following = self._head()
+        if following is not None:
+            following.wake()
+        return 0.0
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        """Drop a waiter that gave up, letting the one behind it move up."""
+        with self._lock:
+            entries = [entry for entry in self._queue if entry[2] is not waiter]
+            if len(entries) == len(self._queue):
+                return
+            self._queue = entries
+            heapq.heapify(self._queue)
+            self._waiting[waiter.priority] -= 1
+            self._publish()
+            head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._publish()
+            head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _try_acquire_now(self) -> bool:
+        """Take a slot only if it is free and nobody is queued, for hedged attempts."""
+        with self._lock:
+            self._refill()
+            if self._queue or self._free():
+                return False
+            self._take()
+            self._publish()
+            return True
+
+    def _admitted(self, priority: int, started: float) -> None:
+        waited = time.monotonic() - started
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=PRIORITY_NAMES[priority])
+        record_timing("llm_queue_wait", waited)
+
+    def _timed_out(self, priority: int, started: float) -> LLMOverloadedError:
+        self._admitted(priority, started)
+        LLM_ATTEMPTS.inc(outcome="rejected")
+        return LLMOverloadedError(
+            f"Timed out after {self.settings.llm_queue_timeout_seconds:.0f}s in the LLM queue",
+            retry_after=self.settings.llm_queue_timeout_seconds
+        )
+
+    def _acquire(self, priority: int) -> None:
+        started = time.monotonic()
+        deadline = started + self.settings.llm_queue_timeout_seconds
+        waiter = self._enqueue(priority, None)
+        try:
+            while True:
+                waiter.event.clear()
+                wait = self._try_admit(waiter)
+                if not wait:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(priority, started)
+                waiter.event.wait(min(wait, remaining))
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+        self._admitted(priority, started)
+
+    async def _aacquire(self, priority: int) -> None:
+        started = time.monotonic()
+        deadline = started + self.settings.llm_queue_timeout_seconds
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        try:
+            while True:
+                waiter.event.clear()
+                wait = self._try_admit(waiter)
+                if not wait:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(priority, started)
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(wait, remaining))
+                except TimeoutError:
+                    pass
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+        self._admitted(priority, started)
+
+    @contextmanager
+    def _slot(self, priority: int) -> Iterator[None]:
+        self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def _aslot(self, priority: int) -> AsyncIterator[None]:
+        await self._aacquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # Outcomes
+
+    def _succeeded(self) -> None:
+        LLM_ATTEMPTS.inc(outcome="ok")
+        with self._lock:
+            if self._limit >= self.settings.llm_max_concurrency:
+                return
+            # Additive increase: about one more slot per limit's worth of successes
+            self._limit = min(float(self.settings.llm_max_concurrency), self._limit + 1 / self._limit)
+            LLM_CONCURRENCY_LIMIT.set(self._limit)
+            head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _failed(self, exc: Exception, attempt: int) -> float:
+        """Account for a failed attempt; return the backoff before retrying, or raise."""
+        if is_throttled(exc):
+            LLM_ATTEMPTS.inc(outcome="throttled")
+            with self._lock:
+                # Multiplicative decrease while the provider pushes back
+                self._limit = max(1.0, self._limit / 2)
+                LLM_CONCURRENCY_LIMIT.set(self._limit)
+        else:
+            LLM_ATTEMPTS.inc(outcome="error")
+        if not is_retryable(exc):
+            raise exc
+        hinted = _retry_delay(exc)
+        if attempt >= self.settings.llm_max_retries or (hinted or 0) > self.settings.llm_retry_max_seconds:
+            if is_throttled(exc):
+                raise LLMOverloadedError(
+                    f"LLM provider is throttling requests: {exc}",
+                    retry_after=hinted or self.settings.llm_retry_max_seconds
+                ) from exc
+            raise exc
+        ceiling = min(self.settings.llm_retry_max_seconds, self.settings.llm_retry_base_seconds * 2 ** attempt)
+        delay = max(random.uniform(0, ceiling), hinted or 0)
+        LLM_ATTEMPTS.inc(outcome="retry")
+        logger.warning(f"LLM call failed ({exc.__class__.__name__}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    # Calls
+
+    def run(self, priority: int, call: Callable[[], T]) -> T:
+        """Run a blocking call, retried on transient failures."""
+        for attempt in itertools.count():
+            try:
+                with self._slot(priority):
+                    result = call()
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                time.sleep(self._failed(e, attempt))
+            else:
+                self._succeeded()
+                return result
+
+    async def arun(self, priority: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Run a call, retried on transient failures and hedged when it is slow."""
+        for attempt in itertools.count():
+            try:
+                async with self._aslot(priority):
+                    result = await self._hedged(call)
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._failed(e, attempt))
+            else:
+                self._succeeded()
+                return result
+
+    async def _hedged(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Await a call, adding a second identical attempt if it is still pending after the hedge delay."""
+        if self.settings.llm_hedge_after_ms is None:
+            return await call()
+        attempts = [asyncio.ensure_future(call())]
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.settings.llm_hedge_after_ms / 1000)
+            if not done and self._try_acquire_now():
+                hedged = True
+                LLM_ATTEMPTS.inc(outcome="hedge")
+                attempts.append(asyncio.ensure_future(call()))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+            # Every attempt failed; report the first one's error
+            return attempts[0].result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            if hedged:
+                self._release()
+
+    def stream(self, priority: int, open_stream: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """Stream a call, retried on transient failures until its first item is out."""
+        for attempt in itertools.count():
+            started = False
+            try:
+                with self._slot(priority):
+                    for item in open_stream():
+                        started = True
+                        yield item
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                if started:
+                    # An answer that was partly sent can't be replayed
+                    LLM_ATTEMPTS.inc(outcome="error")
+                    raise
+                delay = self._failed(e, attempt)
+            else:
+                self._succeeded()
+                return
+            time.sleep(delay)
+
+    async def astream(self, priority: int, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Stream a call, retried on transient failures until its first item is out."""
+        for attempt in itertools.count():
+            started = False
+            try:
+                async with self._aslot(priority):
+                    async with aclosing(open_stream()) as items:
+                        async for item in items:
+                            started = True
+                            yield item
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                if started:
+                    LLM_ATTEMPTS.inc(outcome="error")
+                    raise
+                delay = self._failed(e, attempt)
+            else:
+                self._succeeded()
+                return
+            await asyncio.sleep(delay)
+
+
+class GatewayChatModel(BaseChatModel):
+    """Chat model that sends every call of the wrapped model through an LLMGateway at one priority."""
+
+    llm: BaseChatModel
+    gateway: LLMGateway
+    priority: int = INTERACTIVE
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.llm._llm_type}"
+
+    def with_priority(self, priority: int) -> "GatewayChatModel":
+        """The same model and gateway, queued at another priority."""
+        return self.model_copy(update={"priority": priority})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = self.gateway.run(self.priority, lambda: self.llm.invoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = await self.gateway.arun(self.priority, lambda: self.llm.ainvoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        for chunk in self.gateway.stream(self.priority, lambda: self.llm.stream(messages, stop=stop, **kwargs)):
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self.gateway.astream(self.priority, lambda: self.llm.astream(messages, stop=stop, **kwargs))
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                yield ChatGenerationChunk(message=chunk)
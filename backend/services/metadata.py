@@ -0,0 +1,99 @@
+import json
+
+# Keys that scope a source: the same filename uploaded to two namespaces or
+# tenants is stored, deduplicated and replaced independently
+SCOPE_KEYS = ("namespace", "tenant")
+# Chroma metadata values are scalars, so each tag is also stored as its own flag
+TAG_PREFIX = "tag:"
+# Where operators with a direct SQL counterpart
+COMPARISONS = {"$eq": "=", "$ne": "IS NOT", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def parse_tags(tags: str | None) -> list[str]:
+    """Split a comma-separated tag list, dropping blanks and duplicates."""
+    return list(dict.fromkeys(tag.strip() for tag in (tags or "").split(",") if tag.strip()))
+
+
+def upload_metadata(namespace: str | None = None, tenant: str | None = None, tags: list[str] | None = None) -> dict:
+    """Metadata attached to every chunk of an upload, besides its source and page."""
+    metadata = {}
+    if namespace:
+        metadata["namespace"] = namespace
+    if tenant:
+        metadata["tenant"] = tenant
+    if tags:
+        metadata["tags"] = ",".join(tags)
+        metadata.update({f"{TAG_PREFIX}{tag}": True for tag in tags})
+    return metadata
+
+
+def scope_of(metadata: dict) -> dict:
+    """The scope keys set in a chunk's metadata."""
+    return {key: metadata[key] for key in SCOPE_KEYS if metadata.get(key)}
+
+
+def source_key(metadata: dict) -> str:
+    """Source of a chunk qualified by its scope; just the source when unscoped."""
+    scope = [f"{key}={value}" for key, value in scope_of(metadata).items()]
+    return "\0".join([*scope, metadata.get("source", "")])
+
+
+def build_where(
+    namespace: str | None = None,
+    tenant: str | None = None,
+    sources: list[str] | None = None,
+    tags: list[str] | None = None,
+    where: dict | None = None
+) -> dict | None:
+    """Combine metadata filters into one Chroma where clause; None matches everything.
+
+    All filters must hold; a chunk matches tags only if it carries every one.
+    """
+    clauses = []
+    if namespace:
+        clauses.append({"namespace": namespace})
+    if tenant:
+        clauses.append({"tenant": tenant})
+    if sources:
+        clauses.append({"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}})
+    clauses.extend({f"{TAG_PREFIX}{tag}": True} for tag in tags or [])
+    if where:
+        clauses.append(where)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def where_key(where: dict | None) -> str:
+    """Canonical string of a where clause, for cache and single-flight keys."""
+    return json.dumps(where, sort_keys=True) if where else ""
+
+
+def where_sql(where: dict, column: str = "metadata") -> tuple[str, list]:
+    """Translate a Chroma metadata where clause to SQL over a JSON metadata column."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_sql(part, column) for part in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        value_sql = f"json_extract({column}, ?)"
+        path = "$." + json.dumps(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in COMPARISONS:
+                clauses.append(f"{value_sql} {COMPARISONS[operator]} ?")
+                params.extend([path, value])
+            elif operator in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value))
+                if operator == "$in":
+                    clauses.append(f"{value_sql} IN ({placeholders})" if value else "0")
+                    params.extend([path, *value] if value else [])
+                else:
+                    clauses.append(f"({value_sql} IS NULL OR {value_sql} NOT IN ({placeholders}))" if value else "1")
+                    params.extend([path, path, *value] if value else [])
+            else:
+                raise ValueError(f"Unsupported where operator {operator}")
+    return "(" + " AND ".join(clauses) + ")", params
@@ -0,0 +1,98 @@
+import inspect
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+
+from backend.config import Settings
+from backend.logger import logger
+from backend.services.context_cache import ContextCache, GeminiContextCache, LocalContextCache
+from backend.services.fake_models import FakeChatModel, FakeEmbeddings
+
+
+def create_chat_model(settings: Settings) -> BaseChatModel:
+    """Build the chat model selected by llm_provider."""
+    if settings.llm_provider == "fake":
+        return FakeChatModel(
+            first_token_latency_ms=settings.fake_llm_first_token_ms,
+            token_latency_ms=settings.fake_llm_token_ms,
+            answer_tokens=settings.fake_llm_answer_tokens,
+            error_rate=settings.fake_llm_error_rate
+        )
+    # Imported on use: the Gemini SDK is slow to import and unused with the fakes
+    import httpx
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=settings.llm_model,
+        temperature=settings.llm_temperature,
+        google_api_key=settings.gemini_api_key,
+        # Retries and concurrency are the gateway's job (see llm_gateway); 1 means a single attempt
+        max_retries=1,
+        timeout=settings.llm_timeout_seconds,
+        client_args={"limits": httpx.Limits(
+            max_connections=max(settings.llm_pool_connections, settings.llm_max_concurrency),
+            max_keepalive_connections=settings.llm_pool_connections
+        )}
+    )
+
+
+def create_context_cache(settings: Settings, llm: BaseChatModel) -> ContextCache | None:
+    """Build the provider context cache for a chat model built by create_chat_model, if enabled and supported."""
+    if not settings.context_cache_enabled:
+        return None
+    # Look through wrappers such as the LLM gateway's
+    llm = getattr(llm, "llm", llm)
+    if isinstance(llm, FakeChatModel):
+        return LocalContextCache(settings, llm.cached_contents)
+    client = getattr(llm, "client", None)
+    if client is not None and hasattr(client, "caches"):
+        return GeminiContextCache(settings, client, settings.llm_model)
+    logger.warning(f"Context caching is not supported for {llm._llm_type}, sending full prompts")
+    return None
+
+
+def create_embeddings(settings: Settings) -> Embeddings:
+    """Build the embedding model selected by embedding_provider."""
+    if settings.embedding_provider == "fake":
+        return FakeEmbeddings(
+            dimension=settings.fake_embedding_dimension,
+            latency_ms=settings.fake_embedding_latency_ms
+        )
+    if settings.embedding_provider == "onnx":
+        from backend.services.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            settings.embedding_model,
+            cache_dir=settings.embedding_model_cache_dir,
+            batch_size=settings.embedding_batch_size,
+            threads=settings.embedding_threads,
+            max_length=settings.embedding_max_length,
+            query_prefix=settings.embedding_query_prefix
+        )
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(
+        model=settings.embedding_model,
+        google_api_key=settings.gemini_api_key
+    )
+
+
+def embed_queries(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    """Embed several queries in one batched call where the model allows it.
+
+    Models may embed queries and documents differently, so embed_documents is
+    only used when it can be asked for query embeddings (Gemini's task_type).
+    """
+    batched = getattr(embeddings, "embed_queries", None)
+    if batched is not None:
+        return batched(texts)
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def embedding_model_id(settings: Settings) -> str:
+    """Name of the embedding model, used to keep cached vectors of different models apart."""
+    if settings.embedding_provider == "fake":
+        return f"fake-{settings.fake_embedding_dimension}"
+    if settings.embedding_provider == "onnx":
+        # The query prefix changes query vectors, so it is part of the model's identity
+        return f"onnx-{settings.embedding_model}-{settings.embedding_max_length}-{settings.embedding_query_prefix}"
+    return settings.embedding_model
@@ -0,0 +1,128 @@
+import json
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.logger import logger
+
+# Where an ONNX export may sit inside a model directory, most common first
+MODEL_FILES = ("onnx/model.onnx", "model.onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from a local ONNX model, run on the CPU with onnxruntime.
+
+    The model is a Hugging Face repo with an ONNX export (downloaded once) or a
+    local directory holding the same files. Texts are embedded in batches of
+    similar length to keep padding low; onnxruntime spreads each batch over
+    the configured threads. Vectors are pooled as the model's sentence-transformers
+    config says (mean by default) and normalized to unit length.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        cache_dir: str | None = None,
+        batch_size: int = 32,
+        threads: int | None = None,
+        max_length: int = 512,
+        query_prefix: str = ""
+    ):
+        # Imported here: onnxruntime is slow to import and unused with the API models
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model = model
+        self.batch_size = batch_size
+        self.query_prefix = query_prefix
+
+        model_dir = model if os.path.isdir(model) else self._download(model, cache_dir)
+        model_path = next(
+            (os.path.join(model_dir, name) for name in MODEL_FILES if os.path.exists(os.path.join(model_dir, name))),
+            None
+        )
+        if model_path is None:
+            raise FileNotFoundError(f"No ONNX model ({' or '.join(MODEL_FILES)}) in {model_dir}")
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.no_padding()
+        self._pad_id = self._tokenizer.token_to_id("[PAD]") or self._tokenizer.token_to_id("<pad>") or 0
+        self._pooling = self._read_pooling(model_dir)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {node.name for node in self._session.get_inputs()}
+        logger.info(
+            f"Loaded ONNX embedding model {model} ({self._pooling} pooling, "
+            f"{options.intra_op_num_threads} threads)"
+        )
+
+    @staticmethod
+    def _download(repo_id: str, cache_dir: str | None) -> str:
+        from huggingface_hub import snapshot_download
+        logger.info(f"Fetching embedding model {repo_id}...")
+        return snapshot_download(
+            repo_id,
+            cache_dir=cache_dir,
+            allow_patterns=["*.json", *MODEL_FILES]
+        )
+
+    @staticmethod
+    def _read_pooling(model_dir: str) -> str:
+        """CLS or mean pooling, from the sentence-transformers config when the model ships one."""
+        path = os.path.join(model_dir, "1_Pooling", "config.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                if json.load(f).get("pooling_mode_cls_token"):
+                    return "cls"
+        return "mean"
+
+    def _run(self, texts: list[str]) -> np.ndarray:
+        """Embed one batch, padded to its longest text."""
+        encodings = self._tokenizer.encode_batch(texts)
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.full((len(texts), length), self._pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        output = self._session.run(None, inputs)[0]
+
+        if output.ndim == 2:
+            # Exported with pooling included
+            vectors = output
+        elif self._pooling == "cls":
+            vectors = output[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(output.dtype)
+            vectors = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        # Batch texts of similar length together so little compute goes to padding
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors: list[np.ndarray | None] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for index, vector in zip(batch, self._run([texts[index] for index in batch])):
+                vectors[index] = vector
+        return [vector.tolist() for vector in vectors]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([self.query_prefix + text])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed([self.query_prefix + text for text in texts])
@@ -0,0 +1,67 @@
+import threading
+
+from backend.services.interprocess import connect_sqlite
+
+# Ids bound per SQL statement, below SQLite's variable limit
+LOOKUP_BATCH = 500
+
+
+class ParentStore:
+    """Parent sections of small-to-big retrieval, stored in SQLite and looked up by id.
+
+    Only child chunks are embedded; each carries its parent's id in metadata so
+    retrieved children can be swapped for their parent with a primary key read.
+    Parents are keyed by the scoped source (see metadata.source_key) so a
+    re-upload can drop the ones its source no longer contains.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS parents (
+        parent_id TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        text TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS parents_source ON parents (source);
+    """
+
+    def __init__(self, db_path: str | None):
+        self._conn = connect_sqlite(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    def put(self, parents: list[tuple[str, str, str]]) -> None:
+        """Store (parent_id, source, text) rows; ids already stored are left as they are."""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO parents VALUES (?, ?, ?)", parents)
+
+    def get(self, parent_ids: list[str]) -> dict[str, str]:
+        """Texts of the given parents by id; unknown ids are left out."""
+        return {parent_id: text for parent_id, _, text in self.rows(parent_ids)}
+
+    def rows(self, parent_ids: list[str]) -> list[tuple[str, str, str]]:
+        """Full (parent_id, source, text) rows, for copying parents to another store."""
+        unique = list(dict.fromkeys(parent_ids))
+        rows = []
+        with self._lock:
+            for start in range(0, len(unique), LOOKUP_BATCH):
+                batch = unique[start:start + LOOKUP_BATCH]
+                rows.extend(self._conn.execute(
+                    f"SELECT parent_id, source, text FROM parents WHERE parent_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+        return rows
+
+    def remove_stale(self, source: str, keep_ids: set[str]) -> int:
+        """Drop parents of a scoped source that are not in keep_ids; return how many."""
+        with self._lock, self._conn:
+            stored = [row[0] for row in self._conn.execute(
+                "SELECT parent_id FROM parents WHERE source = ?", (source,)
+            )]
+            stale = [(parent_id,) for parent_id in stored if parent_id not in keep_ids]
+            self._conn.executemany("DELETE FROM parents WHERE parent_id = ?", stale)
+        return len(stale)
@@ -0,0 +1,385 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from backend.services.interprocess import connect_sqlite
+from backend.services.metadata import where_sql
+from backend.logger import logger
+
+# Rows scored per step of the int8 scan, bounding the float32 scratch memory
+SCAN_BLOCK_ROWS = 65536
+# Vector files grow by at least this many rows at a time
+MIN_CAPACITY = 1024
+# Ids bound per SQL statement, below SQLite's variable limit
+SQL_BATCH = 500
+
+
+class _Rows:
+    """A growable (rows, width) array, memory-mapped from a file or held in memory."""
+
+    def __init__(self, path: str | None, width: int, dtype):
+        self._path = path
+        self._width = width
+        self._dtype = np.dtype(dtype)
+        self.data = np.zeros((0, width), dtype=self._dtype)
+        if path and os.path.exists(path):
+            self._map(os.path.getsize(path) // (width * self._dtype.itemsize))
+
+    def _map(self, capacity: int) -> None:
+        if capacity:
+            self.data = np.memmap(self._path, dtype=self._dtype, mode="r+", shape=(capacity, self._width))
+
+    def reserve(self, rows: int) -> None:
+        """Make room for at least rows rows, doubling the capacity to amortise remaps."""
+        if rows <= len(self.data):
+            return
+        capacity = max(rows, 2 * len(self.data), MIN_CAPACITY)
+        if not self._path:
+            grown = np.zeros((capacity, self._width), dtype=self._dtype)
+            grown[:len(self.data)] = self.data
+            self.data = grown
+            return
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+        with open(self._path, "ab") as f:
+            f.truncate(capacity * self._width * self._dtype.itemsize)
+        self._map(capacity)
+
+    def flush(self) -> None:
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+
+class QuantizedCollection:
+    """Vector collection with int8 codes for scanning and float32 vectors for exact re-scoring.
+
+    A query scans every live row's int8 code (a quarter of the float32 size,
+    and the only part that needs to stay in RAM), keeps rescore_factor times
+    the requested candidates, and re-ranks those with their exact vectors read
+    from a memory-mapped file, so results match an exact search unless the
+    true neighbours fall outside the candidates. Ids, documents and metadata
+    live in SQLite; where clauses become SQL over the metadata JSON. Distances
+    follow Chroma's: squared l2, 1 - cosine or 1 - inner product.
+
+    Implements the part of the Chroma collection API langchain's Chroma and
+    VectorStoreService use, so it can stand in for a Chroma collection.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: str | None = None,
+        space: str = "l2",
+        rescore_factor: int = 4,
+        metadata: dict | None = None
+    ):
+        self.name = name
+        self.metadata = metadata
+        self.rescore_factor = rescore_factor
+        base = os.path.join(directory, f"{name}_int8") if directory else None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = connect_sqlite(f"{base}.sqlite3" if base else None)
+        with self._conn:
+            # AUTOINCREMENT: a row is also a slot in the vector files, never reused after a delete
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks "
+                "(row INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute("INSERT OR IGNORE INTO settings VALUES ('space', ?)", (space,))
+        stored = dict(self._conn.execute("SELECT key, value FROM settings"))
+        self.space = stored["space"]
+        if self.space != space:
+            logger.warning(f"Collection {name} was created with the {self.space} distance; ignoring {space}")
+        self.dim = int(stored["dim"]) if "dim" in stored else None
+
+        self._base = base
+        self._codes: _Rows | None = None
+        self._vectors: _Rows | None = None
+        # Per row: quantization scale and squared norm of the exact vector
+        self._norms: _Rows | None = None
+        self._live = np.zeros(0, dtype=bool)
+        if self.dim is not None:
+            self._open_files()
+            rows = [row for (row,) in self._conn.execute("SELECT row FROM chunks")]
+            self._set_live(np.array(rows, dtype=np.int64), True)
+
+    @property
+    def configuration(self) -> dict:
+        return {"hnsw": {"space": self.space}}
+
+    def _open_files(self) -> None:
+        path = (lambda suffix: f"{self._base}.{suffix}") if self._base else (lambda suffix: None)
+        self._codes = _Rows(path("codes"), self.dim, np.int8)
+        self._vectors = _Rows(path("vectors"), self.dim, np.float32)
+        self._norms = _Rows(path("norms"), 2, np.float32)
+
+    def _set_live(self, rows: np.ndarray, live: bool) -> None:
+        if len(rows) and rows.max() >= len(self._live):
+            grown = np.zeros(max(int(rows.max()) + 1, 2 * len(self._live)), dtype=bool)
+            grown[:len(self._live)] = self._live
+            self._live = grown
+        self._live[rows] = live
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(
+        self,
+        ids: list[str],
+        embeddings=None,
+        metadatas: list[dict] | None = None,
+        documents: list[str] | None = None,
+        **kwargs
+    ) -> None:
+        """Insert new ids and overwrite existing ones in place."""
+        if embeddings is None:
+            raise ValueError("QuantizedCollection needs embeddings; it has no embedding function")
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        metadatas = metadatas or [None] * len(ids)
+        documents = documents or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with self._conn:
+                    self._conn.execute("INSERT INTO settings VALUES ('dim', ?)", (str(self.dim),))
+                self._open_files()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {self.dim}")
+
+            with self._conn:
+                rows = []
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    found = self._conn.execute("SELECT row FROM chunks WHERE id = ?", (doc_id,)).fetchone()
+                    encoded = json.dumps(metadata) if metadata else None
+                    if found:
+                        self._conn.execute(
+                            "UPDATE chunks SET document = ?, metadata = ? WHERE row = ?", (document, encoded, found[0])
+                        )
+                        rows.append(found[0])
+                    else:
+                        cursor = self._conn.execute(
+                            "INSERT INTO chunks (id, document, metadata) VALUES (?, ?, ?)", (doc_id, document, encoded)
+                        )
+                        rows.append(cursor.lastrowid)
+                rows = np.array(rows, dtype=np.int64)
+                self._write_vectors(rows, vectors)
+            self._set_live(rows, True)
+
+    add = upsert
+
+    def update(self, ids: list[str], embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        self.upsert(ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def _write_vectors(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Store exact vectors and their symmetric per-vector int8 codes."""
+        size = int(rows.max()) + 1
+        for rows_file in (self._codes, self._vectors, self._norms):
+            rows_file.reserve(size)
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        self._codes.data[rows] = np.rint(vectors / scales[:, None]).astype(np.int8)
+        self._vectors.data[rows] = vectors
+        self._norms.data[rows, 0] = scales
+        self._norms.data[rows, 1] = np.einsum("ij,ij->i", vectors, vectors)
+        for rows_file in (self._codes, self._vectors, self._norms):
+            rows_file.flush()
+
+    def delete(self, ids: list[str] | None = None, where: dict | None = None, **kwargs) -> None:
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            with self._conn:
+                for start in range(0, len(rows), SQL_BATCH):
+                    batch = [int(row) for row in rows[start:start + SQL_BATCH]]
+                    self._conn.execute(f"DELETE FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch)
+            self._set_live(rows, False)
+
+    def _select_rows(self, ids: list[str] | None, where: dict | None, where_document: dict | None = None) -> np.ndarray:
+        sql, params = self._filter_sql(ids, where, where_document)
+        return np.array([row for (row,) in self._conn.execute(f"SELECT row FROM chunks{sql}", params)], dtype=np.int64)
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+        where_document: dict | None = None,
+        include: list[str] = ("metadatas", "documents"),
+        **kwargs
+    ) -> dict:
+        sql, params = self._filter_sql(ids, where, where_document)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset or 0]
+        with self._lock:
+            found = self._conn.execute(f"SELECT row, id, document, metadata FROM chunks{sql}", params).fetchall()
+            rows = np.array([row[0] for row in found], dtype=np.int64)
+            embeddings = (
+                np.array(self._vectors.data[rows]) if "embeddings" in include and self._vectors else
+                np.zeros((0, self.dim or 0), dtype=np.float32) if "embeddings" in include else None
+            )
+        return {
+            "ids": [row[1] for row in found],
+            "documents": [row[2] for row in found] if "documents" in include else None,
+            "metadatas": [json.loads(row[3]) if row[3] else None for row in found] if "metadatas" in include else None,
+            "embeddings": embeddings,
+            "included": list(include)
+        }
+
+    def query(
+        self,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: dict | None = None,
+        where_document: dict | None = None,
+        include: list[str] = ("metadatas", "documents", "distances"),
+        query_texts=None,
+        **kwargs
+    ) -> dict:
+        """Nearest rows per query: an int8 scan for candidates, then exact re-scoring."""
+        if query_embeddings is None:
+            raise ValueError("QuantizedCollection needs query_embeddings; it has no embedding function")
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(len(queries), -1)
+        with self._lock:
+            if self.dim is None:
+                hits = [[] for _ in queries]
+            else:
+                if where or where_document:
+                    rows = self._select_rows(None, where, where_document)
+                else:
+                    rows = np.flatnonzero(self._live[:len(self._codes.data)])
+                hits = self._search(queries, rows, n_results)
+            return self._query_result(hits, include)
+
+    def _search(self, queries: np.ndarray, rows: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        """(row, distance) pairs of the k nearest rows per query."""
+        if not len(rows) or k <= 0:
+            return [[] for _ in queries]
+        candidates_k = min(len(rows), k * max(self.rescore_factor, 1))
+        # Approximate scores, lower is closer, kept per block as the best candidates_k so far
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+            block = rows[start:start + SCAN_BLOCK_ROWS]
+            dots = (queries @ self._codes.data[block].astype(np.float32).T) * self._norms.data[block, 0]
+            scores = self._distances(dots, self._norms.data[block, 1], queries, exact=False)
+            best_rows = np.concatenate([best_rows, np.broadcast_to(block, scores.shape)], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > candidates_k:
+                keep = np.argpartition(best_scores, candidates_k - 1, axis=1)[:, :candidates_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        hits = []
+        for query, candidates in zip(queries, best_rows):
+            exact = self._vectors.data[candidates]
+            distances = self._distances(
+                (exact @ query)[None, :], self._norms.data[candidates, 1], query[None, :], exact=True
+            )[0]
+            order = np.argsort(distances, kind="stable")[:k]
+            hits.append([(int(candidates[i]), float(distances[i])) for i in order])
+        return hits
+
+    def _distances(self, dots: np.ndarray, norms2: np.ndarray, queries: np.ndarray, exact: bool) -> np.ndarray:
+        """Chroma distances from dot products; without exact, terms constant per query are left out."""
+        if self.space == "ip":
+            return 1.0 - dots if exact else -dots
+        if self.space == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1)[:, None] if exact else 1.0
+            return (1.0 if exact else 0.0) - dots / np.maximum(np.sqrt(norms2) * query_norms, 1e-12)
+        query_norms2 = np.einsum("ij,ij->i", queries, queries)[:, None] if exact else 0.0
+        return np.maximum(norms2 - 2 * dots + query_norms2, 0.0) if exact else norms2 - 2 * dots
+
+    def _query_result(self, hits: list[list[tuple[int, float]]], include) -> dict:
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for query_hits in hits:
+            rows = [row for row, _ in query_hits]
+            found = {}
+            for start in range(0, len(rows), SQL_BATCH):
+                batch = rows[start:start + SQL_BATCH]
+                found.update((row[0], row[1:]) for row in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+            result["ids"].append([found[row][0] for row in rows])
+            result["documents"].append([found[row][1] for row in rows])
+            result["metadatas"].append([json.loads(found[row][2]) if found[row][2] else None for row in rows])
+            result["distances"].append([distance for _, distance in query_hits])
+            result["embeddings"].append(np.array(self._vectors.data[rows]) if rows else [])
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                result[key] = None
+        result["included"] = list(include)
+        return result
+
+    def _filter_sql(self, ids: list[str] | None, where: dict | None, where_document: dict | None) -> tuple[str, list]:
+        clauses, params = [], []
+        if ids is not None:
+            clauses.append(f"id IN ({','.join('?' * len(ids))})" if ids else "0")
+            params.extend(ids)
+        if where:
+            clause, where_params = where_sql(where)
+            clauses.append(clause)
+            params.extend(where_params)
+        if where_document:
+            clause, document_params = _where_document_sql(where_document)
+            clauses.append(clause)
+            params.extend(document_params)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _where_document_sql(where_document: dict) -> tuple[str, list]:
+    """Translate a Chroma where_document clause ($contains / $not_contains) to SQL."""
+    clauses, params = [], []
+    for operator, value in where_document.items():
+        if operator in ("$and", "$or"):
+            parts = [_where_document_sql(part) for part in value]
+            clauses.append("(" + f" {operator[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+        elif operator == "$contains":
+            clauses.append("instr(document, ?) > 0")
+            params.append(value)
+        elif operator == "$not_contains":
+            clauses.append("instr(document, ?) = 0")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported where_document operator {operator}")
+    return "(" + " AND ".join(clauses) + ")", params
+
+
+class QuantizedClient:
+    """Stand-in for a Chroma client that serves QuantizedCollections from one directory."""
+
+    def __init__(self, directory: str | None = None, rescore_factor: int = 4):
+        self._directory = directory
+        self._rescore_factor = rescore_factor
+        self._collections: dict[str, QuantizedCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(
+        self,
+        name: str,
+        embedding_function=None,
+        metadata: dict | None = None,
+        configuration: dict | None = None,
+        **kwargs
+    ) -> QuantizedCollection:
+        space = ((configuration or {}).get("hnsw") or {}).get("space", "l2")
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = QuantizedCollection(
+                    name, self._directory, space=space, rescore_factor=self._rescore_factor, metadata=metadata
+                )
+            return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> QuantizedCollection:
+        if self._directory and not os.path.exists(os.path.join(self._directory, f"{name}_int8.sqlite3")):
+            raise ValueError(f"Collection {name} does not exist")
+        return self.get_or_create_collection(name)
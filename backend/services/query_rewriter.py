@@ -0,0 +1,97 @@
+import re
+import threading
+from collections import OrderedDict
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import PromptTemplate
+
+from backend.config import Settings
+from backend.services.answer_cache import AnswerCache
+from backend.logger import logger
+from backend.metrics import span
+
+# Tokens that look like identifiers or codes rather than natural language; dots and
+# colons only count between word characters, not as sentence punctuation
+IDENTIFIER_PATTERN = re.compile(r"[\d_/-]|\w[.:]+\w|[a-z][A-Z]|^[A-Z]{2,}$")
+
+
+class QueryRewriter:
+    """LLM query rewriting with a cache and a cheap skip heuristic."""
+
+    PROMPT = """Rewrite this query for semantic search. 
+Return only the rewritten query, no comments.
+
+Query: {query}
+
+Rewritten:"""
+
+    def __init__(self, settings: Settings, llm: BaseChatModel):
+        self.settings = settings
+        self.mode = settings.query_rewrite_mode
+        self._llm = llm
+        self._prompt = PromptTemplate.from_template(self.PROMPT)
+
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def speculative(self) -> bool:
+        return self.mode == "speculative"
+
+    def is_keyword_query(self, query: str) -> bool:
+        """Short queries and queries made mostly of identifiers are searched as-is."""
+        words = query.split()
+        if len(words) < self.settings.query_rewrite_min_words:
+            return True
+        identifiers = sum(1 for word in words if IDENTIFIER_PATTERN.search(word))
+        return identifiers * 2 >= len(words)
+
+    def should_rewrite(self, query: str) -> bool:
+        """Whether the configured mode rewrites this query."""
+        if self.mode == "off":
+            return False
+        if self.mode == "always":
+            return True
+        return not self.is_keyword_query(query)
+
+    def _get_cached(self, query: str) -> str | None:
+        key = AnswerCache.normalize(query)
+        with self._lock:
+            rewritten = self._cache.get(key)
+            if rewritten is not None:
+                self._cache.move_to_end(key)
+            return rewritten
+
+    def _store(self, query: str, rewritten: str) -> None:
+        key = AnswerCache.normalize(query)
+        with self._lock:
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.settings.query_rewrite_cache_size:
+                self._cache.popitem(last=False)
+
+    def rewrite(self, query: str) -> str:
+        """Rewrite query for better semantic search."""
+        cached = self._get_cached(query)
+        if cached is not None:
+            logger.info("Query rewrite cache hit")
+            return cached
+        logger.info(f"Rewriting query: {query[:50]}...")
+        with span("rewrite"):
+            response = self._llm.invoke(self._prompt.format(query=query))
+        logger.info(f"Rewritten query: {response.content[:50]}...")
+        self._store(query, response.content)
+        return response.content
+
+    async def arewrite(self, query: str) -> str:
+        """Rewrite query for better semantic search without blocking the event loop."""
+        cached = self._get_cached(query)
+        if cached is not None:
+            logger.info("Query rewrite cache hit")
+            return cached
+        logger.info(f"Rewriting query: {query[:50]}...")
+        with span("rewrite"):
+            response = await self._llm.ainvoke(self._prompt.format(query=query))
+        logger.info(f"Rewritten query: {response.content[:50]}...")
+        self._store(query, response.content)
+        return response.content
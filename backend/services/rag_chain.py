@@ -1,123 +1,483 @@
-from typing import Iterator
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Iterator
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
+from langchain_core.language_models import BaseChatModel
 
 from backend.config import Settings
 from backend.services.vector_store import VectorStoreService
+from backend.services.executor import ExecutorService
+from backend.services.answer_cache import AnswerCache
+from backend.services.retrieval_cache import RetrievalCache
+from backend.services.context_cache import ContextCache
+from backend.services.query_rewriter import QueryRewriter
+from backend.services.retrieval import reciprocal_rank_fusion
+from backend.services.reranker import RerankService
+from backend.services.context_builder import ContextBuilder
+from backend.services.single_flight import SingleFlight
+from backend.services.model_providers import create_chat_model, create_context_cache
+from backend.services.metadata import where_key
 from backend.logger import logger
+from backend.metrics import (
+    span,
+    record_timing,
+    CONTEXT_CHARS,
+    CHUNKS_RETRIEVED,
+    TOKENS_STREAMED
+)
 
 
 class RAGService:
     """Service for RAG operations using LCEL."""
     
-    RAG_PROMPT = """Use the context provided to answer the user's question.
+    # The context comes first so prompts drawn from the same chunks share a cacheable prefix
+    RAG_PREFIX = """Use the context provided to answer the user's question.
 If you cannot answer based on the context, say you don't know.
 
 Context:
 {context}
 
-Question: {query}
+"""
+    RAG_QUESTION = """Question: {query}
 
 Answer:"""
 
-    QUERY_REWRITE_PROMPT = """Rewrite this query for semantic search. 
-Return only the rewritten query, no comments.
-
-Query: {query}
-
-Rewritten:"""
-
-    def __init__(self, settings: Settings, vector_store_service: VectorStoreService):
+    def __init__(
+        self,
+        settings: Settings,
+        vector_store_service: VectorStoreService,
+        executor: ExecutorService,
+        llm: BaseChatModel | None = None,
+        reranker: RerankService | None = None,
+        rewrite_llm: BaseChatModel | None = None,
+        context_cache: ContextCache | None = None
+    ):
         self.settings = settings
         self.vector_store = vector_store_service
+        self.executor = executor
         
         # Initialize LLM
-        self._llm = ChatGoogleGenerativeAI(
-            model=settings.llm_model,
-            temperature=settings.llm_temperature,
-            google_api_key=settings.gemini_api_key
-        )
+        self._llm = llm or create_chat_model(settings)
         
         # Initialize reranker
-        self._reranker = FlashrankRerank(top_n=settings.rerank_top_n)
-        self._reranker.model_rebuild()
+        self._reranker = reranker or RerankService(settings, executor)
         
         # Initialize prompts
-        self._rag_prompt = PromptTemplate.from_template(self.RAG_PROMPT)
-        self._rewrite_prompt = PromptTemplate.from_template(self.QUERY_REWRITE_PROMPT)
-    
-    def _rewrite_query(self, query: str) -> str:
-        """Rewrite query for better semantic search."""
-        logger.info(f"Rewriting query: {query[:50]}...")
-        prompt = self._rewrite_prompt.format(query=query)
-        response = self._llm.invoke(prompt)
-        logger.info(f"Rewritten query: {response.content[:50]}...")
-        return response.content
-    
-    def _retrieve_and_rerank(self, query: str) -> list[Document]:
-        """Retrieve documents and rerank them."""
-        # Rewrite query
-        rewritten = self._rewrite_query(query)
-        
-        # Retrieve
-        logger.info("Retrieving documents from vector store...")
-        docs = self.vector_store.retriever.invoke(rewritten)
+        self._rag_prefix = PromptTemplate.from_template(self.RAG_PREFIX)
+        self._rag_question = PromptTemplate.from_template(self.RAG_QUESTION)
+        self._context_builder = ContextBuilder(settings)
+        self._context_cache = context_cache or create_context_cache(settings, self._llm)
         
-        # Rerank if we have documents
+        # Initialize query rewriter
+        self._rewriter = QueryRewriter(settings, rewrite_llm or self._llm)
+        
+        # Initialize answer and retrieval caches
+        self.answer_cache = AnswerCache(settings)
+        self.retrieval_cache = RetrievalCache(settings)
+        
+        # Concurrent identical queries share one pipeline run
+        self._flights = SingleFlight()
+    
+    def _retrieve(self, rewritten: str, where: dict | None = None) -> list[Document]:
+        """Retrieve documents from the vector store, restricted to chunks matching where."""
+        logger.info("Retrieving documents from vector store...")
+        with span("retrieve"):
+            docs = self.vector_store.hybrid_search(rewritten, where=where)
+        CHUNKS_RETRIEVED.observe(len(docs))
+        return docs
+    
+    def _rerank(self, docs: list[Document], rewritten: str) -> list[Document]:
+        """Rerank documents if we have any."""
         if docs:
             logger.info(f"Reranking {len(docs)} documents...")
-            docs = list(self._reranker.compress_documents(docs, rewritten))
+            with span("rerank"):
+                docs = self._reranker.rerank(docs, rewritten)
             logger.info(f"Reranked to {len(docs)} documents.")
+        return docs
+    
+    def _merge(self, rewritten_docs: list[Document], original_docs: list[Document]) -> list[Document]:
+        """Fuse results for the rewritten and the original query."""
+        fused = reciprocal_rank_fusion(
+            [rewritten_docs, original_docs],
+            weights=[1.0, 1.0],
+            k=self.settings.retrieval_rrf_k
+        )
+        return fused[:self.settings.retrieval_candidate_k]
+    
+    @staticmethod
+    def _retrieval_key(query: str, rewritten: str, merged: bool = False) -> str:
+        """Results depend on the rewritten query, and on the original one too when both were retrieved."""
+        key = AnswerCache.normalize(rewritten)
+        return f"{key}\0{AnswerCache.normalize(query)}" if merged else key
+    
+    def _cached_chunks(self, key: str, version: int, scope: str) -> list[Document] | None:
+        """Reranked chunks cached for a retrieval key, read back by id; None on a miss."""
+        ranked = self.retrieval_cache.get(key, version, scope)
+        if ranked is None:
+            return None
+        docs = self.vector_store.get_chunks([chunk_id for chunk_id, _ in ranked])
+        if len(docs) < len(ranked):
+            # Deleted by another worker since; retrieve afresh
+            return None
+        for doc, (_, score) in zip(docs, ranked):
+            if score is not None:
+                doc.metadata["relevance_score"] = score
+        logger.info(f"Retrieval cache hit: {len(docs)} reranked chunks")
+        return docs
+    
+    def _reranked(
+        self,
+        key: str,
+        version: int,
+        scope: str,
+        retrieve: Callable[[], list[Document]],
+        rewritten: str
+    ) -> list[Document]:
+        """Reranked chunks for a retrieval key, from the cache or by retrieving and reranking."""
+        docs = self._cached_chunks(key, version, scope)
+        if docs is None:
+            docs = self._rerank(retrieve(), rewritten)
+            self.retrieval_cache.put(key, version, docs, scope)
+        return docs
+    
+    def _retrieve_and_rerank(self, query: str, version: int, where: dict | None = None) -> list[Document]:
+        """Retrieve documents, rerank them and expand child chunks to their parents."""
+        scope = where_key(where)
+        if not self._rewriter.should_rewrite(query):
+            logger.info("Skipping query rewrite")
+            docs = self._reranked(
+                self._retrieval_key(query, query), version, scope, lambda: self._retrieve(query, where), query
+            )
+            return self.vector_store.expand_to_parents(docs)
+        
+        if not self._rewriter.speculative:
+            rewritten = self._rewriter.rewrite(query)
+            docs = self._reranked(
+                self._retrieval_key(query, rewritten), version, scope, lambda: self._retrieve(rewritten, where), rewritten
+            )
+            return self.vector_store.expand_to_parents(docs)
+        
+        # Retrieve with the original query while the rewrite runs on the thread pool
+        rewrite_future = self.executor.submit(self._rewriter.rewrite, query)
+        try:
+            original_docs = self._retrieve(query, where)
+        except BaseException:
+            rewrite_future.cancel()
+            raise
+        rewritten, merged = query, False
+        try:
+            rewritten, merged = rewrite_future.result(timeout=self.settings.query_rewrite_timeout_seconds), True
+        except TimeoutError:
+            rewrite_future.cancel()
+            logger.warning("Query rewrite timed out, using original query")
+        except Exception as e:
+            logger.warning(f"Query rewrite failed, using original query: {e}")
+        
+        def retrieve_merged() -> list[Document]:
+            return self._merge(self._retrieve(rewritten, where), original_docs) if merged else original_docs
         
+        docs = self._reranked(
+            self._retrieval_key(query, rewritten, merged), version, scope, retrieve_merged, rewritten
+        )
+        return self.vector_store.expand_to_parents(docs)
+    
+    async def _areranked(
+        self,
+        key: str,
+        version: int,
+        scope: str,
+        retrieve: Callable[[], Awaitable[list[Document]]],
+        rewritten: str
+    ) -> list[Document]:
+        """Reranked chunks for a retrieval key without blocking the event loop."""
+        if self.retrieval_cache.enabled:
+            docs = await self.executor.run_in_thread(self._cached_chunks, key, version, scope)
+            if docs is not None:
+                return docs
+        docs = await self._arerank(await retrieve(), rewritten)
+        self.retrieval_cache.put(key, version, docs, scope)
         return docs
     
+    async def _aretrieve_and_rerank(self, query: str, version: int, where: dict | None = None) -> list[Document]:
+        """Retrieve and rerank with blocking stages on the worker thread pool."""
+        scope = where_key(where)
+        
+        async def retrieve(text: str) -> list[Document]:
+            return await self.executor.run_in_thread(self._retrieve, text, where)
+        
+        if not self._rewriter.should_rewrite(query):
+            logger.info("Skipping query rewrite")
+            docs = await self._areranked(
+                self._retrieval_key(query, query), version, scope, lambda: retrieve(query), query
+            )
+        elif not self._rewriter.speculative:
+            rewritten = await self._rewriter.arewrite(query)
+            docs = await self._areranked(
+                self._retrieval_key(query, rewritten), version, scope, lambda: retrieve(rewritten), rewritten
+            )
+        else:
+            # Retrieve with the original query while the rewrite is in flight
+            rewrite_task = asyncio.create_task(self._rewriter.arewrite(query))
+            try:
+                original_docs = await retrieve(query)
+                done, _ = await asyncio.wait({rewrite_task}, timeout=self.settings.query_rewrite_timeout_seconds)
+            finally:
+                # Stop the rewrite if retrieval failed or it timed out, and collect its outcome either way
+                rewrite_task.cancel()
+                await asyncio.gather(rewrite_task, return_exceptions=True)
+            rewritten, merged = query, False
+            if not done:
+                logger.warning("Query rewrite timed out, using original query")
+            elif rewrite_task.exception() is not None:
+                logger.warning(f"Query rewrite failed, using original query: {rewrite_task.exception()}")
+            else:
+                rewritten, merged = rewrite_task.result(), True
+            
+            async def retrieve_merged() -> list[Document]:
+                if not merged:
+                    return original_docs
+                return self._merge(await retrieve(rewritten), original_docs)
+            
+            docs = await self._areranked(
+                self._retrieval_key(query, rewritten, merged), version, scope, retrieve_merged, rewritten
+            )
+        
+        return await self.executor.run_in_thread(self.vector_store.expand_to_parents, docs)
+    
+    async def _arerank(self, docs: list[Document], rewritten: str) -> list[Document]:
+        """Rerank documents, batched with concurrent requests."""
+        with span("rerank"):
+            return await self._reranker.arerank(docs, rewritten)
+    
+    def _build_prompt(self, docs: list[Document], query: str, version: int) -> tuple[str, str, list[Document]]:
+        """Fit the retrieved documents into the context budget and build the RAG prompt.
+        
+        Returns the prompt's context prefix, its question and the documents that
+        made it into the context. Contexts built from the same ranked chunks are
+        reused until the collection changes.
+        """
+        with span("prompt_build"):
+            key = RetrievalCache.context_key(docs)
+            built = self.retrieval_cache.get_context(key, version)
+            if built is not None:
+                context, used = built
+                docs = [docs[i] for i in used]
+            else:
+                context, used_docs = self._context_builder.build(docs)
+                positions = {id(doc): i for i, doc in enumerate(docs)}
+                self.retrieval_cache.put_context(key, version, context, [positions[id(doc)] for doc in used_docs])
+                docs = used_docs
+            CONTEXT_CHARS.observe(len(context))
+            logger.info(f"Context length: {len(context)} chars")
+            return self._rag_prefix.format(context=context), self._rag_question.format(query=query), docs
+    
+    def _llm_input(self, prefix: str, question: str) -> tuple[str, dict]:
+        """The prompt to send and its call options: only the question when the provider has the prefix cached."""
+        if self._context_cache is not None:
+            name = self._context_cache.lookup(prefix)
+            if name is not None:
+                return question, {"cached_content": name}
+        return prefix + question, {}
+    
+    async def _allm_input(self, prefix: str, question: str) -> tuple[str, dict]:
+        """Like _llm_input, creating provider caches off the event loop."""
+        if self._context_cache is None:
+            return prefix + question, {}
+        return await self.executor.run_in_thread(self._llm_input, prefix, question)
+    
+    @staticmethod
+    def _count_tokens(chunk, tokens: int) -> int:
+        """Running output token count from the usage metadata some models attach to chunks."""
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage and usage.get("output_tokens"):
+            return tokens + usage["output_tokens"]
+        return tokens
+    
     @staticmethod
-    def _format_docs(docs: list[Document]) -> str:
-        """Format documents into context string."""
-        return "\n\n".join(doc.page_content for doc in docs)
+    def _format_sources(docs: list[Document]) -> list[str]:
+        """Format documents into short source previews."""
+        return [doc.page_content[:100] + "..." for doc in docs]
+    
+    def _get_cached(self, query: str, version: int, scope: str) -> tuple[dict | None, list[float] | None]:
+        """Look up a cached answer, embedding the query only for near-duplicate matching."""
+        with span("cache_lookup"):
+            cached = self.answer_cache.get(query, version, scope)
+            if cached is not None or not self.answer_cache.semantic:
+                return cached, None
+            embedding = self.vector_store.embed_query(query)
+            return self.answer_cache.get_similar(embedding, version, scope), embedding
     
-    def invoke(self, query: str) -> dict:
-        """Run RAG chain and return response."""
+    async def _aget_cached(self, query: str, version: int, scope: str) -> tuple[dict | None, list[float] | None]:
+        """Look up a cached answer without blocking the event loop."""
+        with span("cache_lookup"):
+            cached = self.answer_cache.get(query, version, scope)
+            if cached is not None or not self.answer_cache.semantic:
+                return cached, None
+            embedding = await self.executor.run_in_thread(self.vector_store.embed_query, query)
+            return self.answer_cache.get_similar(embedding, version, scope), embedding
+    
+    def invoke(self, query: str, where: dict | None = None) -> dict:
+        """Run RAG chain and return response, retrieving only chunks that match where."""
+        version = self.vector_store.collection_version
+        scope = where_key(where)
+        cached, embedding = self._get_cached(query, version, scope)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return cached
+        
         # Retrieve and rerank
-        docs = self._retrieve_and_rerank(query)
+        docs = self._retrieve_and_rerank(query, version, where)
         
-        # Format context
-        context = self._format_docs(docs)
+        # Build prompt
+        prefix, question, docs = self._build_prompt(docs, query, version)
+        prompt, options = self._llm_input(prefix, question)
         
         # Generate response
-        prompt = self._rag_prompt.format(context=context, query=query)
-        response = self._llm.invoke(prompt)
+        with span("llm"):
+            response = self._llm.invoke(prompt, **options)
+        
+        result = {
+            "answer": response.content,
+            "sources": self._format_sources(docs)
+        }
+        self.answer_cache.put(query, version, result, embedding, scope)
+        return result
+    
+    def _flight_key(self, query: str, version: int, scope: str) -> tuple[str, int, str]:
+        """Queries share a run only if they match, filter alike and the collection hasn't changed."""
+        return AnswerCache.normalize(query), version, scope
+    
+    async def ainvoke(self, query: str, where: dict | None = None) -> dict:
+        """Run RAG chain without blocking the event loop."""
+        version = self.vector_store.collection_version
+        if not self.settings.single_flight_enabled:
+            return await self._ainvoke(query, version, where)
+        return await self._flights.run(
+            self._flight_key(query, version, where_key(where)),
+            lambda: self._ainvoke(query, version, where)
+        )
+    
+    async def _ainvoke(self, query: str, version: int, where: dict | None) -> dict:
+        scope = where_key(where)
+        cached, embedding = await self._aget_cached(query, version, scope)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return cached
+        
+        docs = await self._aretrieve_and_rerank(query, version, where)
+        prefix, question, docs = self._build_prompt(docs, query, version)
+        prompt, options = await self._allm_input(prefix, question)
         
-        return {
+        with span("llm"):
+            response = await self._llm.ainvoke(prompt, **options)
+        
+        result = {
             "answer": response.content,
-            "sources": [doc.page_content[:100] + "..." for doc in docs]
+            "sources": self._format_sources(docs)
         }
+        self.answer_cache.put(query, version, result, embedding, scope)
+        return result
     
-    def stream(self, query: str) -> Iterator[str]:
+    def stream(self, query: str, where: dict | None = None) -> Iterator[str]:
         """Stream RAG response token by token."""
+        version = self.vector_store.collection_version
+        scope = where_key(where)
+        cached, embedding = self._get_cached(query, version, scope)
+        if cached is not None:
+            logger.info("Answer cache hit, replaying cached answer")
+            yield cached["answer"]
+            return
+        
         # Retrieve and rerank
-        docs = self._retrieve_and_rerank(query)
+        docs = self._retrieve_and_rerank(query, version, where)
         
-        # Format context
-        context = self._format_docs(docs)
-        logger.info(f"Context length: {len(context)} chars")
+        # Build prompt
+        prefix, question, docs = self._build_prompt(docs, query, version)
+        prompt, options = self._llm_input(prefix, question)
         
         # Stream response
-        prompt = self._rag_prompt.format(context=context, query=query)
         logger.info("Starting LLM stream...")
         
         try:
-            chunk_count = 0
-            for chunk in self._llm.stream(prompt):
+            chunks = []
+            tokens = 0
+            started = time.perf_counter()
+            for chunk in self._llm.stream(prompt, **options):
+                tokens = self._count_tokens(chunk, tokens)
+                content = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if content:
+                    if not chunks:
+                        record_timing("llm_first_token", time.perf_counter() - started)
+                    chunks.append(content)
+                    logger.debug(f"Yielding chunk {len(chunks)}: {content[:10]}...")
+                    yield content
+            record_timing("llm", time.perf_counter() - started)
+            TOKENS_STREAMED.observe(tokens or len(chunks))
+            logger.info(f"LLM stream finished. Total chunks: {len(chunks)}")
+            self.answer_cache.put(
+                query,
+                version,
+                {"answer": "".join(chunks), "sources": self._format_sources(docs)},
+                embedding,
+                scope
+            )
+        except Exception as e:
+            logger.error(f"Error during LLM streaming: {str(e)}")
+            raise e
+    
+    async def astream(self, query: str, where: dict | None = None) -> AsyncIterator[str]:
+        """Stream RAG response token by token without blocking the event loop."""
+        version = self.vector_store.collection_version
+        if not self.settings.single_flight_enabled:
+            chunks = self._astream(query, version, where)
+        else:
+            chunks = self._flights.stream(
+                self._flight_key(query, version, where_key(where)),
+                lambda: self._astream(query, version, where)
+            )
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                yield chunk
+    
+    async def _astream(self, query: str, version: int, where: dict | None) -> AsyncIterator[str]:
+        scope = where_key(where)
+        cached, embedding = await self._aget_cached(query, version, scope)
+        if cached is not None:
+            logger.info("Answer cache hit, replaying cached answer")
+            yield cached["answer"]
+            return
+        
+        docs = await self._aretrieve_and_rerank(query, version, where)
+        
+        prefix, question, docs = self._build_prompt(docs, query, version)
+        prompt, options = await self._allm_input(prefix, question)
+        logger.info("Starting async LLM stream...")
+        
+        try:
+            chunks = []
+            tokens = 0
+            started = time.perf_counter()
+            async for chunk in self._llm.astream(prompt, **options):
+                tokens = self._count_tokens(chunk, tokens)
                 content = chunk.content if hasattr(chunk, "content") else str(chunk)
                 if content:
-                    chunk_count += 1
-                    logger.debug(f"Yielding chunk {chunk_count}: {content[:10]}...")
+                    if not chunks:
+                        record_timing("llm_first_token", time.perf_counter() - started)
+                    chunks.append(content)
                     yield content
-            logger.info(f"LLM stream finished. Total chunks: {chunk_count}")
+            record_timing("llm", time.perf_counter() - started)
+            TOKENS_STREAMED.observe(tokens or len(chunks))
+            logger.info(f"LLM stream finished. Total chunks: {len(chunks)}")
+            self.answer_cache.put(
+                query,
+                version,
+                {"answer": "".join(chunks), "sources": self._format_sources(docs)},
+                embedding,
+                scope
+            )
         except Exception as e:
             logger.error(f"Error during LLM streaming: {str(e)}")
             raise e
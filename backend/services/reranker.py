@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from flashrank import Ranker, RerankRequest
+from langchain_core.documents import Document
+
+from backend.config import Settings
+from backend.services.executor import ExecutorService
+from backend.logger import logger
+
+
+class RerankService:
+    """Cross-encoder reranking with cross-request micro-batching and a score cache.
+
+    Concurrent requests queue their uncached (query, chunk) pairs; the queue is
+    scored in one model call once it holds rerank_max_batch_pairs pairs or its
+    oldest pair has waited rerank_batch_wait_ms.
+    """
+
+    def __init__(self, settings: Settings, executor: ExecutorService):
+        self.settings = settings
+        self.executor = executor
+        self.top_n = settings.rerank_top_n
+
+        ranker_kwargs = {"cache_dir": settings.rerank_cache_dir} if settings.rerank_cache_dir else {}
+        self._ranker = Ranker(model_name=settings.rerank_model, **ranker_kwargs)
+        # Listwise (LLM) rankers don't score pairs independently, so they can't be batched
+        self._pairwise = self._ranker.llm_model is None
+
+        self._cache: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._pending: list[tuple[list[tuple[str, str]], asyncio.Future]] = []
+        self._pending_pairs = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task] = set()
+
+        # (pairs, requests, seconds) of recent batches
+        self.batch_stats: deque[tuple[int, int, float]] = deque(maxlen=1000)
+
+    @staticmethod
+    def _key(query: str, text: str) -> tuple[str, str]:
+        query_hash = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+        text_hash = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        return query_hash, text_hash
+
+    def _cached_scores(self, query: str, docs: list[Document]) -> list[float | None]:
+        with self._cache_lock:
+            scores = []
+            for doc in docs:
+                key = self._key(query, doc.page_content)
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def _store_scores(self, query: str, docs: list[Document], scores: list[float]) -> None:
+        with self._cache_lock:
+            for doc, score in zip(docs, scores):
+                self._cache[self._key(query, doc.page_content)] = score
+            while len(self._cache) > self.settings.rerank_cache_size:
+                self._cache.popitem(last=False)
+
+    def _score_pairs(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Score (query, passage) pairs in one cross-encoder call."""
+        encoded = self._ranker.tokenizer.encode_batch([list(pair) for pair in pairs])
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        token_type_ids = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+
+        onnx_input = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if np.any(token_type_ids):
+            onnx_input["token_type_ids"] = token_type_ids
+
+        logits = self._ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            scores = 1 / (1 + np.exp(-logits.flatten()))
+        else:
+            exp_logits = np.exp(logits)
+            scores = exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+        return scores.tolist()
+
+    def _score_listwise(self, query: str, docs: list[Document]) -> list[float]:
+        """Score with the ranker's own per-query call; ranks become scores."""
+        passages = [{"id": i, "text": doc.page_content} for i, doc in enumerate(docs)]
+        ranked = self._ranker.rerank(RerankRequest(query=query, passages=passages))
+        scores = [0.0] * len(docs)
+        for rank, passage in enumerate(ranked):
+            scores[passage["id"]] = 1.0 - rank / len(docs)
+        return scores
+
+    def warm_up(self) -> None:
+        """Run the model once so the first request doesn't pay for session setup."""
+        if self._pairwise:
+            self._score_pairs([("warm up", "warm up")])
+    
+    def _select(self, docs: list[Document], scores: list[float]) -> list[Document]:
+        """Keep the top_n documents, annotated with their relevance score."""
+        ranked = sorted(zip(docs, scores), key=lambda item: item[1], reverse=True)[:self.top_n]
+        return [
+            Document(
+                id=doc.id,
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "relevance_score": float(score)}
+            )
+            for doc, score in ranked
+        ]
+
+    def rerank(self, docs: list[Document], query: str) -> list[Document]:
+        """Rerank documents for a query, scoring only uncached pairs."""
+        if not docs:
+            return []
+        scores = self._cached_scores(query, docs)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            missing_docs = [docs[i] for i in missing]
+            if self._pairwise:
+                new_scores = self._score_pairs([(query, doc.page_content) for doc in missing_docs])
+            else:
+                new_scores = self._score_listwise(query, missing_docs)
+            self._store_scores(query, missing_docs, new_scores)
+            for i, score in zip(missing, new_scores):
+                scores[i] = score
+        return self._select(docs, scores)
+
+    async def arerank(self, docs: list[Document], query: str) -> list[Document]:
+        """Rerank documents, batching uncached pairs with other concurrent requests."""
+        if not docs:
+            return []
+        if not self._pairwise:
+            return await self.executor.run_in_thread(self.rerank, docs, query)
+
+        scores = self._cached_scores(query, docs)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            missing_docs = [docs[i] for i in missing]
+            new_scores = await self._enqueue([(query, doc.page_content) for doc in missing_docs])
+            self._store_scores(query, missing_docs, new_scores)
+            for i, score in zip(missing, new_scores):
+                scores[i] = score
+        logger.info(f"Reranked {len(docs)} documents ({len(docs) - len(missing)} cached)")
+        return self._select(docs, scores)
+
+    async def _enqueue(self, pairs: list[tuple[str, str]]) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((pairs, future))
+        self._pending_pairs += len(pairs)
+        if self._pending_pairs >= self.settings.rerank_max_batch_pairs:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.settings.rerank_batch_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._pending_pairs = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[list[tuple[str, str]], asyncio.Future]]) -> None:
+        pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+        try:
+            started = time.perf_counter()
+            scores = await self.executor.run_in_thread(self._score_pairs, pairs)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batch_stats.append((len(pairs), len(batch), elapsed))
+        logger.info(f"Rerank batch: {len(pairs)} pairs from {len(batch)} requests in {elapsed * 1000:.1f} ms")
+        offset = 0
+        for request_pairs, future in batch:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(request_pairs)])
+            offset += len(request_pairs)
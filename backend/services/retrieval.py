@@ -0,0 +1,45 @@
+import numpy as np
+from langchain_core.documents import Document
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[Document]],
+    weights: list[float],
+    k: int = 60
+) -> list[Document]:
+    """Fuse ranked lists by weighted reciprocal rank: sum of weight / (k + rank)."""
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for results, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(results, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def maximal_marginal_relevance(
+    query: list[float],
+    candidates: list[list[float]],
+    k: int,
+    lambda_mult: float = 0.5
+) -> list[int]:
+    """Pick up to k candidate indices, trading cosine similarity to the query
+    (lambda_mult = 1) against similarity to those already picked (lambda_mult = 0)."""
+    if k <= 0 or not len(candidates):
+        return []
+    matrix = np.asarray(candidates, dtype=np.float32)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query_vec = np.asarray(query, dtype=np.float32)
+    query_vec = query_vec / max(float(np.linalg.norm(query_vec)), 1e-12)
+
+    relevance = matrix @ query_vec
+    selected = [int(np.argmax(relevance))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < min(k, len(matrix)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+from backend.config import Settings
+from backend.logger import logger
+from backend.metrics import CACHE_LOOKUPS
+
+# Chunk ids with their relevance scores, in rank order
+RankedIds = list[tuple[str, float | None]]
+
+
+@dataclass
+class _Entry:
+    ranked: RankedIds
+    expires_at: float
+
+
+class RetrievalCache:
+    """LRU/TTL cache of reranked chunk ids per retrieval key, and of the contexts built from them.
+
+    Queries worded differently often rewrite to the same search, so entries are
+    keyed by the normalized rewritten query and only hold chunk ids and scores;
+    the chunks themselves are read back by id. Like AnswerCache, entries are
+    tagged with the collection version: the first lookup after a write drops
+    them all, and results computed before a write are never stored.
+    """
+
+    def __init__(self, settings: Settings):
+        self.enabled = settings.retrieval_cache_enabled and settings.retrieval_cache_max_entries > 0
+        self.max_entries = settings.retrieval_cache_max_entries
+        self.ttl = settings.retrieval_cache_ttl_seconds
+
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._contexts: OrderedDict[tuple, tuple[str, list[int]]] = OrderedDict()
+        self._version: int | None = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self, version: int) -> bool:
+        """Drop everything if the collection changed; False if the caller is stale."""
+        if self._version is None or version > self._version:
+            if self._entries:
+                logger.info(f"Collection changed (v{version}), clearing {len(self._entries)} cached retrievals")
+            self._entries.clear()
+            self._contexts.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, key: str, version: int, scope: str = "") -> RankedIds | None:
+        """Ranked chunk ids cached for a retrieval key under a metadata filter scope."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if not self._sync_version(version):
+                return None
+            entry = self._entries.get((scope, key))
+            if entry is not None and entry.expires_at < time.monotonic():
+                del self._entries[(scope, key)]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="retrieval", result="miss")
+                return None
+            self._entries.move_to_end((scope, key))
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="retrieval", result="hit")
+            return entry.ranked
+
+    def put(self, key: str, version: int, docs: list[Document], scope: str = "") -> None:
+        """Store the ids of reranked chunks retrieved against the given collection version."""
+        if not self.enabled or any(doc.id is None for doc in docs):
+            return
+        ranked = [(doc.id, doc.metadata.get("relevance_score")) for doc in docs]
+        with self._lock:
+            if not self._sync_version(version):
+                # Retrieved before a write landed; don't cache stale results
+                return
+            self._entries[(scope, key)] = _Entry(ranked, time.monotonic() + self.ttl)
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def context_key(docs: list[Document]) -> tuple | None:
+        """Identity of a ranked doc list for context reuse; None if a doc has no id."""
+        if any(doc.id is None for doc in docs):
+            return None
+        return tuple((doc.id, doc.metadata.get("relevance_score")) for doc in docs)
+
+    def get_context(self, key: tuple | None, version: int) -> tuple[str, list[int]] | None:
+        """The context built from a ranked doc list and the positions of the docs it used."""
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            if not self._sync_version(version) or key not in self._contexts:
+                CACHE_LOOKUPS.inc(cache="context", result="miss")
+                return None
+            self._contexts.move_to_end(key)
+            CACHE_LOOKUPS.inc(cache="context", result="hit")
+            return self._contexts[key]
+
+    def put_context(self, key: tuple | None, version: int, context: str, used: list[int]) -> None:
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._contexts[key] = (context, used)
+            self._contexts.move_to_end(key)
+            # Contexts are larger than id lists; keep a small share of them
+            while len(self._contexts) > max(1, self.max_entries // 16):
+                self._contexts.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached retrievals and contexts."""
+        with self._lock:
+            self._entries.clear()
+            self._contexts.clear()
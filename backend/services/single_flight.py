@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+from backend.logger import logger
+
+T = TypeVar("T")
+
+
+class _Call:
+    """A shared in-flight call and how many callers are waiting on it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.subscribers = 0
+
+
+class _Stream:
+    """A shared in-flight stream: chunks produced so far and a wakeup for subscribers."""
+
+    def __init__(self):
+        self.chunks: list[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and shares the outcome.
+
+    Flights are forgotten as soon as they finish, so only callers that arrive
+    while one is running share it; nothing is cached beyond that. A flight is
+    cancelled once every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._streams: dict[Hashable, _Stream] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await factory(), or the run already in flight for key."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            logger.info("Joining in-flight query")
+
+        call.subscribers += 1
+        try:
+            # Shielded so one caller going away doesn't cancel the others' result
+            return await asyncio.shield(call.task)
+        finally:
+            call.subscribers -= 1
+            if call.subscribers == 0 and not call.task.done():
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Iterate factory(), or fan out the stream already in flight for key.
+
+        Subscribers that join late first receive the chunks produced so far.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Stream()
+            self._streams[key] = flight
+            flight.task = asyncio.create_task(self._produce(key, flight, factory()))
+        else:
+            logger.info("Joining in-flight streaming query")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+
+    async def _produce(self, key: Hashable, flight: _Stream, source: AsyncIterator[Any]) -> None:
+        try:
+            async with aclosing(source):
+                async for chunk in source:
+                    flight.chunks.append(chunk)
+                    flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(self._streams, key, flight)
+            flight.notify()
+
+    @staticmethod
+    def _forget(flights: dict, key: Hashable, flight: Any) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
@@ -0,0 +1,58 @@
+import asyncio
+from typing import AsyncIterator
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterator[str],
+    max_chars: int,
+    max_delay: float
+) -> AsyncIterator[str]:
+    """Merge small chunks into frames, flushed by size or by the age of the oldest chunk."""
+    loop = asyncio.get_running_loop()
+    iterator = aiter(chunks)
+    buffer: list[str] = []
+    size = 0
+    deadline: float | None = None
+    pending: asyncio.Future | None = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Upstream is slow: ship what we have instead of waiting for more
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                deadline = None
+                continue
+
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+
+            buffer.append(chunk)
+            size += len(chunk)
+            if deadline is None:
+                deadline = loop.time() + max_delay
+            if size >= max_chars:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                deadline = None
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
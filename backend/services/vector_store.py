@@ -1,31 +1,126 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
+import hashlib
+import os
+import time
+from contextlib import ExitStack
+from typing import NamedTuple
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 from backend.config import Settings
+from backend.services.embedding_cache import CachedEmbeddings
+from backend.services.model_providers import create_embeddings, embed_queries, embedding_model_id
+from backend.services.collection_stats import CollectionStats
+from backend.services.lexical_index import BM25Index
+from backend.services.retrieval import reciprocal_rank_fusion, maximal_marginal_relevance
+from backend.services.interprocess import FileLock, SharedCounter
+from backend.services.metadata import scope_of, source_key
+from backend.services.parent_store import ParentStore
 from backend.logger import logger
+from backend.metrics import span
+
+# Sources are hashed onto this many write locks, shared by threads and worker processes
+WRITE_LOCK_STRIPES = 64
+
+
+class ChunkWrite(NamedTuple):
+    """Id of a written chunk and whether it was new (embedded) or already stored."""
+    id: str
+    added: bool
+
+
+def create_chroma_client(settings: Settings):
+    """Chroma client for the deployment: a Chroma server when one is configured, else embedded.
+    
+    With vector_index "int8" it is a QuantizedClient, which serves the same
+    collection API from quantized vectors instead.
+    """
+    if settings.vector_index == "int8":
+        if settings.chroma_server_host or settings.web_concurrency > 1:
+            raise RuntimeError(
+                "The int8 vector index is embedded and single-process; "
+                "unset CHROMA_SERVER_HOST and run with WEB_CONCURRENCY=1"
+            )
+        from backend.services.quantized_index import QuantizedClient
+        return QuantizedClient(settings.chroma_persist_directory, rescore_factor=settings.int8_rescore_factor)
+    # Imported here as chromadb is slow to import
+    import chromadb
+    if settings.chroma_server_host:
+        # Client/server: the Chroma server serialises writes from every worker
+        return chromadb.HttpClient(host=settings.chroma_server_host, port=settings.chroma_server_port)
+    if settings.web_concurrency > 1 and settings.chroma_persist_directory:
+        raise RuntimeError(
+            "An embedded Chroma store can't be shared by several worker processes; "
+            "set CHROMA_SERVER_HOST to run with WEB_CONCURRENCY > 1"
+        )
+    if settings.chroma_persist_directory:
+        return chromadb.PersistentClient(path=settings.chroma_persist_directory)
+    return chromadb.EphemeralClient()
+
+
+def collection_configuration(settings: Settings) -> dict:
+    """Index configuration a new collection is created with."""
+    return {
+        "hnsw": {
+            "space": settings.vector_distance,
+            "max_neighbors": settings.hnsw_m,
+            "ef_construction": settings.hnsw_ef_construction,
+            "ef_search": settings.hnsw_ef_search
+        }
+    }
+
+
+def chunk_id(source: str, text: str, parent_id: str | None = None) -> str:
+    """Deterministic chunk id: a source hash prefix plus a content hash.
+    
+    A child chunk's content includes its parent's id, so editing a section
+    re-links all of its children; unchanged texts still hit the embedding cache.
+    """
+    source_hash = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    content = f"{parent_id}\0{text}" if parent_id else text
+    content_hash = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+    return f"{source_hash}-{content_hash}"
+
+
+def sidecar_path(settings: Settings, suffix: str) -> str | None:
+    """Path of a file kept next to the collection, or None for in-memory stores."""
+    directory = settings.chroma_persist_directory
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{settings.chroma_collection_name}_{suffix}")
 
 
 class VectorStoreService:
     """Service for managing the vector store."""
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, embeddings: Embeddings | None = None):
         self.settings = settings
         
         # Initialize embeddings
-        self._embeddings = GoogleGenerativeAIEmbeddings(
-            model=settings.embedding_model,
-            google_api_key=settings.gemini_api_key
-        )
+        self._embeddings = embeddings or create_embeddings(settings)
+        if settings.embedding_cache_enabled:
+            cache_dir = None
+            if settings.chroma_persist_directory:
+                cache_dir = os.path.join(settings.chroma_persist_directory, "embedding_cache")
+            self._embeddings = CachedEmbeddings(
+                self._embeddings,
+                model_name=embedding_model_id(settings),
+                cache_dir=cache_dir,
+                max_queries=settings.embedding_query_cache_max_entries
+            )
         
-        # Initialize vector store
+        # Initialize vector store; imported here as chromadb is slow to import
+        from langchain_chroma import Chroma
         logger.info(f"Initializing ChromaDB with collection: {settings.chroma_collection_name}")
         self._vector_store = Chroma(
             collection_name=settings.chroma_collection_name,
             embedding_function=self._embeddings,
-            persist_directory=settings.chroma_persist_directory
+            client=create_chroma_client(settings),
+            collection_configuration=collection_configuration(settings)
         )
+        self._apply_index_settings()
         
         # Initialize text splitter
         self._text_splitter = RecursiveCharacterTextSplitter(
@@ -33,33 +128,397 @@ class VectorStoreService:
             chunk_overlap=settings.chunk_overlap,
             length_function=len
         )
+        self._parent_splitter = None
+        if settings.parent_chunk_size:
+            self._parent_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=settings.parent_chunk_size,
+                chunk_overlap=settings.parent_chunk_overlap,
+                length_function=len
+            )
+        
+        # Parent sections of small-to-big retrieval, looked up by the ids children carry
+        self._parents = ParentStore(sidecar_path(settings, "parents.sqlite3"))
+        
+        # Bumped on every write, by any worker, so caches can tell when results went stale
+        self._version = SharedCounter(sidecar_path(settings, "version.sqlite3"))
+        
+        # Incrementally maintained statistics for the status endpoint
+        self._stats = CollectionStats(sidecar_path(settings, "stats.json"))
+        if not self._stats.loaded and self._vector_store._collection.count() == 0:
+            # Nothing to recount in a fresh collection; its writes keep the stats complete
+            self._stats.reset()
+        self._disk_size: tuple[float, int] | None = None
+        
+        # BM25 index over the same chunks, for exact identifiers dense search misses
+        self._lexical_index = BM25Index(sidecar_path(settings, "bm25.sqlite3"))
+        self._lexical_checked = False
+        self._lexical_lock = FileLock(sidecar_path(settings, "bm25.lock"))
+        
+        # Serialise writes per source so concurrent uploads of it can't both find its chunks missing
+        lock_dir = sidecar_path(settings, "write_locks")
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._write_locks = [
+            FileLock(os.path.join(lock_dir, f"{stripe}.lock") if lock_dir else None)
+            for stripe in range(WRITE_LOCK_STRIPES)
+        ]
+    
+    def _apply_index_settings(self) -> None:
+        """Bring an existing collection's ef_search in line with the settings.
+        
+        The distance, M and ef_construction are fixed when a collection is
+        created; a mismatch is only reported, as changing them means re-indexing
+        into a new collection (see backend.reembed).
+        """
+        collection = self._vector_store._collection
+        current = collection.configuration.get("hnsw") or {}
+        wanted = collection_configuration(self.settings)["hnsw"]
+        if self.settings.vector_index == "int8":
+            wanted = {"space": wanted["space"]}
+        fixed = {key: value for key, value in wanted.items() if key != "ef_search" and current.get(key, value) != value}
+        if fixed:
+            kept = {key: current[key] for key in fixed}
+            logger.warning(
+                f"Collection {collection.name} keeps its creation-time index settings {kept}, not {fixed}; "
+                f"re-embed into a new collection to change them"
+            )
+        if "ef_search" in wanted and current.get("ef_search") != wanted["ef_search"]:
+            collection.modify(configuration={"hnsw": {"ef_search": wanted["ef_search"]}})
+            logger.info(f"Set ef_search of {collection.name} to {wanted['ef_search']}")
+    
+    @property
+    def collection_version(self) -> int:
+        """Number of writes to the collection so far, shared across workers."""
+        return self._version.value
     
     @property
     def retriever(self):
         """Get the retriever for RAG chain."""
         return self._vector_store.as_retriever()
     
+    @property
+    def text_splitter(self) -> RecursiveCharacterTextSplitter:
+        """Get the text splitter used for ingestion: the parent splitter for small-to-big retrieval."""
+        return self._parent_splitter or self._text_splitter
+    
+    @property
+    def parents(self) -> ParentStore:
+        return self._parents
+    
     def add_documents(self, text: str, metadata: dict | None = None) -> list[str]:
         """Split text into chunks and add to vector store."""
         logger.info("Adding documents to vector store...")
-        documents = self._text_splitter.create_documents(
-            texts=[text],
-            metadatas=[metadata] if metadata else None
+        chunks = self.text_splitter.split_text(text)
+        metadatas = [dict(metadata or {}) for _ in chunks]
+        if self._parent_splitter:
+            chunks, metadatas = self.add_parents(chunks, metadatas)
+        writes = self.add_chunks(chunks, metadatas)
+        return [write.id for write in writes]
+    
+    def add_parents(self, parents: list[str], metadatas: list[dict | None]) -> tuple[list[str], list[dict]]:
+        """Store parent sections and split them into the child chunks to embed.
+        
+        Returns the children with their metadata, which carries the parent's id.
+        """
+        rows, children, child_metadatas = [], [], []
+        for parent, metadata in zip(parents, metadatas):
+            metadata = dict(metadata or {})
+            parent_id = chunk_id(source_key(metadata), parent)
+            rows.append((parent_id, source_key(metadata), parent))
+            for child in self._text_splitter.split_text(parent):
+                children.append(child)
+                child_metadatas.append({**metadata, "parent_id": parent_id})
+        with span("parent_store_write"):
+            self._parents.put(rows)
+        return children, child_metadatas
+    
+    def expand_to_parents(self, docs: list[Document]) -> list[Document]:
+        """Swap child chunks for their parent sections.
+        
+        Docs are in rank order; each parent appears once, with the metadata of
+        its best-ranked child. Chunks without a stored parent pass through.
+        """
+        parent_ids = [doc.metadata["parent_id"] for doc in docs if doc.metadata.get("parent_id")]
+        if not parent_ids:
+            return docs
+        with span("parent_lookup"):
+            texts = self._parents.get(parent_ids)
+        expanded, seen = [], set()
+        for doc in docs:
+            parent_id = doc.metadata.get("parent_id")
+            if parent_id not in texts:
+                expanded.append(doc)
+            elif parent_id not in seen:
+                seen.add(parent_id)
+                expanded.append(Document(id=parent_id, page_content=texts[parent_id], metadata=doc.metadata))
+        logger.info(f"Expanded {len(docs)} chunks to {len(expanded)} parent sections")
+        return expanded
+    
+    def get_chunks(self, ids: list[str]) -> list[Document]:
+        """Chunks by id in the given order; ids no longer stored are left out."""
+        with span("chunk_lookup"):
+            docs = {doc.id: doc for doc in self._vector_store.get_by_ids(ids)}
+        return [docs[doc_id] for doc_id in ids if doc_id in docs]
+    
+    def _locked_sources(self, keys: set[str]) -> ExitStack:
+        """Hold the write locks of the given source keys, taken in a fixed order."""
+        stripes = sorted({
+            int.from_bytes(hashlib.blake2b(key.encode(), digest_size=4).digest()) % WRITE_LOCK_STRIPES
+            for key in keys
+        })
+        stack = ExitStack()
+        for stripe in stripes:
+            stack.enter_context(self._write_locks[stripe])
+        return stack
+    
+    def add_chunks(self, chunks: list[str], metadatas: list[dict] | None = None) -> list[ChunkWrite]:
+        """Embed and add chunks, skipping any already stored under the same id.
+        
+        Ids derive from the chunk's "source" metadata, qualified by its namespace
+        and tenant, its parent if it has one, and its content, so re-uploading
+        unchanged text costs one id lookup instead of an embedding.
+        """
+        metadatas = metadatas or [{} for _ in chunks]
+        keys = [source_key(metadata) for metadata in metadatas]
+        ids = [
+            chunk_id(key, chunk, metadata.get("parent_id"))
+            for key, chunk, metadata in zip(keys, chunks, metadatas)
+        ]
+        # The lookup and the write must not interleave with another write of the same source
+        with ExitStack() as locks:
+            with span("chunk_write_lock_wait"):
+                locks.enter_context(self._locked_sources(set(keys)))
+            with span("chunk_lookup"):
+                existing = set(self._vector_store.get(ids=list(set(ids)), include=[])["ids"])
+            
+            new_ids, documents, writes = [], [], []
+            for doc_id, chunk, metadata in zip(ids, chunks, metadatas):
+                added = doc_id not in existing
+                if added:
+                    existing.add(doc_id)
+                    new_ids.append(doc_id)
+                    documents.append(Document(page_content=chunk, metadata=metadata))
+                writes.append(ChunkWrite(doc_id, added))
+            
+            if documents:
+                with span("chunk_embed_and_write"):
+                    self._vector_store.add_documents(documents, ids=new_ids)
+                with span("lexical_index_write"):
+                    self._lexical_index.add(
+                        new_ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents]
+                    )
+                self._bump_version()
+                self._stats.record_added([source_key(doc.metadata) for doc in documents])
+        logger.info(f"Added {len(documents)} chunks, skipped {len(chunks) - len(documents)} unchanged.")
+        if isinstance(self._embeddings, CachedEmbeddings):
+            logger.info(
+                f"Embedding cache: {self._embeddings.hits} hits, {self._embeddings.misses} misses"
+            )
+        return writes
+    
+    def delete_stale(self, source: str, keep_ids: set[str], scope: dict | None = None) -> int:
+        """Delete chunks of a source that are not in keep_ids; return how many.
+        
+        Only chunks in the same namespace and tenant as scope count as the source's.
+        Parent sections no kept chunk refers to are dropped too.
+        """
+        scope = scope_of(scope or {})
+        with self._locked_sources({source_key({**scope, "source": source})}), span("delete_stale"):
+            stored = self._vector_store.get(where={"source": source}, include=["metadatas"])
+            owned = [
+                (doc_id, metadata or {}) for doc_id, metadata in zip(stored["ids"], stored["metadatas"])
+                if scope_of(metadata or {}) == scope
+            ]
+            stale = [doc_id for doc_id, _ in owned if doc_id not in keep_ids]
+            if stale:
+                self._vector_store.delete(ids=stale)
+                self._lexical_index.remove(stale)
+            kept_parents = {metadata.get("parent_id") for doc_id, metadata in owned if doc_id in keep_ids}
+            self._parents.remove_stale(source_key({**scope, "source": source}), kept_parents)
+        if stale:
+            self._bump_version()
+            self._stats.record_removed(source_key({**scope, "source": source}), len(stale))
+            logger.info(f"Removed {len(stale)} stale chunks of {source}")
+        return len(stale)
+    
+    def delete_chunks(self, ids: list[str]) -> int:
+        """Delete chunks by id, as when rolling back a file that failed partway; return how many."""
+        with span("delete_chunks"):
+            stored = self._vector_store.get(ids=ids, include=["metadatas"])
+            if stored["ids"]:
+                self._vector_store.delete(ids=stored["ids"])
+                self._lexical_index.remove(stored["ids"])
+        if not stored["ids"]:
+            return 0
+        self._bump_version()
+        removed: dict[str, int] = {}
+        for metadata in stored["metadatas"]:
+            key = source_key(metadata or {})
+            removed[key] = removed.get(key, 0) + 1
+        for key, count in removed.items():
+            self._stats.record_removed(key, count)
+        logger.info(f"Deleted {len(stored['ids'])} chunks")
+        return len(stored["ids"])
+    
+    def recount_sources(self) -> None:
+        """Recount chunks per source from the collection, as after copying it between stores."""
+        self._stats.rebuild(self._vector_store._collection)
+    
+    def _bump_version(self) -> None:
+        """Mark the collection as changed."""
+        self._version.increment()
+    
+    def embed_query(self, query: str) -> list[float]:
+        """Embed a query with the collection's embedding model."""
+        with span("embed_query"):
+            return self._embeddings.embed_query(query)
+    
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """Embed several queries in one batched call."""
+        with span("embed_query"):
+            return embed_queries(self._embeddings, queries)
+    
+    def search(
+        self,
+        queries: list[str],
+        k: int = 5,
+        where: dict | None = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        score_threshold: float | None = None
+    ) -> list[list[tuple[Document, float]]]:
+        """Search for several queries with one embedding call and one Chroma query.
+        
+        Returns (document, relevance score) pairs per query; higher scores are
+        closer, see _relevance. Candidates below score_threshold are dropped. With mmr, the k
+        results are picked from fetch_k candidates for diversity.
+        """
+        vectors = self.embed_queries(queries)
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if mmr else [])
+        with span("vector_search"):
+            found = self._vector_store._collection.query(
+                query_embeddings=vectors,
+                n_results=max(k, fetch_k) if mmr else k,
+                where=where,
+                include=include
+            )
+        relevance = self._relevance_fn()
+        
+        results = []
+        for i, vector in enumerate(vectors):
+            candidates = [
+                (Document(id=doc_id, page_content=text, metadata=metadata or {}), relevance(distance), row)
+                for row, (doc_id, text, metadata, distance) in enumerate(zip(
+                    found["ids"][i], found["documents"][i], found["metadatas"][i], found["distances"][i]
+                ))
+            ]
+            if score_threshold is not None:
+                candidates = [candidate for candidate in candidates if candidate[1] >= score_threshold]
+            if mmr:
+                picked = maximal_marginal_relevance(
+                    vector,
+                    [found["embeddings"][i][row] for _, _, row in candidates],
+                    k,
+                    lambda_mult
+                )
+                candidates = [candidates[index] for index in picked]
+            results.append([(doc, score) for doc, score, _ in candidates[:k]])
+        return results
+    
+    def _relevance_fn(self):
+        """Map Chroma distances to a score that is the cosine similarity for unit-length embeddings.
+        
+        Chroma's l2 is the squared distance, so for unit vectors it is 2 - 2 * cosine.
+        """
+        hnsw = self._vector_store._collection.configuration.get("hnsw") or {}
+        if hnsw.get("space", "l2") == "l2":
+            return lambda distance: 1.0 - distance / 2
+        return lambda distance: 1.0 - distance
+    
+    def similarity_search(self, query: str, k: int = 5, where: dict | None = None) -> list[Document]:
+        """Perform similarity search, restricted to chunks matching a Chroma where clause."""
+        with span("vector_search"):
+            return self._vector_store.similarity_search(query, k=k, filter=where)
+    
+    def warm_up(self) -> None:
+        """Open the collection and backfill the BM25 index before the first query."""
+        count = self._vector_store._collection.count()
+        self._ensure_lexical_index()
+        logger.info(f"Vector store ready with {count} chunks")
+    
+    def _ensure_lexical_index(self) -> None:
+        """Backfill the BM25 index once if the collection has chunks it lacks."""
+        if self._lexical_checked:
+            return
+        with self._lexical_lock:
+            if not self._lexical_checked:
+                collection = self._vector_store._collection
+                if len(self._lexical_index) < collection.count():
+                    self._lexical_index.rebuild(collection)
+                self._lexical_checked = True
+    
+    def lexical_search(self, query: str, k: int = 5, where: dict | None = None) -> list[Document]:
+        """Perform BM25 keyword search, filtered by the where clause within the index."""
+        self._ensure_lexical_index()
+        with span("lexical_search"):
+            hits = self._lexical_index.search(query, k, where)
+            if not hits:
+                return []
+            docs = {doc.id: doc for doc in self._vector_store.get_by_ids([doc_id for doc_id, _ in hits])}
+            return [docs[doc_id] for doc_id, _ in hits if doc_id in docs]
+    
+    def hybrid_search(self, query: str, where: dict | None = None) -> list[Document]:
+        """Fuse dense and BM25 results with reciprocal rank fusion."""
+        settings = self.settings
+        dense = self.similarity_search(query, k=settings.retrieval_vector_k, where=where)
+        if settings.retrieval_bm25_k <= 0:
+            return dense[:settings.retrieval_candidate_k]
+        lexical = self.lexical_search(query, k=settings.retrieval_bm25_k, where=where)
+        fused = reciprocal_rank_fusion(
+            [dense, lexical],
+            weights=[settings.retrieval_vector_weight, settings.retrieval_bm25_weight],
+            k=settings.retrieval_rrf_k
         )
-        ids = self._vector_store.add_documents(documents)
-        logger.info(f"Successfully added {len(ids)} chunks.")
-        return ids
+        logger.info(f"Hybrid retrieval: {len(dense)} dense + {len(lexical)} lexical -> {len(fused)} fused")
+        return fused[:settings.retrieval_candidate_k]
     
-    def similarity_search(self, query: str, k: int = 5) -> list[Document]:
-        """Perform similarity search."""
-        return self._vector_store.similarity_search(query, k=k)
+    def _get_disk_size(self) -> int | None:
+        """Size of the persist directory, cached for a short while."""
+        directory = self.settings.chroma_persist_directory
+        if not directory or not os.path.isdir(directory):
+            return None
+        now = time.monotonic()
+        if self._disk_size is None or now - self._disk_size[0] > self.settings.status_disk_size_ttl_seconds:
+            total = 0
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            self._disk_size = (now, total)
+        return self._disk_size[1]
     
     def get_status(self) -> dict:
-        """Get vector store status."""
+        """Get vector store status without reading the collection's ids."""
         collection = self._vector_store._collection
-        doc_count = len(collection.get()["ids"])
+        doc_count = collection.count()
+        
+        # One-time backfill for collections created before stats were tracked
+        if not self._stats.loaded and doc_count:
+            self._stats.rebuild(collection)
+        if self._stats.embedding_dim is None and doc_count:
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            if sample is not None and len(sample):
+                self._stats.record_embedding_dim(len(sample[0]))
+        
         return {
             "collection_name": self.settings.chroma_collection_name,
             "document_count": doc_count,
-            "is_persistent": self.settings.chroma_persist_directory is not None
+            "source_count": self._stats.source_count,
+            "is_persistent": bool(self.settings.chroma_server_host) or self.settings.chroma_persist_directory is not None,
+            "disk_size_bytes": self._get_disk_size(),
+            "embedding_dimension": self._stats.embedding_dim,
+            "last_ingest_at": self._stats.last_ingest_at
         }
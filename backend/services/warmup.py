@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from backend.logger import logger
+
+WarmupStep = Callable[[], Awaitable[object]]
+
+
+class WarmupService:
+    """Builds the heavy services in the background and tracks readiness.
+
+    Steps run in phases: the steps of a phase run concurrently, and a phase
+    starts once the previous one has finished.
+    """
+
+    def __init__(self):
+        self.components: dict[str, str] = {}
+        self.errors: dict[str, str] = {}
+        self.started_at = time.time()
+        self.ready_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def start(self, phases: list[dict[str, WarmupStep]]) -> None:
+        """Start warming up in the background."""
+        for phase in phases:
+            for name in phase:
+                self.components[name] = "pending"
+        self._task = asyncio.create_task(self._run(phases))
+
+    async def stop(self) -> None:
+        """Cancel a warmup that is still running."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _step(self, name: str, step: WarmupStep) -> None:
+        started = time.perf_counter()
+        self.components[name] = "warming"
+        try:
+            await step()
+        except Exception as e:
+            self.components[name] = "failed"
+            self.errors[name] = str(e)
+            logger.error(f"Warmup of {name} failed: {str(e)}")
+            return
+        self.components[name] = "ready"
+        logger.info(f"Warmed up {name} in {time.perf_counter() - started:.2f}s")
+
+    async def _run(self, phases: list[dict[str, WarmupStep]]) -> None:
+        for phase in phases:
+            await asyncio.gather(*(self._step(name, step) for name, step in phase.items()))
+            if self.errors:
+                logger.error("Warmup stopped; the service will not report ready")
+                return
+        self.ready_at = time.time()
+        logger.info(f"Ready {self.ready_at - self.started_at:.2f}s after startup")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "components": dict(self.components),
+            "errors": dict(self.errors),
+            "startup_seconds": self.ready_at - self.started_at if self.ready else None
+        }
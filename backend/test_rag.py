@@ -1,15 +1,36 @@
 """
-Test script to verify the RAG chain with Google GenAI integration.
-This script tests the basic functionality of the RAG chain.
+Test script to verify the RAG services end to end.
+Runs with the fake chat and embedding models, so no API key is needed:
+
+    python -m backend.test_rag
 """
 
-from RAGChain import rag_chain, vector_store, text_splitter
+import os
+import tempfile
+
+os.environ.setdefault("GEMINI_API_KEY", "unused")
+
+from backend.config import Settings
+from backend.services.executor import ExecutorService
+from backend.services.vector_store import VectorStoreService
+from backend.services.rag_chain import RAGService
 
 def test_rag_chain():
     print("=" * 60)
-    print("Testing RAG Chain with Google GenAI")
+    print("Testing RAG services with fake models")
     print("=" * 60)
-    
+
+    settings = Settings(
+        llm_provider="fake",
+        embedding_provider="fake",
+        fake_llm_first_token_ms=0,
+        fake_llm_token_ms=0,
+        fake_embedding_latency_ms=0,
+        chroma_persist_directory=tempfile.mkdtemp(prefix="rag-test-")
+    )
+    executor = ExecutorService(settings)
+    vector_store = VectorStoreService(settings)
+
     # Step 1: Add a sample document to the vector store
     print("\n1. Adding sample document to vector store...")
     sample_text = """
@@ -18,16 +39,15 @@ def test_rag_chain():
     Gemini 1.5 Flash is optimized for speed and efficiency, making it ideal for high-volume tasks.
     The model supports a context window of up to 1 million tokens.
     """
-    
+
     try:
-        texts = text_splitter.create_documents([sample_text])
-        ids = vector_store.add_documents(texts)
+        ids = vector_store.add_documents(sample_text, {"source": "sample.txt"})
         print(f"   ✓ Successfully added {len(ids)} document chunks")
         print(f"   Document IDs: {ids}")
     except Exception as e:
         print(f"   ✗ Error adding documents: {e}")
         return
-    
+
     # Step 2: Test vector store similarity search
     print("\n2. Testing vector store similarity search...")
     try:
@@ -38,31 +58,34 @@ def test_rag_chain():
     except Exception as e:
         print(f"   ✗ Error in similarity search: {e}")
         return
-    
+
     # Step 3: Test RAG chain invoke
     print("\n3. Testing RAG chain invoke...")
     query = "What is Google Gemini?"
     try:
-        response = rag_chain.invoke(query)
+        rag_service = RAGService(settings, vector_store, executor)
+        response = rag_service.invoke(query)
         print(f"   Query: {query}")
-        print(f"   ✓ Response: {response}")
+        print(f"   ✓ Response: {response['answer']}")
     except Exception as e:
         print(f"   ✗ Error invoking RAG chain: {e}")
         return
-    
+
     # Step 4: Test RAG chain streaming
     print("\n4. Testing RAG chain streaming...")
     query = "What is Gemini 1.5 Flash optimized for?"
     try:
         print(f"   Query: {query}")
         print(f"   ✓ Streaming response: ", end="")
-        for token in rag_chain.stream(query):
+        for token in rag_service.stream(query):
             print(token, end="", flush=True)
         print()  # New line after streaming
     except Exception as e:
         print(f"\n   ✗ Error streaming from RAG chain: {e}")
         return
-    
+    finally:
+        executor.shutdown()
+
     print("\n" + "=" * 60)
     print("All tests completed successfully! ✓")
     print("=" * 60)
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+# Settings requires a key even when every model is fake
+os.environ.setdefault("GEMINI_API_KEY", "unused")
+
+from backend.config import Settings
+
+
+@pytest.fixture
+def settings(tmp_path):
+    """Settings for fake models with nothing shared between tests."""
+    return Settings(
+        llm_provider="fake",
+        embedding_provider="fake",
+        fake_llm_first_token_ms=0,
+        fake_llm_token_ms=0,
+        fake_embedding_latency_ms=0,
+        chroma_server_host=None,
+        chroma_persist_directory=str(tmp_path / "chroma")
+    )
@@ -0,0 +1,48 @@
+from backend.services.answer_cache import AnswerCache
+
+ANSWER = {"answer": "42", "sources": ["a.txt"]}
+
+
+def test_queries_match_after_normalization(settings):
+    cache = AnswerCache(settings)
+    cache.put("What is the answer?", 1, ANSWER)
+
+    assert cache.get("  what is   the ANSWER ", 1) == ANSWER
+    assert cache.get("what is the answer", 1, scope="tenant=acme") is None
+
+
+def test_a_new_collection_version_drops_every_answer(settings):
+    cache = AnswerCache(settings)
+    cache.put("q", 1, ANSWER)
+
+    assert cache.get("q", 2) is None
+    assert cache.get("q", 1) is None
+
+
+def test_answers_computed_before_a_write_are_not_stored(settings):
+    cache = AnswerCache(settings)
+    cache.get("other", 2)
+    cache.put("q", 1, ANSWER)
+
+    assert cache.get("q", 2) is None
+
+
+def test_near_duplicates_hit_above_the_threshold(settings):
+    settings.answer_cache_similarity_threshold = 0.95
+    cache = AnswerCache(settings)
+    cache.put("q", 1, ANSWER, embedding=[1.0, 0.0])
+
+    assert cache.get_similar([0.99, 0.05], 1) == ANSWER
+    assert cache.get_similar([0.5, 0.5], 1) is None
+
+
+def test_least_recently_used_answers_are_evicted(settings):
+    settings.answer_cache_max_entries = 2
+    cache = AnswerCache(settings)
+    for query in ["a", "b"]:
+        cache.put(query, 1, ANSWER)
+    cache.get("a", 1)
+    cache.put("c", 1, ANSWER)
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == ANSWER
@@ -0,0 +1,44 @@
+import json
+
+from backend.services.collection_stats import CollectionStats
+from backend.services.metadata import source_key
+from backend.services.vector_store import VectorStoreService
+
+
+def test_same_filename_counts_once_per_scope(tmp_path):
+    stats = CollectionStats(str(tmp_path / "stats.json"))
+    acme = source_key({"source": "a.txt", "tenant": "acme"})
+    globex = source_key({"source": "a.txt", "tenant": "globex"})
+
+    stats.record_added([acme, acme, globex, source_key({})])
+    stats.record_removed(globex, 1)
+
+    assert stats.source_counts == {acme: 2, "": 1}
+    assert stats.source_count == 1
+
+
+def test_counts_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "stats.json")
+    CollectionStats(path).record_added(["a.txt"])
+
+    stats = CollectionStats(path)
+
+    assert stats.loaded
+    assert stats.source_counts == {"a.txt": 1}
+
+
+def test_files_in_an_older_format_are_recounted(tmp_path):
+    path = tmp_path / "stats.json"
+    path.write_text(json.dumps({"source_counts": {"a.txt": 3}}))
+
+    assert not CollectionStats(str(path)).loaded
+
+
+def test_fresh_store_needs_no_rebuild(settings):
+    store = VectorStoreService(settings)
+    store.add_documents("some text", {"source": "a.txt", "namespace": "docs"})
+
+    assert store._stats.loaded
+    assert store.get_status()["source_count"] == 1
+    store.add_documents("some text", {"source": "a.txt", "namespace": "other"})
+    assert store.get_status()["source_count"] == 2
@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+
+from backend.services.context_builder import ContextBuilder, overlap_length
+
+
+def _doc(text, source="a.txt", score=None):
+    metadata = {"source": source}
+    if score is not None:
+        metadata["relevance_score"] = score
+    return Document(page_content=text, metadata=metadata)
+
+
+def _builder(settings, max_tokens=2000, overlap=40):
+    settings.context_max_tokens = max_tokens
+    settings.context_chars_per_token = 1.0
+    settings.context_min_fragment_tokens = 10
+    settings.chunk_overlap = overlap
+    return ContextBuilder(settings)
+
+
+def test_overlap_length_ignores_short_coincidences():
+    assert overlap_length("x" * 10 + "shared text that is long", "shared text that is long" + "y", 100) == 24
+    assert overlap_length("ends with the", "the start", 100) == 0
+
+
+def test_chunks_are_ordered_by_relevance(settings):
+    docs = [_doc("low " * 10, "a", 0.1), _doc("high " * 10, "b", 0.9)]
+
+    context, used = _builder(settings).build(docs)
+
+    assert context.startswith("high")
+    assert [doc.metadata["source"] for doc in used] == ["b", "a"]
+
+
+def test_adjacent_chunks_are_merged_without_their_overlap(settings):
+    text = " ".join(f"word{i}" for i in range(60))
+    first, second = text[:200], text[160:]
+
+    context, used = _builder(settings).build([_doc(first, score=0.9), _doc(second, score=0.8)])
+
+    assert context == text
+    assert len(used) == 2
+
+
+def test_last_chunk_is_truncated_at_a_word_to_fit(settings):
+    docs = [_doc("first " * 20, "a", 0.9), _doc("second " * 20, "b", 0.8), _doc("third " * 20, "c", 0.7)]
+
+    context, used = _builder(settings, max_tokens=160).build(docs)
+
+    assert len(context) <= 160 + len("\n\n")
+    assert [doc.metadata["source"] for doc in used] == ["a", "b"]
+    truncated = context.split("\n\n")[1]
+    assert set(truncated.split()) == {"second"}
+    assert len(truncated) < len(docs[1].page_content.strip())
+
+
+def test_leftovers_below_the_minimum_fragment_are_dropped(settings):
+    docs = [_doc("first " * 20, "a", 0.9), _doc("second " * 20, "b", 0.8)]
+
+    context, used = _builder(settings, max_tokens=125).build(docs)
+
+    assert [doc.metadata["source"] for doc in used] == ["a"]
+    assert context == docs[0].page_content
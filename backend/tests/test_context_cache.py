@@ -0,0 +1,43 @@
+import pytest
+
+from backend.services.context_cache import ContextCache, LocalContextCache
+
+
+@pytest.fixture
+def cache(settings):
+    settings.context_cache_min_uses = 2
+    settings.context_cache_min_tokens = 10
+    settings.context_cache_max_entries = 2
+    return LocalContextCache(settings, {})
+
+
+def test_base_class_needs_a_provider(settings):
+    with pytest.raises(TypeError):
+        ContextCache(settings)
+
+
+def test_prefix_is_cached_once_popular(cache):
+    prefix = "context " * 10
+
+    assert cache.lookup(prefix) is None
+    name = cache.lookup(prefix)
+
+    assert name is not None and cache.store[name] == prefix
+    assert cache.lookup(prefix) == name
+
+
+def test_short_prefixes_are_sent_in_full(cache):
+    assert cache.lookup("short") is None
+    assert cache.lookup("short") is None
+    assert cache.store == {}
+
+
+def test_least_recently_used_caches_are_deleted(cache):
+    names = []
+    for i in range(3):
+        prefix = f"context {i} " * 10
+        cache.lookup(prefix)
+        names.append(cache.lookup(prefix))
+
+    assert names[0] not in cache.store
+    assert set(cache.store) == set(names[1:])
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from backend.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def test_documents_are_persisted_and_shared(tmp_path):
+    model = CountingEmbeddings(size=8)
+    first = CachedEmbeddings(model, "fake", str(tmp_path))
+    vectors = first.embed_documents(["a", "b"])
+
+    second = CachedEmbeddings(model, "fake", str(tmp_path))
+
+    assert np.allclose(second.embed_documents(["b", "a"]), vectors[::-1])
+    assert model.calls == 2
+    assert second.hits == 2
+
+
+def test_queries_stay_in_a_bounded_memory_cache(tmp_path):
+    model = CountingEmbeddings(size=8)
+    cache = CachedEmbeddings(model, "fake", str(tmp_path), max_queries=2)
+
+    cache.embed_query("one")
+    cache.embed_queries(["two", "one", "three"])
+
+    assert model.calls == 3
+    assert list(cache._queries) == [cache._key("query", "two"), cache._key("query", "three")]
+    assert not os.path.exists(os.path.join(tmp_path, "fake", CachedEmbeddings.KEYS_FILE))
+
+    cache.embed_query("one")
+    assert model.calls == 4
@@ -0,0 +1,173 @@
+import asyncio
+import random
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.services.executor import ExecutorService
+from backend.services.ingestion import IncrementalSplitter, IngestionService
+from backend.services.vector_store import VectorStoreService
+
+WORDS = "alpha beta gamma delta iota mu nu xi epsilon zeta".split()
+
+
+def _stream(splitter, segments, window):
+    incremental = IncrementalSplitter(splitter, window)
+    chunks = []
+    for page, segment in enumerate(segments):
+        chunks += incremental.feed(segment, page)
+    return chunks + incremental.flush()
+
+
+def _lines(rng, count, endings):
+    return "".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))) + rng.choice(endings)
+        for _ in range(count)
+    )
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(100, 0), (200, 20), (500, 50), (1000, 200)])
+@pytest.mark.parametrize("block_size", [100, 997])
+def test_streamed_chunks_match_whole_text(chunk_size, chunk_overlap, block_size):
+    rng = random.Random(chunk_size + chunk_overlap + block_size)
+    text = _lines(rng, 400, ["\n", "\n", "\n\n"])
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    blocks = [text[i:i + block_size] for i in range(0, len(text), block_size)]
+
+    chunks = _stream(splitter, blocks, chunk_size * 4)
+
+    assert [chunk for chunk, _ in chunks] == splitter.split_text(text)
+
+
+def test_pages_ending_in_line_breaks_match_whole_text():
+    rng = random.Random(0)
+    pages = [_lines(rng, rng.randint(1, 8), ["\n"]) + "\n" for _ in range(60)]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40)
+
+    chunks = _stream(splitter, pages, 800)
+
+    assert [chunk for chunk, _ in chunks] == splitter.split_text("".join(pages))
+
+
+def test_words_are_not_glued_across_segments():
+    # No line breaks, so the tail carried between segments is cut at a space
+    rng = random.Random(1)
+    text = " ".join(rng.choice(WORDS) for _ in range(3000))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=20)
+    blocks = [text[i:i + 101] for i in range(0, len(text), 101)]
+
+    chunks = _stream(splitter, blocks, 400)
+
+    for chunk, _ in chunks:
+        assert chunk in text
+        assert set(chunk.split()) <= set(WORDS)
+
+
+def test_chunks_report_the_page_they_start_on():
+    pages = [f"page {page} " + "word " * 60 + "\n\n" for page in range(5)]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0)
+
+    chunks = _stream(splitter, pages, 400)
+
+    for chunk, page in chunks:
+        if chunk.startswith("page "):
+            assert chunk.split()[1] == str(page)
+    assert sorted({page for _, page in chunks}) == list(range(5))
+
+
+@pytest.fixture
+def ingestion(settings):
+    settings.ingestion_batch_size = 8
+    executor = ExecutorService(settings)
+    yield IngestionService(settings, VectorStoreService(settings), executor)
+    executor.shutdown()
+
+
+def _write_text(tmp_path, name, lines, tail=b""):
+    path = tmp_path / name
+    path.write_bytes("".join(f"line {i} with some words\n" for i in lines).encode() + tail)
+    return str(path)
+
+
+def _count(ingestion):
+    return ingestion.vector_store.get_status()["document_count"]
+
+
+def test_file_failing_partway_leaves_no_chunks(ingestion, tmp_path):
+    # Invalid UTF-8 after several 64 KiB blocks, so batches are written before decoding fails
+    path = _write_text(tmp_path, "bad.txt", range(8000), tail=b"\xff\xfe")
+
+    with pytest.raises(UnicodeDecodeError):
+        asyncio.run(ingestion.ingest_file(path, False, {"source": "bad.txt"}))
+
+    assert _count(ingestion) == 0
+
+
+def test_failed_reupload_keeps_chunks_already_stored(ingestion, tmp_path):
+    first = asyncio.run(ingestion.ingest_file(_write_text(tmp_path, "v1", range(4000)), False, {"source": "doc"}))
+    path = _write_text(tmp_path, "v2", range(8000), tail=b"\xff")
+
+    with pytest.raises(UnicodeDecodeError):
+        asyncio.run(ingestion.ingest_file(path, False, {"source": "doc"}))
+
+    assert _count(ingestion) == len(first.ids)
+
+
+def test_bulk_keeps_good_files_and_drops_failed_ones(ingestion, tmp_path):
+    good = open(_write_text(tmp_path, "good.txt", range(100)), "rb")
+    bad = open(_write_text(tmp_path, "bad.txt", range(100, 8000), tail=b"\xff"), "rb")
+    files = [UploadFile(good, filename="good.txt"), UploadFile(bad, filename="bad.txt")]
+
+    with good, bad:
+        results = asyncio.run(ingestion.ingest_bulk(files))
+
+    assert results[0]["error"] is None
+    assert results[1]["error"] is not None
+    assert _count(ingestion) == results[0]["chunks_count"] > 0
+
+
+def test_bulk_files_with_the_same_name_keep_each_others_chunks(ingestion, tmp_path):
+    first = open(_write_text(tmp_path, "a.txt", range(100)), "rb")
+    second = open(_write_text(tmp_path, "b.txt", range(100, 200)), "rb")
+    files = [UploadFile(first, filename="notes.txt"), UploadFile(second, filename="notes.txt")]
+
+    with first, second:
+        results = asyncio.run(ingestion.ingest_bulk(files))
+
+    assert [result["error"] for result in results] == [None, None]
+    assert [result["removed_count"] for result in results] == [0, 0]
+    assert _count(ingestion) == results[0]["chunks_count"] + results[1]["chunks_count"]
+
+
+@pytest.mark.parametrize("limit,value", [("ingestion_archive_max_bytes", 64 * 1024), ("ingestion_archive_max_members", 1)])
+def test_bulk_rejects_archives_over_their_limits(ingestion, tmp_path, limit, value):
+    setattr(ingestion.settings, limit, value)
+    path = tmp_path / "bomb.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("small.txt", "line with some words\n" * 10)
+        archive.writestr("big.txt", "0" * 1024 * 1024)
+    good = open(_write_text(tmp_path, "good.txt", range(100)), "rb")
+    bomb = open(path, "rb")
+    files = [UploadFile(good, filename="good.txt"), UploadFile(bomb, filename="bomb.zip")]
+
+    with good, bomb:
+        results = asyncio.run(ingestion.ingest_bulk(files))
+
+    assert [result["filename"] for result in results] == ["bomb.zip", "good.txt"]
+    assert results[0]["error"].startswith("Invalid archive: more than")
+    assert results[1]["error"] is None
+    assert _count(ingestion) == results[1]["chunks_count"]
+
+
+def test_concurrent_uploads_of_a_file_add_its_chunks_once(ingestion, tmp_path):
+    path = _write_text(tmp_path, "doc.txt", range(500))
+
+    async def upload_four_times():
+        return await asyncio.gather(*(ingestion.ingest_file(path, False, {"source": "doc.txt"}) for _ in range(4)))
+
+    results = asyncio.run(upload_four_times())
+
+    assert sum(result.added for result in results) == len(results[0].ids) == _count(ingestion)
+    assert ingestion.vector_store._stats.source_counts == {"doc.txt": _count(ingestion)}
@@ -0,0 +1,34 @@
+import asyncio
+import io
+
+from fastapi import UploadFile
+
+from backend.services.executor import ExecutorService
+from backend.services.ingestion import IngestionService
+from backend.services.jobs import IngestionJobQueue
+from backend.services.vector_store import VectorStoreService
+
+
+def test_upload_queued_before_start_runs_once_started(settings):
+    executor = ExecutorService(settings)
+    queue = IngestionJobQueue(settings, IngestionService(settings, VectorStoreService(settings), executor), executor)
+
+    async def scenario():
+        job_id = await queue.submit(UploadFile(io.BytesIO(b"some words to index\n" * 50), filename="notes.txt"))
+        await queue.start()
+        try:
+            for _ in range(100):
+                job = await queue.get(job_id)
+                if job["finished_at"]:
+                    return job
+                await asyncio.sleep(0.05)
+        finally:
+            await queue.stop()
+
+    try:
+        job = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    assert job["error"] is None
+    assert job["chunks_embedded"] > 0
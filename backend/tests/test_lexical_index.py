@@ -0,0 +1,74 @@
+import sqlite3
+
+from backend.services.lexical_index import BM25Index, tokenize
+from backend.services.metadata import build_where, upload_metadata
+
+
+def _index(path=None):
+    index = BM25Index(path)
+    index.add(
+        ["a", "b", "c"],
+        ["disk quota exceeded", "disk full on node", "network timeout"],
+        [
+            {"source": "ops.md", **upload_metadata(namespace="ops", tags=["storage"])},
+            {"source": "dev.md", **upload_metadata(namespace="dev")},
+            {"source": "ops.md", **upload_metadata(namespace="ops")},
+        ]
+    )
+    return index
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts():
+    assert tokenize("ERR_CONN_RESET at 10.0.0.1") == [
+        "err_conn_reset", "err", "conn", "reset", "at", "10.0.0.1", "10", "0", "0", "1"
+    ]
+
+
+def test_search_ranks_matching_chunks():
+    hits = _index().search("disk quota", k=5)
+
+    assert [doc_id for doc_id, _ in hits] == ["a", "b"]
+
+
+def test_search_filters_by_where_clause():
+    index = _index()
+
+    assert [doc_id for doc_id, _ in index.search("disk", k=5, where={"namespace": "dev"})] == ["b"]
+    assert index.search("disk", k=5, where=build_where(namespace="ops", tags=["storage"]))[0][0] == "a"
+    assert index.search("disk", k=5, where={"source": {"$in": ["other.md"]}}) == []
+
+
+def test_remove_drops_chunks_from_results():
+    index = _index()
+    index.remove(["a"])
+
+    assert [doc_id for doc_id, _ in index.search("disk", k=5)] == ["b"]
+    assert len(index) == 2
+
+
+def test_index_without_metadata_is_reset(tmp_path):
+    path = str(tmp_path / "bm25.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL);
+        INSERT INTO docs VALUES ('old', 3);
+    """)
+    conn.close()
+
+    index = BM25Index(path)
+
+    assert len(index) == 0
+    assert index.search("disk", k=5) == []
+
+
+def test_common_terms_are_skipped_in_large_indexes(monkeypatch):
+    monkeypatch.setattr("backend.services.lexical_index.COMMON_TERM_MIN_DOCS", 10)
+    index = BM25Index(None)
+    texts = [f"the log line {i}" for i in range(20)] + ["the disk failed", "the disk is fine"]
+    index.add([str(i) for i in range(len(texts))], texts)
+
+    hits = index.search("the disk", k=5)
+
+    # "the" is in every chunk, so only "disk" is scored
+    assert [doc_id for doc_id, _ in hits] == ["20", "21"]
+    assert index.search("the", k=5)
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.llm_gateway import BACKGROUND, INTERACTIVE, LLMGateway, LLMOverloadedError
+
+
+class Throttled(Exception):
+    code = 429
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+@pytest.fixture
+def gateway_settings(settings):
+    settings.llm_max_concurrency = 4
+    settings.llm_retry_base_seconds = 0.0
+    settings.llm_max_retries = 3
+    return settings
+
+
+def test_throttling_halves_the_limit_and_successes_grow_it_back(gateway_settings):
+    gateway = LLMGateway(gateway_settings)
+    calls = 0
+
+    def flaky():
+        nonlocal calls
+        calls += 1
+        if calls <= 2:
+            raise Throttled("429 RESOURCE_EXHAUSTED")
+        return "ok"
+
+    assert gateway.run(INTERACTIVE, flaky) == "ok"
+    # 4 -> 2 -> 1, then one success adds 1 / limit
+    assert gateway._limit == 2.0
+    for _ in range(10):
+        gateway.run(INTERACTIVE, lambda: "ok")
+    assert gateway._limit == 4.0
+
+
+def test_non_retryable_errors_fail_at_once(gateway_settings):
+    gateway = LLMGateway(gateway_settings)
+    calls = 0
+
+    def bad():
+        nonlocal calls
+        calls += 1
+        raise BadRequest("400 invalid argument")
+
+    with pytest.raises(BadRequest):
+        gateway.run(INTERACTIVE, bad)
+    assert calls == 1
+
+
+def test_persistent_throttling_is_reported_as_overload(gateway_settings):
+    gateway = LLMGateway(gateway_settings)
+
+    def throttled():
+        raise Throttled("429")
+
+    with pytest.raises(LLMOverloadedError):
+        gateway.run(INTERACTIVE, throttled)
+
+
+def test_token_bucket_paces_calls(gateway_settings):
+    gateway_settings.llm_requests_per_second = 50.0
+    gateway_settings.llm_burst = 1
+    gateway = LLMGateway(gateway_settings)
+
+    started = time.monotonic()
+    for _ in range(6):
+        gateway.run(INTERACTIVE, lambda: None)
+
+    # The first call uses the burst token; the other five wait 20 ms each
+    assert time.monotonic() - started >= 0.09
+
+
+def test_full_queue_rejects_calls(gateway_settings):
+    gateway_settings.llm_max_concurrency = 1
+    gateway_settings.llm_max_queue = 1
+    gateway = LLMGateway(gateway_settings)
+    release = threading.Event()
+    threads = [threading.Thread(target=gateway.run, args=(INTERACTIVE, release.wait)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while gateway.queue_depth < 1:
+        time.sleep(0.001)
+
+    with pytest.raises(LLMOverloadedError):
+        gateway.run(INTERACTIVE, lambda: None)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_interactive_calls_run_before_background_ones(gateway_settings):
+    gateway_settings.llm_max_concurrency = 1
+    gateway = LLMGateway(gateway_settings)
+    order = []
+
+    async def call(name, priority, delay):
+        await asyncio.sleep(delay)
+
+        async def record():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+        await gateway.arun(priority, record)
+
+    async def main():
+        await asyncio.gather(
+            call("first", INTERACTIVE, 0),
+            call("rewrite", BACKGROUND, 0.001),
+            call("answer", INTERACTIVE, 0.002)
+        )
+
+    asyncio.run(main())
+    assert order == ["first", "answer", "rewrite"]
+
+
+def test_slow_calls_are_hedged(gateway_settings):
+    gateway_settings.llm_hedge_after_ms = 20
+    gateway = LLMGateway(gateway_settings)
+    attempts = 0
+
+    async def slow_then_fast():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(5 if attempts == 1 else 0)
+        return attempts
+
+    started = time.monotonic()
+    assert asyncio.run(gateway.arun(INTERACTIVE, slow_then_fast)) == 2
+    assert time.monotonic() - started < 1
+    assert gateway.in_flight == 0
+
+
+def test_streams_are_retried_until_the_first_item(gateway_settings):
+    gateway = LLMGateway(gateway_settings)
+    opened = 0
+
+    def open_stream():
+        nonlocal opened
+        opened += 1
+        if opened == 1:
+            raise Throttled("429")
+        yield from "abc"
+
+    assert list(gateway.stream(INTERACTIVE, open_stream)) == ["a", "b", "c"]
+    assert opened == 2
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from backend.services.quantized_index import QuantizedCollection
+
+METADATAS = [
+    {"source": "a.txt", "tenant": "acme", "page": 1, "tag:fin": True},
+    {"source": "a.txt", "tenant": "globex", "page": 2},
+    {"source": "b.txt", "tenant": "acme", "page": 3},
+    {"source": "d.txt", "tenant": "initech"}
+]
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = QuantizedCollection("test", str(tmp_path), space="cosine")
+    rng = np.random.default_rng(0)
+    collection.upsert(
+        ids=["a", "b", "c", "d"],
+        embeddings=rng.normal(size=(4, 16)),
+        metadatas=METADATAS,
+        documents=["one", "two", "three", "four"]
+    )
+    return collection
+
+
+@pytest.mark.parametrize("where,expected", [
+    ({"tenant": "acme"}, ["a", "c"]),
+    ({"tenant": {"$ne": "acme"}}, ["b", "d"]),
+    ({"page": {"$gte": 2}}, ["b", "c"]),
+    ({"page": {"$lt": 2}}, ["a"]),
+    ({"source": {"$in": ["b.txt", "c.txt"]}}, ["c"]),
+    ({"source": {"$nin": ["a.txt"]}}, ["c", "d"]),
+    ({"source": {"$in": []}}, []),
+    ({"tag:fin": True}, ["a"]),
+    ({"$and": [{"tenant": "acme"}, {"source": "a.txt"}]}, ["a"]),
+    ({"$or": [{"tenant": "globex"}, {"page": 3}]}, ["b", "c"]),
+    ({"$and": [{"source": "a.txt"}, {"$or": [{"page": 2}, {"tag:fin": True}]}]}, ["a", "b"]),
+])
+def test_where_clauses_match_like_chroma(collection, where, expected):
+    assert collection.get(where=where)["ids"] == expected
+
+
+def test_where_document_filters_on_text(collection):
+    assert collection.get(where_document={"$contains": "t"})["ids"] == ["b", "c"]
+    assert collection.get(where_document={"$not_contains": "o"})["ids"] == ["c"]
+
+
+def test_unsupported_operators_are_rejected(collection):
+    with pytest.raises(ValueError):
+        collection.get(where={"page": {"$regex": "1"}})
+
+
+def test_query_returns_the_exact_nearest_rows(collection):
+    vectors = collection.get(include=["embeddings"])["embeddings"]
+
+    result = collection.query(query_embeddings=vectors[2:3], n_results=2, where={"tenant": "acme"})
+
+    assert result["ids"][0][0] == "c"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert set(result["ids"][0]) == {"a", "c"}
+
+
+def test_deleted_rows_are_not_returned(collection):
+    collection.delete(where={"tenant": "acme"})
+
+    assert collection.count() == 2
+    assert collection.get()["ids"] == ["b", "d"]
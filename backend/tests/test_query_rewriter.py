@@ -0,0 +1,22 @@
+import pytest
+
+from backend.services.fake_models import FakeChatModel
+from backend.services.query_rewriter import IDENTIFIER_PATTERN, QueryRewriter
+
+
+@pytest.mark.parametrize("word", ["ERR_CONN_RESET", "config.yaml", "std::vector", "E-1234", "getUser", "HTTP", "v2"])
+def test_identifiers_match(word):
+    assert IDENTIFIER_PATTERN.search(word)
+
+
+@pytest.mark.parametrize("word", ["works.", "following:", "Hello", "a", "why?", "etc.)"])
+def test_plain_words_and_sentence_punctuation_do_not_match(word):
+    assert not IDENTIFIER_PATTERN.search(word)
+
+
+def test_sentences_ending_in_punctuation_are_rewritten(settings):
+    settings.query_rewrite_min_words = 3
+    rewriter = QueryRewriter(settings, FakeChatModel())
+
+    assert not rewriter.is_keyword_query("how does it work. tell me more: please.")
+    assert rewriter.is_keyword_query("ERR_CONN_RESET in config.yaml")
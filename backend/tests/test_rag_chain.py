@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services.executor import ExecutorService
+from backend.services.fake_models import FakeChatModel
+from backend.services.rag_chain import RAGService
+from backend.services.vector_store import VectorStoreService
+
+QUERY = "how do I configure the upload limits for large documents"
+
+
+class _TopReranker:
+    """Keeps retrieval order, so tests don't load a reranking model."""
+
+    def rerank(self, docs, query):
+        return docs[:3]
+
+    async def arerank(self, docs, query):
+        return docs[:3]
+
+
+@pytest.fixture
+def make_rag(settings):
+    settings.query_rewrite_mode = "speculative"
+    settings.query_rewrite_timeout_seconds = 0.05
+    executor = ExecutorService(settings)
+    vector_store = VectorStoreService(settings)
+    vector_store.add_documents("Upload limits are configured per tenant.\n" * 20, {"source": "limits.txt"})
+
+    def make(rewrite_llm):
+        llm = FakeChatModel(first_token_latency_ms=0, token_latency_ms=0)
+        return RAGService(settings, vector_store, executor, llm=llm, reranker=_TopReranker(), rewrite_llm=rewrite_llm)
+
+    yield make
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("rewrite_llm", [
+    FakeChatModel(error_rate=1.0),
+    FakeChatModel(first_token_latency_ms=500, token_latency_ms=0)
+])
+def test_sync_speculative_rewrite_falls_back_to_the_original_query(make_rag, rewrite_llm):
+    rag = make_rag(rewrite_llm)
+
+    started = time.perf_counter()
+    result = rag.invoke(QUERY)
+
+    assert result["sources"]
+    assert time.perf_counter() - started < 0.4
+
+
+def test_failed_retrieval_cancels_the_speculative_rewrite(make_rag):
+    rag = make_rag(FakeChatModel(first_token_latency_ms=500, token_latency_ms=0))
+
+    def fail(text, where=None):
+        raise RuntimeError("retrieval failed")
+
+    rag._retrieve = fail
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await rag.ainvoke(QUERY)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,46 @@
+from langchain_core.documents import Document
+
+from backend.services.retrieval_cache import RetrievalCache
+
+
+def _docs():
+    return [
+        Document(id="a", page_content="a", metadata={"relevance_score": 0.9}),
+        Document(id="b", page_content="b", metadata={"relevance_score": 0.5})
+    ]
+
+
+def test_ranked_ids_are_cached_per_scope(settings):
+    cache = RetrievalCache(settings)
+    cache.put("query", 1, _docs(), scope="tenant=acme")
+
+    assert cache.get("query", 1, scope="tenant=acme") == [("a", 0.9), ("b", 0.5)]
+    assert cache.get("query", 1) is None
+
+
+def test_a_new_collection_version_drops_retrievals_and_contexts(settings):
+    cache = RetrievalCache(settings)
+    key = RetrievalCache.context_key(_docs())
+    cache.put("query", 1, _docs())
+    cache.put_context(key, 1, "a\n\nb", [0, 1])
+
+    assert cache.get_context(key, 1) == ("a\n\nb", [0, 1])
+    assert cache.get("query", 2) is None
+    assert cache.get_context(key, 2) is None
+
+
+def test_results_retrieved_before_a_write_are_not_stored(settings):
+    cache = RetrievalCache(settings)
+    cache.get("other", 3)
+    cache.put("query", 2, _docs())
+
+    assert cache.get("query", 3) is None
+
+
+def test_docs_without_ids_are_not_cached(settings):
+    cache = RetrievalCache(settings)
+    docs = [Document(page_content="a")]
+    cache.put("query", 1, docs)
+
+    assert cache.get("query", 1) is None
+    assert RetrievalCache.context_key(docs) is None
@@ -0,0 +1,106 @@
+import asyncio
+
+from backend.services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = 0
+
+    async def answer():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        results = await asyncio.gather(*(flight.run("q", answer) for _ in range(5)))
+        # Finished flights are forgotten, so a later call runs again
+        results.append(await flight.run("q", answer))
+        return results
+
+    assert asyncio.run(main()) == ["answer"] * 6
+    assert runs == 2
+
+
+def test_one_caller_leaving_doesnt_cancel_the_others():
+    flight = SingleFlight()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def answer():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leaving = asyncio.create_task(flight.run("q", answer))
+        staying = asyncio.create_task(flight.run("q", answer))
+        await started.wait()
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_flight_is_cancelled_once_every_caller_left():
+    flight = SingleFlight()
+    cancelled = False
+
+    async def answer():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def main():
+        caller = asyncio.create_task(flight.run("q", answer))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled
+
+
+def test_late_stream_subscribers_get_earlier_chunks():
+    flight = SingleFlight()
+    streams = 0
+
+    async def tokens():
+        nonlocal streams
+        streams += 1
+        for token in ["a", "b", "c"]:
+            yield token
+            await asyncio.sleep(0.01)
+
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flight.stream("q", tokens)]
+
+    async def main():
+        return await asyncio.gather(collect(0), collect(0.015))
+
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert streams == 1
+
+
+def test_stream_errors_reach_every_subscriber():
+    flight = SingleFlight()
+
+    async def tokens():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider failed")
+
+    async def collect():
+        return [token async for token in flight.stream("q", tokens)]
+
+    async def main():
+        return await asyncio.gather(collect(), collect(), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
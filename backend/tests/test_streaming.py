@@ -0,0 +1,60 @@
+import asyncio
+
+from backend.routers.chat import _stream_answer
+from backend.services.streaming import coalesce_chunks
+
+
+async def _tokens(tokens, delay=0.0):
+    for token in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+
+async def _collect(frames):
+    return [frame async for frame in frames]
+
+
+def test_small_chunks_are_merged_up_to_max_chars():
+    frames = asyncio.run(_collect(coalesce_chunks(_tokens(["ab"] * 10), max_chars=6, max_delay=10)))
+
+    assert frames == ["ababab"] * 3 + ["ab"]
+    assert "".join(frames) == "ab" * 10
+
+
+def test_frames_are_flushed_when_upstream_is_slow():
+    frames = asyncio.run(_collect(coalesce_chunks(_tokens(["a", "b", "c"], delay=0.03), max_chars=100, max_delay=0.01)))
+
+    assert frames == ["a", "b", "c"]
+
+
+class _FakeRAG:
+    def __init__(self, count):
+        self.count = count
+        self.produced = 0
+
+    async def astream(self, query, where=None):
+        for _ in range(self.count):
+            self.produced += 1
+            yield "x" * 10
+
+
+def test_full_send_queue_pauses_the_answer_stream(settings):
+    settings.ws_coalesce_max_chars = 10
+    rag = _FakeRAG(100)
+
+    async def main():
+        queue = asyncio.Queue(maxsize=4)
+        producer = asyncio.create_task(_stream_answer(rag, "q", queue, asyncio.Lock(), settings))
+        await asyncio.sleep(0.05)
+        # Nobody reads the queue: the stream stops a frame or two past what fits
+        paused_at = rag.produced
+        frames = []
+        while (frame := await queue.get()) != "<<END>>":
+            frames.append(frame)
+        await producer
+        return paused_at, frames
+
+    paused_at, frames = asyncio.run(main())
+    assert paused_at <= 4 + 2
+    assert len(frames) == 100
@@ -229,6 +229,12 @@ function App() {
         setIsStreaming(false);
         return;
       }
+      // Check for overloaded Error flag; <<END>> follows and closes the connection
+      if (data == '<<E:OVERLOADED>>') {
+        console.log('ERROR: LLM overloaded, try again later')
+        setResponse('The model is busy right now, please try again in a moment.');
+        return;
+      }
       // Update state directly with the new data
       setResponse((prevResponse) => prevResponse + data);
     };